@@ -1,48 +1,188 @@
 """
 Auto-delete utility for bot messages
 Keeps user chat clean to avoid spam detection
+
+One worker owns every scheduled deletion: a time-ordered heap instead of a
+sleeping task per message. Messages that fall due together are deleted with one
+delete_messages call per chat. The schedule is kept in MongoDB (when available),
+so messages scheduled before a restart are still deleted after it.
 """
 
+import time
+import heapq
 import asyncio
 import logging
+from pyrogram.errors import FloodWait
+import settings
+import rate_limiter
 
 logger = logging.getLogger(__name__)
 
-# Track messages scheduled for deletion
-SCHEDULED_DELETIONS = {}
+COLLECTION_NAME = "scheduled_deletions"
+BATCH_WINDOW = 2  # Seconds - deletions due this close together share a call
+MAX_IDS_PER_CALL = 100  # Telegram's limit for delete_messages
+MAX_AGE = 48 * 3600  # Bots cannot delete messages older than 48h - drop them
 
-async def auto_delete_message(message, delay_seconds=10):
+
+class DeletionScheduler:
+    """Heap of (due, chat_id, message_id) drained by a single worker"""
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._collection = None
+        self.deleted = 0
+        self.calls = 0
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+            try:
+                self._collection.create_index("due")
+            except Exception as e:
+                logger.debug(f"Could not create scheduled deletion index: {e}")
+        return self._collection
+
+    def schedule(self, chat_id, message_id, delay_seconds=10):
+        """Delete a message after delay_seconds (no task is created)"""
+        due = time.time() + delay_seconds
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, chat_id, message_id))
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.replace_one(
+                {"_id": f"{chat_id}:{message_id}"},
+                {"chat_id": chat_id, "message_id": message_id, "due": due, "created_at": time.time()},
+                upsert=True
+            )
+        except Exception as e:
+            logger.debug(f"Could not persist scheduled deletion: {e}")
+
+    def load(self):
+        """Restore the schedule saved before a restart (overdue messages go first)"""
+        collection = self._get_collection()
+        if collection is None:
+            return 0
+        try:
+            docs = list(collection.find())
+        except Exception as e:
+            logger.error(f"Failed to load scheduled deletions: {e}")
+            return 0
+        for doc in docs:
+            heapq.heappush(self._heap, (doc["due"], doc["chat_id"], doc["message_id"]))
+        if docs:
+            logger.info(f"🗑️ Restored {len(docs)} scheduled message deletions")
+        return len(docs)
+
+    def pending(self):
+        return len(self._heap)
+
+    def _pop_due(self, now):
+        """Everything due within BATCH_WINDOW, grouped per chat"""
+        batches = {}
+        while self._heap and self._heap[0][0] <= now + BATCH_WINDOW:
+            due, chat_id, message_id = heapq.heappop(self._heap)
+            if now - due > MAX_AGE:
+                self._forget(chat_id, [message_id])
+                continue
+            batches.setdefault(chat_id, set()).add(message_id)
+        return {chat_id: sorted(message_ids) for chat_id, message_ids in batches.items()}
+
+    def _forget(self, chat_id, message_ids):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_many({"_id": {"$in": [f"{chat_id}:{message_id}" for message_id in message_ids]}})
+        except Exception as e:
+            logger.debug(f"Could not drop scheduled deletions: {e}")
+
+    async def _delete(self, client, chat_id, message_ids):
+        for start in range(0, len(message_ids), MAX_IDS_PER_CALL):
+            chunk = message_ids[start:start + MAX_IDS_PER_CALL]
+            await rate_limiter.limiter.acquire(chat_id)
+            try:
+                await client.delete_messages(chat_id, chunk)
+                self.deleted += len(chunk)
+            except FloodWait as e:
+                # Put the chunk back - it is retried once the chat's budget reopens
+                rate_limiter.limiter.on_flood_wait(chat_id, e.value)
+                due = time.time() + e.value
+                for message_id in chunk:
+                    heapq.heappush(self._heap, (due, chat_id, message_id))
+                continue
+            except Exception as e:
+                # Already deleted, or no right to delete - nothing to retry
+                logger.debug(f"Could not delete messages in {chat_id}: {e}")
+            self.calls += 1
+            self._forget(chat_id, chunk)
+
+    async def run(self, client):
+        """Deletion worker (waits for the client to connect before the first call)"""
+        self.load()
+        while not client.is_connected:
+            await asyncio.sleep(1)
+        logger.info("Starting auto-delete worker...")
+        while True:
+            try:
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+                wait = self._heap[0][0] - time.time()
+                if wait > 0:
+                    # Sleep until the earliest deletion, or until an earlier one is scheduled
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                for chat_id, message_ids in self._pop_due(time.time()).items():
+                    await self._delete(client, chat_id, message_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Auto-delete worker error: {e}")
+                await asyncio.sleep(5)
+
+
+scheduler = DeletionScheduler()
+
+
+def schedule_delete(message, delay_seconds=10):
     """
     Auto-delete a message after specified delay
-    
+
     Args:
         message: Pyrogram message object
         delay_seconds: Seconds to wait before deleting (default: 10)
     """
-    try:
-        await asyncio.sleep(delay_seconds)
-        await message.delete()
-        logger.debug(f"Auto-deleted message {message.id} after {delay_seconds}s")
-    except Exception as e:
-        logger.debug(f"Could not delete message: {e}")
+    scheduler.schedule(message.chat.id, message.id, delay_seconds)
+
+async def auto_delete_message(message, delay_seconds=10):
+    """Compatibility wrapper - schedules the deletion and returns at once"""
+    schedule_delete(message, delay_seconds)
 
 async def send_temp_message(client, chat_id, text, delay=10, **kwargs):
     """
     Send a message that auto-deletes after delay
-    
+
     Args:
         client: Pyrogram client
         chat_id: Chat to send to
         text: Message text
         delay: Seconds before auto-delete
         **kwargs: Additional arguments for send_message
-    
+
     Returns:
         Message object
     """
     msg = await client.send_message(chat_id, text, **kwargs)
-    
+
     # Schedule deletion
-    asyncio.create_task(auto_delete_message(msg, delay))
-    
+    schedule_delete(msg, delay)
+
     return msg
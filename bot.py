@@ -10,7 +10,6 @@ from dotenv import load_dotenv
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import MessageNotModified, FloodWait
-from qbittorrentapi import Client as qbClient
 import settings
 import progress
 import thumb_utils
@@ -20,10 +19,29 @@ from plugins import tamilmv_scraper, rss_monitor, direct_link_generator
 import rate_limiter
 import auto_delete
 import storage_channel
-import caption_utils
 import torrent_search
 import storage_utils
 import management_commands
+import qb_client
+import qb_poller
+import magnet_utils
+import task_scheduler
+import concurrency_controller
+import pipeline
+import filter_utils
+import swarm_health
+import task_store
+import upload_utils
+import file_cache
+import split_utils
+import client_pool
+import upload_progress
+import upload_engine
+import dead_letter
+import upload_plan
+import status_service
+import render_cache
+import snapshot_service
 from telegraph_helper import telegraph_helper
 
 # Load Config
@@ -32,9 +50,13 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 API_ID = os.getenv('API_ID')
 API_HASH = os.getenv('API_HASH')
 OWNER_ID = int(os.getenv('OWNER_ID', '0'))
+# Optional extra bots that carry uploads (comma separated tokens)
+HELPER_BOT_TOKENS = [t.strip() for t in os.getenv('HELPER_BOT_TOKENS', '').split(',') if t.strip()]
 DOWNLOAD_DIR = os.getenv('DOWNLOAD_DIR', 'downloads/')
 QB_HOST = os.getenv('QB_HOST', 'localhost')
 QB_PORT = int(os.getenv('QB_PORT', '8090'))
+QB_USERNAME = os.getenv('QB_USERNAME', 'admin')
+QB_PASSWORD = os.getenv('QB_PASSWORD', 'adminadmin')
 
 # Logging Setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -44,12 +66,44 @@ logger = logging.getLogger(__name__)
 PID_FILE = "bot.pid"
 IS_SHUTTING_DOWN = False
 
-# Multi-download tracking: {hash: {"user_id": ..., "chat_id": ..., "status_msg": ..., "name": ...}}
-ACTIVE_TASKS = {}
-MAX_CONCURRENT_DOWNLOADS = 3  # Reduced from 5 for ban prevention
+# Initial slot count - the concurrency controller resizes it between the bounds below
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '3'))
+CONCURRENCY_MIN = int(os.getenv('CONCURRENCY_MIN', '1'))
+CONCURRENCY_MAX = int(os.getenv('CONCURRENCY_MAX', '8'))
+DL_BANDWIDTH_LIMIT = float(os.getenv('DL_BANDWIDTH_LIMIT', '0')) * 1024**2  # MB/s, 0 = unknown
 
-# Pending queue for 6th+ downloads: [(magnet_link, message, status_msg), ...]
-PENDING_TASKS = []
+# Upload stage: finished downloads wait in a bounded queue for an upload worker
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '2'))
+UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', '4'))
+UPLOAD_PARALLEL_FILES = int(os.getenv('UPLOAD_PARALLEL_FILES', '3'))  # Per torrent, needs a storage channel
+UPLOAD_CONNECTIONS = int(os.getenv('UPLOAD_CONNECTIONS', '4'))  # Media connections per big file (1 = pyrogram default)
+UPLOAD_RETRIES = 3  # Attempts per file and channel (each resumes from the accepted parts)
+UPLOAD_RESUME_WAIT = 120  # Sleep out FloodWaits up to this long instead of switching bots
+
+# Metadata stage: fetches file lists before a download slot is taken
+METADATA_WORKERS = int(os.getenv('METADATA_WORKERS', '6'))
+METADATA_TIMEOUT = 600  # Give up on magnets nobody shares metadata for (10 minutes)
+
+# Active slots ({hash: {"user_id", "chat_id", "status_msg", "name"}}) + persistent priority queue
+scheduler = task_scheduler.TaskScheduler(max_active=MAX_CONCURRENT_DOWNLOADS)
+
+# Per-torrent lifecycle records in MongoDB (reconciled with qBittorrent on startup)
+tasks = task_store.TaskStore()
+
+# file_id cache: already uploaded content is posted by file_id instead of re-uploaded
+FILE_CACHE_HASH = os.getenv('FILE_CACHE_HASH', 'true').lower() == 'true'
+file_ids = file_cache.FileIdCache(use_content_hash=FILE_CACHE_HASH)
+
+# Accepted parts of big uploads, so retries and restarts resume mid-file
+uploads = upload_progress.UploadProgressStore()
+
+# Failed (file, channel) deliveries for /replay - undelivered files are spooled under a quota
+DEADLETTER_QUOTA = float(os.getenv('DEADLETTER_QUOTA_GB', '20')) * 1024**3
+REPLAY_BATCH = 10  # Entries re-driven per /replay
+dead_letters = dead_letter.DeadLetterStore(os.path.join(DOWNLOAD_DIR, ".deadletter"), DEADLETTER_QUOTA)
+
+# Upload plans built at metadata time: {hash: plan} (also kept in the task record)
+upload_plans = {}
 
 # Search results cache: {user_id: [list of torrent dicts]}
 SEARCH_RESULTS_CACHE = {}
@@ -59,22 +113,47 @@ DIRLINK_AWAITING_FILE = {}
 
 
 # --- qBittorrent Client ---
-# --- qBittorrent Client ---
-def connect_qb():
-    retry_count = 0
-    while True:
-        try:
-            qb = qbClient(host=QB_HOST, port=QB_PORT)
-            qb.auth_log_in(username="admin", password="adminadmin")
-            logger.info("Connected to qBittorrent!")
-            return qb
-        except Exception as e:
-            retry_count += 1
-            wait_time = min(retry_count * 2, 30)
-            logger.error(f"Failed to connect to qBittorrent: {repr(e)}. Retrying in {wait_time}s...")
-            time.sleep(wait_time)
+# Async client: logs in lazily on first call and re-authenticates after qBittorrent restarts
+qb = qb_client.QBClient(QB_HOST, QB_PORT, QB_USERNAME, QB_PASSWORD)
+
+# Shared torrent state (one sync/maindata request per cycle for all tasks)
+poller = qb_poller.QBPoller(qb)
+
+# Download -> upload hand-off (download slots free up while uploads are still running)
+upload_stage = pipeline.Stage(
+    "upload",
+    lambda job: upload_task(job),
+    workers=UPLOAD_WORKERS,
+    queue_size=UPLOAD_QUEUE_SIZE,
+    key=lambda job: job["hash"],
+)
 
-qb = connect_qb()
+# Magnet -> metadata -> scheduler admission (no slot is held while waiting for peers)
+metadata_stage = pipeline.Stage(
+    "metadata",
+    lambda job: admit_task(job),
+    workers=METADATA_WORKERS,
+    queue_size=METADATA_WORKERS * 4,
+    key=lambda job: magnet_utils.get_infohash(job.magnet),
+)
+
+# Speed / swarm averages, stall recovery and early eviction for every tracked torrent
+health = swarm_health.SwarmHealth(qb, poller, on_evict=lambda t_hash, record: announce_eviction(t_hash, record))
+
+def upload_backlog():
+    """Number of finished downloads queued for or being uploaded"""
+    return upload_stage.backlog()
+
+# Resizes scheduler.max_active from speed, disk, upload backlog and CPU
+controller = concurrency_controller.ConcurrencyController(
+    scheduler,
+    concurrency_controller.BotMetricsSource(poller, scheduler, DOWNLOAD_DIR, upload_backlog),
+    min_slots=CONCURRENCY_MIN,
+    max_slots=CONCURRENCY_MAX,
+    slot_bytes=lambda: settings.get_setting("max_file_size"),
+    bandwidth_limit=DL_BANDWIDTH_LIMIT,
+    on_resize=lambda: dispatch_pending(),
+)
 
 # --- Pyrogram Client ---
 # Rule: "Handle Error 429". Sleep_threshold will auto-sleep on FloodWait < 60s
@@ -86,6 +165,35 @@ app = Client(
     sleep_threshold=60 
 )
 
+# Upload helpers: no updates (the main bot handles commands) and no auto-sleep on
+# FloodWait, so a limited helper hands its file to another member right away
+upload_pool = client_pool.ClientPool(
+    app,
+    client_pool.bot_id_from_token(BOT_TOKEN or ""),
+    helpers=[
+        (
+            Client(
+                f"UploadHelper_{client_pool.bot_id_from_token(token)}",
+                api_id=API_ID,
+                api_hash=API_HASH,
+                bot_token=token,
+                no_updates=True,
+                sleep_threshold=0
+            ),
+            client_pool.bot_id_from_token(token)
+        )
+        for token in HELPER_BOT_TOKENS
+    ]
+)
+
+# Live progress of every task goes into one dashboard per chat
+status_board = status_service.StatusBoard(app)
+
+# Edits that would not visibly change a message are never sent; progress changes
+# below RENDER_MIN_PERCENT wait until the message is RENDER_MAX_AGE seconds old
+render_cache.cache.min_percent = float(os.getenv('RENDER_MIN_PERCENT', '1'))
+render_cache.cache.max_age = int(os.getenv('RENDER_MAX_AGE', '60'))
+
 # --- Helper Functions ---
 
 def clean_download_dir(path):
@@ -97,24 +205,50 @@ async def check_permissions(message):
         return True
     if message.from_user.id in settings.get_setting('sudo_users'):
         return True
-    await message.reply("⛔ You are not authorized to use this bot.")
+    await safe_reply(message, "⛔ You are not authorized to use this bot.")
     return False
 
-async def safe_edit(message, text, parse_mode=enums.ParseMode.HTML, reply_markup=None):
-    """Safely edit message with FloodWait handling"""
+async def safe_edit(message, text, parse_mode=enums.ParseMode.HTML, reply_markup=None, signature=None, progress=None):
+    """
+    Safely edit message with FloodWait handling
+    
+    Edits that would show the same text are skipped without an API call; progress
+    edits may pass `progress` (percent) and `signature` (the rest of their state)
+    so small progress steps are skipped too (see render_cache).
+    """
+    chat_id = message.chat.id
+    if not render_cache.cache.should_edit(chat_id, message.id, text, reply_markup, signature, progress):
+        return
     try:
+        await rate_limiter.limiter.acquire(chat_id)
         await message.edit(text, parse_mode=parse_mode, reply_markup=reply_markup)
     except FloodWait as e:
-        logger.warning(f"FloodWait editing message: Sleeping {e.value}s")
-        await asyncio.sleep(e.value + 2)
+        # Shrink the chat's budget; the retry waits for the bucket to reopen
+        rate_limiter.limiter.on_flood_wait(chat_id, e.value)
         try:
+            await rate_limiter.limiter.acquire(chat_id)
             await message.edit(text, parse_mode=parse_mode, reply_markup=reply_markup)
-        except Exception:
+        except MessageNotModified:
             pass
+        except Exception:
+            return
     except MessageNotModified:
         pass
     except Exception as e:
         logger.error(f"Error editing message: {e}")
+        return
+    render_cache.cache.record(chat_id, message.id, text, reply_markup, signature, progress)
+
+async def safe_reply(message, text, **kwargs):
+    """Reply through the rate limiter, retrying once after a FloodWait"""
+    chat_id = message.chat.id
+    await rate_limiter.limiter.acquire(chat_id)
+    try:
+        return await message.reply(text, **kwargs)
+    except FloodWait as e:
+        rate_limiter.limiter.on_flood_wait(chat_id, e.value)
+        await rate_limiter.limiter.acquire(chat_id)
+        return await message.reply(text, **kwargs)
 
 # --- Signal Handling (Graceful Shutdown) ---
 def signal_handler(signum, frame):
@@ -123,12 +257,13 @@ def signal_handler(signum, frame):
     IS_SHUTTING_DOWN = True
     
     # If no tasks, exit immediately
-    if not ACTIVE_TASKS:
+    running = scheduler.active_count() + len(upload_stage.tracked)
+    if not running:
         logger.info("No active tasks. Exiting now.")
         cleanup_pid()
         sys.exit(0)
     else:
-        logger.info(f"Waiting for {len(ACTIVE_TASKS)} active tasks to finish...")
+        logger.info(f"Waiting for {running} active tasks to finish...")
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
@@ -141,7 +276,8 @@ def cleanup_pid():
 
 @app.on_message(filters.command("start"))
 async def start_handler(client, message):
-    await message.reply(
+    await safe_reply(
+        message,
         "👋 <b>Welcome to TamilMV Leech Bot!</b>\n\n"
         "✨ <b>Features:</b>\n"
         "• ⚡ Fast downloads via qBittorrent\n"
@@ -167,9 +303,9 @@ async def setthumb_handler(client, message):
         user_id = message.from_user.id
         file_path = await message.download()
         await thumb_utils.set_user_thumbnail(user_id, file_path)
-        await message.reply("✅ <b>Thumbnail set successfully!</b>", parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, "✅ <b>Thumbnail set successfully!</b>", parse_mode=enums.ParseMode.HTML)
     except Exception as e:
-        await message.reply(f"❌ <b>Error setting thumbnail:</b> {e}", parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, f"❌ <b>Error setting thumbnail:</b> {e}", parse_mode=enums.ParseMode.HTML)
 
 @app.on_message(filters.command("setchannels"))
 async def setchannels_handler(client, message):
@@ -188,7 +324,7 @@ async def setchannels_handler(client, message):
             msg += "\n<i>To update: /setchannels -1001234567 | -1009876543</i>"
         else:
             msg = "📢 <b>No channels set</b>\n\n<i>Usage: /setchannels -1001234567 | -1009876543</i>"
-        await message.reply(msg, parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, msg, parse_mode=enums.ParseMode.HTML)
         return
     
     channel_ids = [ch.strip() for ch in text.replace("|", " ").split()]
@@ -199,9 +335,9 @@ async def setchannels_handler(client, message):
         msg = f"✅ <b>Updated!</b>\n\n<b>Channels ({len(valid)}):</b>\n"
         for ch in valid:
             msg += f"• <code>{ch}</code>\n"
-        await message.reply(msg, parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, msg, parse_mode=enums.ParseMode.HTML)
     else:
-        await message.reply("❌ <b>Invalid IDs</b>\n\n<i>Must start with -100</i>", parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, "❌ <b>Invalid IDs</b>\n\n<i>Must start with -100</i>", parse_mode=enums.ParseMode.HTML)
 
 @app.on_message(filters.command("help"))
 async def help_handler(client, message):
@@ -226,7 +362,8 @@ async def help_handler(client, message):
         "/dirlink_files - View and manage stored files\n"
         "<i>Send /dirlink empty to upload a file interactively</i>\n\n"
         "<b>Monitoring:</b>\n"
-        "/limits - Check rate limit status\n\n"
+        "/limits - Check rate limit status\n"
+        "/replay [count|clear] - Retry failed channel uploads\n\n"
         "<b>Admin Commands:</b>\n"
         "/rebuild - Free up space and rebuild bot\n"
         "/retry <link> - Manually retry magnet/topic\n"
@@ -234,15 +371,15 @@ async def help_handler(client, message):
         "<b>Search & Download:</b>\n"
         "/search <query> - Search torrents (1337x, YTS, etc.)\n"
         "Just send a magnet link or TamilMV post URL!\n\n"
-        f"<i>Max {MAX_CONCURRENT_DOWNLOADS} concurrent. 4th+ queues automatically.</i>"
+        f"<i>Max {scheduler.max_active} concurrent (auto-tuned). Extra downloads queue automatically.</i>"
     )
     
-    msg = await message.reply(help_text, parse_mode=enums.ParseMode.HTML)
+    msg = await safe_reply(message, help_text, parse_mode=enums.ParseMode.HTML)
     
     # Auto-delete after configured delay
     delay = settings.get_setting("auto_delete_delay")
     if delay > 0:
-        asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+        auto_delete.schedule_delete(msg, delay)
 
 @app.on_message(filters.command("limits"))
 async def limits_handler(client, message):
@@ -250,25 +387,87 @@ async def limits_handler(client, message):
     if not await check_permissions(message):
         return
     
-    stats = rate_limiter.RateLimiter.get_stats()
-    
-    status_emoji = "✅" if stats["is_safe"] else "⚠️"
+    stats = rate_limiter.limiter.get_stats()
     
-    text = (
-        f"📊 <b>Rate Limit Status</b> {status_emoji}\n\n"
-        f"<b>Current Rates:</b>\n"
-        f"📤 Uploads: {stats['uploads_per_min']}/{stats['max_uploads_per_min']} per minute\n"
-        f"💬 Messages: {stats['messages_per_min']}/{stats['max_messages_per_min']} per minute\n"
-        f"📦 Uploads (hour): {stats['uploads_per_hour']}\n\n"
-        f"<b>Status:</b> {'🟢 Safe' if stats['is_safe'] else '🟡 High Load'}\n\n"
+    def bucket_line(bucket):
+        line = (
+            f"• {bucket['name']}: {bucket['tokens']:.0f}/{bucket['capacity']} tokens, "
+            f"{bucket['rate_per_min']:.0f}/{bucket['base_per_min']:.0f} per min"
+        )
+        if bucket["blocked_for"] > 0:
+            line += f" ⏳ {bucket['blocked_for']:.0f}s"
+        if bucket["flood_waits"]:
+            line += f" (FloodWait ×{bucket['flood_waits']})"
+        return line
+    
+    buckets = stats["global"] + stats["chats"]
+    is_safe = all(b["rate_per_min"] >= b["base_per_min"] and b["blocked_for"] == 0 for b in buckets)
+    status_emoji = "✅" if is_safe else "⚠️"
+    
+    text = f"📊 <b>Rate Limit Status</b> {status_emoji}\n\n<b>Global:</b>\n"
+    text += "\n".join(bucket_line(b) for b in stats["global"])
+    if stats["chats"]:
+        text += f"\n\n<b>Chats</b> ({stats['chat_count']} tracked):\n"
+        text += "\n".join(bucket_line(b) for b in stats["chats"])
+    if upload_pool.helpers:
+        from progress import get_readable_file_size
+        text += "\n\n<b>Upload Bots:</b>\n"
+        for member in upload_pool.get_stats():
+            state = "🟢" if member["started"] and not member["blocked_for"] else ("⏳" if member["started"] else "🔴")
+            text += (
+                f"• {state} {'main' if member['main'] else member['bot_id']}: "
+                f"{member['uploads_in_flight']} active, {get_readable_file_size(member['uploaded_bytes'])} sent\n"
+            )
+    renders = render_cache.cache.get_stats()
+    text += (
+        f"\n\n<b>Message Edits:</b> {renders['sent']} sent, "
+        f"{renders['suppressed'][render_cache.REASON_UNCHANGED]} unchanged + "
+        f"{renders['suppressed'][render_cache.REASON_INSIGNIFICANT]} minor skipped"
+    )
+    text += (
+        f"\n\n<b>Status:</b> {'🟢 Safe' if is_safe else '🟡 Backing off'}\n\n"
         f"<i>Bot auto-throttles to stay under limits</i>"
     )
     
-    msg = await message.reply(text, parse_mode=enums.ParseMode.HTML)
+    msg = await safe_reply(message, text, parse_mode=enums.ParseMode.HTML)
     
     delay = settings.get_setting("auto_delete_delay")
     if delay > 0:
-        asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+        auto_delete.schedule_delete(msg, delay)
+
+@app.on_message(filters.command("replay"))
+async def replay_handler(client, message):
+    """Re-drive failed channel uploads from the dead-letter queue"""
+    if not await check_permissions(message):
+        return
+    
+    args = message.command[1:]
+    if args and args[0] == "clear":
+        dead_letters.clear()
+        await safe_reply(message, "🗑️ <b>Dead-letter queue cleared</b>", parse_mode=enums.ParseMode.HTML)
+        return
+    
+    batch = int(args[0]) if args and args[0].isdigit() else REPLAY_BATCH
+    entries = dead_letters.pending(batch)
+    if not entries:
+        await safe_reply(message, "📭 <b>No failed uploads to replay</b>", parse_mode=enums.ParseMode.HTML)
+        return
+    
+    status_msg = await safe_reply(
+        message, f"📮 <b>Replaying {len(entries)} failed uploads...</b>", parse_mode=enums.ParseMode.HTML
+    )
+    delivered, failed, dropped = await replay_dead_letters(entries)
+    
+    from progress import get_readable_file_size
+    text = (
+        f"📮 <b>Replay finished</b>\n\n"
+        f"✅ Delivered: {delivered}\n"
+        f"❌ Failed again: {failed}\n"
+        f"🗑️ Given up: {dropped}\n"
+        f"📦 Remaining: {dead_letters.count()} "
+        f"({get_readable_file_size(dead_letters.spool_usage())} kept on disk)"
+    )
+    await safe_edit(status_msg, text, parse_mode=enums.ParseMode.HTML)
 
 @app.on_message(filters.command("setstorage"))
 async def setstorage_handler(client, message):
@@ -282,7 +481,8 @@ async def setstorage_handler(client, message):
     if text:
         # User provided channel ID directly
         if storage_channel.set_storage_channel_by_id(text):
-            await message.reply(
+            await safe_reply(
+                message,
                 f"✅ <b>Storage Channel Set!</b>\n\n"
                 f"<b>Channel ID:</b> <code>{text}</code>\n\n"
                 f"<i>Files will now be uploaded here</i>\n\n"
@@ -290,7 +490,8 @@ async def setstorage_handler(client, message):
                 parse_mode=enums.ParseMode.HTML
             )
         else:
-            await message.reply(
+            await safe_reply(
+                message,
                 "❌ <b>Invalid Channel ID</b>\n\n"
                 "<i>Channel IDs must be negative numbers (e.g., -1001234567890)</i>",
                 parse_mode=enums.ParseMode.HTML
@@ -314,11 +515,11 @@ async def setstorage_handler(client, message):
         "<i>Files will upload to storage channel (safer)</i>"
     )
     
-    msg = await message.reply(text, parse_mode=enums.ParseMode.HTML)
+    msg = await safe_reply(message, text, parse_mode=enums.ParseMode.HTML)
     
     delay = settings.get_setting("auto_delete_delay")
     if delay > 0:
-        asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+        auto_delete.schedule_delete(msg, delay)
 
 @app.on_message(filters.forwarded & filters.private)
 async def forwarded_message_handler(client, message):
@@ -330,7 +531,8 @@ async def forwarded_message_handler(client, message):
     
     if success:
         # Successfully detected public channel
-        await message.reply(
+        await safe_reply(
+            message,
             f"✅ <b>Storage Channel Detected!</b>\n\n"
             f"<b>Channel:</b> {channel_name}\n"
             f"<b>ID:</b> <code>{channel_id}</code>\n\n"
@@ -339,7 +541,8 @@ async def forwarded_message_handler(client, message):
         )
     elif success is None:
         # Private channel - can't auto-detect
-        await message.reply(
+        await safe_reply(
+            message,
             "⚠️ <b>Private Channel Detected</b>\n\n"
             "I can't auto-detect private channels due to Telegram privacy settings.\n\n"
             "<b>To set a private channel:</b>\n"
@@ -377,7 +580,8 @@ async def document_for_dirlink_handler(client, message):
     file_size = doc.file_size
     
     # Create status message
-    status_msg = await message.reply(
+    status_msg = await safe_reply(
+        message,
         "🔗 <b>Direct Link Generator</b>\n\n"
         f"📁 <b>File:</b> {filename}\n"
         f"💾 <b>Size:</b> {progress.get_readable_file_size(file_size)}\n\n"
@@ -394,36 +598,25 @@ async def document_for_dirlink_handler(client, message):
         direct_link_generator.init_directory()
         download_path = os.path.join(direct_link_generator.DIRECT_DOWNLOAD_DIR, filename)
         
-        # Download with progress (throttled to prevent Telegram ban)
-        last_update = [0]  # Use list to allow modification in nested function
+        # Download with progress (shown on the chat's status board)
+        task_id = f"tg{status_msg.id}"
         
         async def download_progress(current, total):
-            try:
-                # Throttle updates: only update every 4 seconds
-                current_time = time.time()
-                if current_time - last_update[0] < 4:
-                    return
-                last_update[0] = current_time
-                
-                percent = (current / total) * 100
-                progress_bar = progress.get_progress_bar(percent)
-                await safe_edit(
-                    status_msg,
-                    f"🔗 <b>Direct Link Generator</b>\n\n"
-                    f"📁 <b>File:</b> {filename[:50]}...\n"
-                    f"💾 <b>Size:</b> {progress.get_readable_file_size(total)}\n\n"
-                    f"{progress_bar} {percent:.1f}%\n"
-                    f"📥 {progress.get_readable_file_size(current)} / {progress.get_readable_file_size(total)}\n\n"
-                    f"⏬ Downloading from Telegram...",
-                    parse_mode=enums.ParseMode.HTML
-                )
-            except:
-                pass
+            tracker = progress.trackers.track(task_id).update(current, total)
+            status_board.update(
+                status_msg.chat.id, task_id, status="downloading", name=filename,
+                progress=current / total if total else 0, downloaded=current, size=total,
+                speed=tracker.speed, eta=tracker.eta()
+            )
         
-        downloaded_path = await message.download(
-            file_name=download_path,
-            progress=download_progress
-        )
+        try:
+            downloaded_path = await message.download(
+                file_name=download_path,
+                progress=download_progress
+            )
+        finally:
+            status_board.finish(task_id)
+            progress.trackers.release(task_id)
         
         # Generate link ID
         link_id = direct_link_generator.generate_link_id(filename + str(file_size))
@@ -478,7 +671,8 @@ async def search_handler(client, message):
     query = message.text.replace("/search", "").strip()
     
     if not query:
-        await message.reply(
+        await safe_reply(
+            message,
             "❌ <b>No search query provided</b>\n\n"
             "<b>Usage:</b> /search <query>\n"
             "<b>Example:</b> /search avengers",
@@ -509,7 +703,8 @@ async def search_handler(client, message):
     # Add cancel button
     buttons.append([InlineKeyboardButton("✖️ Cancel", callback_data="close")])
     
-    await message.reply(
+    await safe_reply(
+        message,
         f"🔍 <b>Search Query:</b> {query}\n\n"
         f"<b>Choose a torrent site:</b>",
         reply_markup=InlineKeyboardMarkup(buttons),
@@ -535,7 +730,8 @@ async def dirlink_handler(client, message):
             InlineKeyboardButton("✖️ Cancel", callback_data="cancel_dirlink")
         ]])
         
-        prompt_msg = await message.reply(
+        prompt_msg = await safe_reply(
+            message,
             "📤 <b>Send me a file to generate direct link</b>\n\n"
             "You can send:\n"
             "• 📄 Any document/video file\n"
@@ -555,7 +751,7 @@ async def dirlink_handler(client, message):
         # Auto-delete prompt after delay
         delay = settings.get_setting("auto_delete_delay")
         if delay > 0:
-            asyncio.create_task(auto_delete.auto_delete_message(prompt_msg, delay))
+            auto_delete.schedule_delete(prompt_msg, delay)
         
         return
     
@@ -565,7 +761,8 @@ async def dirlink_handler(client, message):
         return
     
     # Case 3: Invalid input
-    await message.reply(
+    await safe_reply(
+        message,
         "❌ <b>Invalid input</b>\n\n"
         "<b>Usage:</b>\n"
         "• /dirlink - Send file interactively\n"
@@ -578,7 +775,8 @@ async def dirlink_handler(client, message):
 async def process_magnet_dirlink(message, magnet_link):
     """Process magnet link for direct link generation"""
     # Create status message
-    status_msg = await message.reply(
+    status_msg = await safe_reply(
+        message,
         "🔗 <b>Direct Link Generator</b>\n\n"
         "⏬ Starting download...\n"
         "<i>This may take a while depending on file size</i>",
@@ -610,44 +808,26 @@ async def process_magnet_dirlink(message, magnet_link):
         )
         return
     
-    # Progress callback (throttled to prevent Telegram ban)
-    last_update = [0]  # Use list to allow modification in nested function
-    
+    # Progress goes to the chat's status board
     async def progress_callback(progress_percent, state, torrent):
-        try:
-            # Throttle updates: only update every 4 seconds
-            current_time = time.time()
-            if current_time - last_update[0] < 4:
-                return
-            last_update[0] = current_time
-            
-            from progress import get_readable_file_size, get_readable_time
-            
-            speed_str = get_readable_file_size(torrent.dlspeed) + "/s"
-            eta = torrent.eta if torrent.eta > 0 else 0
-            eta_str = get_readable_time(eta) if eta > 0 else "∞"
-            
-            progress_bar = progress.get_progress_bar(progress_percent)
-            
-            await safe_edit(
-                status_msg,
-                f"🔗 <b>Direct Link Generator</b>\n\n"
-                f"📁 {torrent.name[:40]}...\n\n"
-                f"{progress_bar} {progress_percent:.1f}%\n"
-                f"💾 {get_readable_file_size(torrent.downloaded)} / {get_readable_file_size(torrent.size)}\n"
-                f"⚡ {speed_str} | ⏱ {eta_str}\n"
-                f"🌱 S: {torrent.num_seeds} | P: {torrent.num_leechs}",
-                parse_mode=enums.ParseMode.HTML
-            )
-        except Exception as e:
-            logger.error(f"Progress callback error: {e}")
+        tracker = progress.trackers.track(link_id).update(torrent.downloaded, torrent.size)
+        status_board.update(
+            status_msg.chat.id, link_id, status="downloading", name=torrent.name,
+            progress=progress_percent / 100, downloaded=torrent.downloaded, size=torrent.size,
+            speed=tracker.speed, eta=tracker.eta()
+        )
     
     # Download the file
-    result = await direct_link_generator.download_from_magnet(
-        qb, 
-        magnet_link, 
-        status_callback=progress_callback
-    )
+    try:
+        result = await direct_link_generator.download_from_magnet(
+            qb, 
+            poller,
+            magnet_link, 
+            status_callback=progress_callback
+        )
+    finally:
+        status_board.finish(link_id)
+        progress.trackers.release(link_id)
     
     if not result["success"]:
         await safe_edit(
@@ -704,7 +884,8 @@ async def getlink_handler(client, message):
         active = direct_link_generator.get_active_links_info()
         
         if not active:
-            await message.reply(
+            await safe_reply(
+                message,
                 "📭 <b>No Active Links</b>\n\n"
                 "<i>Use /dirlink to create a direct download link</i>",
                 parse_mode=enums.ParseMode.HTML
@@ -725,12 +906,13 @@ async def getlink_handler(client, message):
         
         links_text += "<i>Click the download link or use /getlink [ID]</i>"
         
-        await message.reply(links_text, parse_mode=enums.ParseMode.HTML, disable_web_page_preview=True)
+        await safe_reply(message, links_text, parse_mode=enums.ParseMode.HTML, disable_web_page_preview=True)
         return
     
     # Validate link
     if not direct_link_generator.is_link_valid(link_id):
-        await message.reply(
+        await safe_reply(
+            message,
             "❌ <b>Invalid or Expired Link</b>\n\n"
             f"<b>Link ID:</b> <code>{link_id}</code>\n\n"
             "<i>The link may have expired (3-hour limit) or doesn't exist</i>",
@@ -752,7 +934,8 @@ async def getlink_handler(client, message):
     expires_at = datetime.fromtimestamp(link_info["expires_at"])
     hours_remaining = (link_info["expires_at"] - time.time()) / 3600
     
-    await message.reply(
+    await safe_reply(
+        message,
         f"✅ <b>Direct Download Link Ready!</b>\n\n"
         f"📁 <b>File:</b> {filename[:60]}...\n"
         f"💾 <b>Size:</b> {get_readable_file_size(file_size)}\n"
@@ -782,7 +965,8 @@ async def dirlink_files_handler(client, message):
         dirlink_dir = direct_link_generator.DIRECT_DOWNLOAD_DIR
         
         if not os.path.exists(dirlink_dir):
-            await message.reply(
+            await safe_reply(
+                message,
                 "📭 <b>No Files</b>\n\n"
                 "The directdownloads directory is empty.\n\n"
                 "<i>Generate links with /dirlink to create files</i>",
@@ -810,7 +994,8 @@ async def dirlink_files_handler(client, message):
                     pass
         
         if not files:
-            await message.reply(
+            await safe_reply(
+                message,
                 "📭 <b>No Files</b>\n\n"
                 "The directdownloads directory is empty.\n\n"
                 "<i>Generate links with /dirlink to create files</i>",
@@ -849,102 +1034,152 @@ async def dirlink_files_handler(client, message):
             InlineKeyboardButton("🗑️ Delete All Files", callback_data="delete_all_dirlink_files")
         ]])
         
-        await message.reply(msg, reply_markup=buttons, parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, msg, reply_markup=buttons, parse_mode=enums.ParseMode.HTML)
         
     except Exception as e:
         logger.error(f"Error in dirlink_files_handler: {e}")
-        await message.reply(
+        await safe_reply(
+            message,
             f"❌ <b>Error</b>\n\n"
             f"Failed to list files: {str(e)}",
             parse_mode=enums.ParseMode.HTML
         )
 
 
-@app.on_message(filters.command("queue"))
-
-async def queue_handler(client, message):
-    """Show all active downloads with progress"""
-    if not await check_permissions(message):
-        return
+async def build_queue_snapshot():
+    """/queue sections - rebuilt by the snapshot service, not per command"""
+    total_tasks = (scheduler.active_count() + len(upload_stage.tracked)
+                   + len(metadata_stage.tracked) + scheduler.pending_count())
+    if total_tasks == 0:
+        return {"empty": "📭 <b>Queue is empty</b>\n\n<i>No active downloads at the moment</i>"}, {"total_tasks": 0}
     
-    total_tasks = len(ACTIVE_TASKS) + len(PENDING_TASKS)
+    # Latest torrent states from the shared poller (no API call)
+    torrent_dict = poller.torrents
     
-    if total_tasks == 0:
-        await message.reply("📭 <b>Queue is empty</b>\n\n<i>No active downloads at the moment</i>", parse_mode=enums.ParseMode.HTML)
-        return
+    header = f"📋 <b>Active Tasks ({scheduler.active_count()}/{scheduler.max_active})</b>\n\n"
     
-    try:
-        # Get all torrents from qBittorrent
-        all_torrents = qb.torrents_info()
-        torrent_dict = {t.hash: t for t in all_torrents}
-        
-        queue_text = f"📋 <b>Active Tasks ({len(ACTIVE_TASKS)}/{MAX_CONCURRENT_DOWNLOADS})</b>\n\n"
+    from progress import get_readable_file_size, get_readable_time, get_progress_bar
+    
+    # Show active downloads
+    active_text = ""
+    for idx, (t_hash, task_info) in enumerate(list(scheduler.active.items()), 1):
+        name = task_info.get("name", "Download")[:35]
         
-        from progress import get_readable_file_size, get_readable_time, get_progress_bar
+        # Check if torrent exists in qBittorrent
+        torrent = torrent_dict.get(t_hash)
         
-        # Show active downloads
-        for idx, (t_hash, task_info) in enumerate(ACTIVE_TASKS.items(), 1):
-            name = task_info.get("name", "Download")[:35]
-            
-            # Check if torrent exists in qBittorrent
-            torrent = torrent_dict.get(t_hash)
-            
-            if torrent:
-                # Determine state from qBittorrent
-                if torrent.state in ["downloading", "queuedDL", "stalledDL", "metaDL"]:
-                    status_icon = "⏬"
-                    progress = torrent.progress * 100
-                    progress_bar = get_progress_bar(progress)
-                    
-                    queue_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
-                    queue_text += f"{progress_bar} {progress:.1f}%\n"
-                    queue_text += f"💾 {get_readable_file_size(torrent.downloaded)} / {get_readable_file_size(torrent.size)}\n"
-                    
-                    speed_str = get_readable_file_size(torrent.dlspeed) + "/s"
-                    eta = torrent.eta if torrent.eta > 0 else 0
-                    eta_str = get_readable_time(eta) if eta > 0 else "∞"
-                    queue_text += f"⚡ {speed_str} | ⏱ {eta_str}\n"
-                    queue_text += f"🌱 S: {torrent.num_seeds} | P: {torrent.num_leechs}\n"
-                    
-                elif torrent.state in ["uploading", "stalledUP", "queuedUP", "pausedUP"]:
-                    status_icon = "📤"
-                    progress = 100.0
-                    progress_bar = get_progress_bar(progress)
-                    
-                    queue_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
-                    queue_text += f"{progress_bar} Uploading\n"
-                    queue_text += f"💾 {get_readable_file_size(torrent.size)}\n"
-                else:
-                    queue_text += f"⏸️ <b>#{idx}</b> {name}...\n"
-                    queue_text += f"<i>State: {torrent.state}</i>\n"
-            else:
-                # Torrent not in qBittorrent - uploading to Telegram
+        if torrent:
+            # Determine state from qBittorrent
+            if torrent.state in ["downloading", "queuedDL", "stalledDL", "metaDL"]:
+                status_icon = "⏬"
+                progress = torrent.progress * 100
+                progress_bar = get_progress_bar(progress)
+                
+                active_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
+                active_text += f"{progress_bar} {progress:.1f}%\n"
+                active_text += f"💾 {get_readable_file_size(torrent.downloaded)} / {get_readable_file_size(torrent.size)}\n"
+                
+                speed_str = get_readable_file_size(torrent.dlspeed) + "/s"
+                eta = torrent.eta if torrent.eta > 0 else 0
+                eta_str = get_readable_time(eta) if eta > 0 else "∞"
+                active_text += f"⚡ {speed_str} | ⏱ {eta_str}\n"
+                active_text += f"🌱 S: {torrent.num_seeds} | P: {torrent.num_leechs}\n"
+                health_line = health.describe(t_hash)
+                if health_line:
+                    active_text += f"{health_line}\n"
+                plan = upload_plans.get(t_hash)
+                if plan:
+                    active_text += (
+                        f"📦 {len(plan['files'])} files to upload | "
+                        f"{get_readable_file_size(plan['total_bytes'])} → {len(plan['targets'])} chats\n"
+                    )
+                
+            elif torrent.state in ["uploading", "stalledUP", "queuedUP", "pausedUP"]:
                 status_icon = "📤"
-                queue_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
-                queue_text += f"<i>Uploading to Telegram...</i>\n"
-            
-            queue_text += "\n"
-        
-        # Show pending tasks
-        if PENDING_TASKS:
-            queue_text += f"\n⏳ <b>Pending ({len(PENDING_TASKS)})</b>\n\n"
-            for idx, (magnet, msg, _) in enumerate(PENDING_TASKS[:5], 1):
-                # Extract name from magnet if possible
-                name = f"Pending #{idx}"
-                queue_text += f"⏸️ {name}\n"
-            if len(PENDING_TASKS) > 5:
-                queue_text += f"<i>... and {len(PENDING_TASKS) - 5} more</i>\n"
-        
-        # Add buttons
-        buttons = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_queue")],
-            [InlineKeyboardButton("✖️ Close", callback_data="close")]
-        ]
-        
-        await message.reply(queue_text, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+                progress = 100.0
+                progress_bar = get_progress_bar(progress)
+                
+                active_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
+                active_text += f"{progress_bar} Uploading\n"
+                active_text += f"💾 {get_readable_file_size(torrent.size)}\n"
+            else:
+                active_text += f"⏸️ <b>#{idx}</b> {name}...\n"
+                active_text += f"<i>State: {torrent.state}</i>\n"
+        else:
+            # Torrent not in qBittorrent - uploading to Telegram
+            status_icon = "📤"
+            active_text += f"{status_icon} <b>#{idx}</b> {name}...\n"
+            active_text += f"<i>Uploading to Telegram...</i>\n"
+        
+        active_text += "\n"
+    
+    # Show finished downloads waiting for / running in the upload stage
+    upload_jobs = [job for job in list(upload_stage.tracked.values()) if not scheduler.is_active(job["hash"])]
+    uploads_text = ""
+    if upload_jobs:
+        uploads_text += f"\n📤 <b>Uploading ({len(upload_jobs)})</b>\n\n"
+        for job in upload_jobs:
+            plan = job["plan"]
+            uploads_text += f"📤 {(job['name'] or 'Upload')[:35]}...\n"
+            uploads_text += (
+                f"📦 {job['uploaded']}/{job['total_files']} files | "
+                f"{get_readable_file_size(job['uploaded_bytes'])} / {get_readable_file_size(plan['total_bytes'])} | "
+                f"⏱ {get_readable_time(int(upload_plan.eta(plan, job['uploaded_bytes'])))}\n"
+            )
+    
+    # Show magnets still waiting for metadata (no slot held yet)
+    metadata_jobs = list(metadata_stage.tracked.values())
+    metadata_text = ""
+    if metadata_jobs:
+        metadata_text += f"\n🔎 <b>Fetching Metadata ({len(metadata_jobs)})</b>\n\n"
+        for job in metadata_jobs[:5]:
+            metadata_text += f"🔎 {(job.name or 'Magnet')[:35]}...\n"
+        if len(metadata_jobs) > 5:
+            metadata_text += f"<i>... and {len(metadata_jobs) - 5} more</i>\n"
+    
+    # Show pending tasks
+    pending_count = scheduler.pending_count()
+    pending_text = ""
+    if pending_count:
+        pending_text += f"\n⏳ <b>Pending ({pending_count})</b>\n\n"
+        for idx, job in enumerate(scheduler.pending_jobs(limit=5), 1):
+            name = (job.name or f"Pending #{idx}")[:35]
+            priority_name = task_scheduler.PRIORITY_NAMES.get(job.priority, "?")
+            pending_text += f"⏸️ {name} <i>({priority_name})</i>\n"
+        if pending_count > 5:
+            pending_text += f"<i>... and {pending_count - 5} more</i>\n"
+    
+    fragments = {
+        "header": header,
+        "active": active_text,
+        "uploads": uploads_text,
+        "metadata": metadata_text,
+        "pending": pending_text,
+    }
+    return fragments, {"total_tasks": total_tasks}
+
+snapshot_service.snapshots.register("queue", build_queue_snapshot)
+
+QUEUE_BUTTONS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_queue")],
+    [InlineKeyboardButton("✖️ Close", callback_data="close")]
+])
+
+@app.on_message(filters.command("queue"))
+async def queue_handler(client, message):
+    """Show active, uploading and pending tasks (from the shared snapshot)"""
+    if not await check_permissions(message):
+        return
+    
+    try:
+        snapshot = await snapshot_service.snapshots.get("queue")
+        if not snapshot.values["total_tasks"]:
+            await safe_reply(message, snapshot.text, parse_mode=enums.ParseMode.HTML)
+            return
+        await safe_reply(message, snapshot.text + snapshot.footer(), reply_markup=QUEUE_BUTTONS, parse_mode=enums.ParseMode.HTML)
         
     except Exception as e:
-        await message.reply(f"❌ <b>Error:</b> {e}", parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, f"❌ <b>Error:</b> {e}", parse_mode=enums.ParseMode.HTML)
 
 @app.on_message(filters.command("cancel"))
 async def cancel_handler(client, message):
@@ -952,19 +1187,18 @@ async def cancel_handler(client, message):
     if not await check_permissions(message):
         return
     
-    if not ACTIVE_TASKS:
-        await message.reply("❌ <b>No active downloads</b>\n\n<i>Nothing to cancel</i>", parse_mode=enums.ParseMode.HTML)
+    if not scheduler.active_count():
+        await safe_reply(message, "❌ <b>No active downloads</b>\n\n<i>Nothing to cancel</i>", parse_mode=enums.ParseMode.HTML)
         return
     
     # Cancel the first active download
     try:
-        t_hash = list(ACTIVE_TASKS.keys())[0]
-        qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
-        if t_hash in ACTIVE_TASKS:
-            del ACTIVE_TASKS[t_hash]
-        await message.reply("✅ <b>Download cancelled</b>\n\nThe download has been stopped and removed", parse_mode=enums.ParseMode.HTML)
+        t_hash = next(iter(scheduler.active))
+        await qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
+        scheduler.finish(t_hash)
+        await safe_reply(message, "✅ <b>Download cancelled</b>\n\nThe download has been stopped and removed", parse_mode=enums.ParseMode.HTML)
     except Exception as e:
-        await message.reply(f"❌ <b>Error:</b> {e}", parse_mode=enums.ParseMode.HTML)
+        await safe_reply(message, f"❌ <b>Error:</b> {e}", parse_mode=enums.ParseMode.HTML)
 
 @app.on_message(filters.command("settings"))
 async def settings_handler(client, message):
@@ -981,11 +1215,13 @@ async def settings_handler(client, message):
     size_4_icon = "🔘" if current_size == 4 else "⚪"
     mode_doc_icon = "🔘" if current_mode == "document" else "⚪"
     mode_vid_icon = "🔘" if current_mode == "video" else "⚪"
+    split_icon = "✅" if settings.get_setting("split_large_files") else "❌"
     
     text = (f"⚙️ <b>Settings</b>\n\n"
             f"📁 <b>Max File Size</b>\n"
             f"  {size_2_icon} 2GB\n"
-            f"  {size_4_icon} 4GB\n\n"
+            f"  {size_4_icon} 4GB\n"
+            f"  ✂️ Split larger files: {split_icon}\n\n"
             f"📤 <b>Upload Mode</b>\n"
             f"  {mode_doc_icon} Document\n"
             f"  {mode_vid_icon} Video\n\n"
@@ -1003,13 +1239,14 @@ async def settings_handler(client, message):
     buttons = InlineKeyboardMarkup([
         [InlineKeyboardButton(f"{size_2_icon} 2GB", callback_data="set_size_2")],
         [InlineKeyboardButton(f"{size_4_icon} 4GB", callback_data="set_size_4")],
+        [InlineKeyboardButton(f"✂️ Split Large Files {split_icon}", callback_data="toggle_split")],
         [InlineKeyboardButton(f"{mode_doc_icon} Document", callback_data="set_mode_doc")],
         [InlineKeyboardButton(f"{mode_vid_icon} Video", callback_data="set_mode_vid")],
         *thumb_buttons,
         [InlineKeyboardButton("✖️ Close", callback_data="close")]
     ])
     
-    await message.reply(text, reply_markup=buttons, parse_mode=enums.ParseMode.HTML)
+    await safe_reply(message, text, reply_markup=buttons, parse_mode=enums.ParseMode.HTML)
 
 @app.on_callback_query()
 async def callback_handler(client, callback):
@@ -1143,8 +1380,8 @@ async def callback_handler(client, callback):
             
             fake_msg = FakeMagnetMessage(magnet, callback.message)
             
-            # Trigger magnet download
-            await magnet_handler(client, fake_msg)
+            # Trigger magnet download (search picks queue behind manual requests)
+            await magnet_handler(client, fake_msg, priority=task_scheduler.PRIORITY_SEARCH)
             
         except Exception as e:
             logger.error(f"Torrent selection error: {e}")
@@ -1180,31 +1417,34 @@ async def callback_handler(client, callback):
     if data.startswith("cancel_"):
         t_hash = data.replace("cancel_", "")
         try:
-            qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
-            if t_hash in ACTIVE_TASKS:
-                del ACTIVE_TASKS[t_hash]
-            await callback.message.edit(f"✅ <b>Download Cancelled</b>\n\nTorrent has been removed from queue", parse_mode=enums.ParseMode.HTML)
+            upload_job = upload_stage.tracked.get(t_hash)
+            if upload_job:
+                upload_job["cancelled"] = True
+            pending_job = scheduler.find_pending(t_hash)
+            if pending_job:
+                scheduler.remove(pending_job.job_id)
+                tasks.remove(t_hash)
+            await qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
+            scheduler.finish(t_hash)
+            status_board.finish(t_hash)
+            if status_board.is_dashboard(callback.message):
+                # The dashboard stays - it drops the task on its next render
+                await callback.answer("✅ Download cancelled")
+            else:
+                await callback.message.edit(f"✅ <b>Download Cancelled</b>\n\nTorrent has been removed from queue", parse_mode=enums.ParseMode.HTML)
         except Exception as e:
             await callback.answer(f"Error cancelling: {e}", show_alert=True)
         return
     
-    # Handle Queue Refresh button
+    # Handle Queue Refresh button - shows the latest snapshot in place
     if data == "refresh_queue":
         await callback.answer("Refreshing...")
         try:
-            # Delete old message and show new queue status
-            old_msg = callback.message
-            await old_msg.delete()
-            
-            # Create a fake message object with user info for queue_handler
-            class FakeMessage:
-                def __init__(self, chat_id, from_user):
-                    self.chat = type('obj', (object,), {'id': chat_id})()
-                    self.from_user = from_user
-                    self.reply = old_msg.reply
-            
-            fake_msg = FakeMessage(old_msg.chat.id, callback.from_user)
-            await queue_handler(client, fake_msg)
+            snapshot = await snapshot_service.snapshots.get("queue")
+            if snapshot.values["total_tasks"]:
+                await safe_edit(callback.message, snapshot.text + snapshot.footer(), reply_markup=QUEUE_BUTTONS)
+            else:
+                await safe_edit(callback.message, snapshot.text)
         except Exception as e:
             logger.error(f"Refresh error: {e}")
         return
@@ -1348,8 +1588,8 @@ async def callback_handler(client, callback):
             
             fake_msg = FakeMagnetMessage(magnet, callback.message)
             
-            # Trigger magnet download
-            await magnet_handler(client, fake_msg)
+            # Trigger magnet download (search picks queue behind manual requests)
+            await magnet_handler(client, fake_msg, priority=task_scheduler.PRIORITY_SEARCH)
             
         except Exception as e:
             logger.error(f"Torrent download error: {e}")
@@ -1411,6 +1651,8 @@ async def callback_handler(client, callback):
         settings.update_setting("max_file_size", 2 * 1024**3)
     elif data == "set_size_4":
         settings.update_setting("max_file_size", 4 * 1024**3)
+    elif data == "toggle_split":
+        settings.update_setting("split_large_files", not settings.get_setting("split_large_files"))
     elif data == "set_mode_doc":
         settings.update_setting("upload_mode", "document")
     elif data == "set_mode_vid":
@@ -1428,11 +1670,13 @@ async def callback_handler(client, callback):
     size_4_icon = "🔘" if current_size == 4 else "⚪"
     mode_doc_icon = "🔘" if current_mode == "document" else "⚪"
     mode_vid_icon = "🔘" if current_mode == "video" else "⚪"
+    split_icon = "✅" if settings.get_setting("split_large_files") else "❌"
     
     text = (f"⚙️ <b>Settings</b>\n\n"
             f"📁 <b>Max File Size</b>\n"
             f"  {size_2_icon} 2GB\n"
-            f"  {size_4_icon} 4GB\n\n"
+            f"  {size_4_icon} 4GB\n"
+            f"  ✂️ Split larger files: {split_icon}\n\n"
             f"📤 <b>Upload Mode</b>\n"
             f"  {mode_doc_icon} Document\n"
             f"  {mode_vid_icon} Video\n\n"
@@ -1450,6 +1694,7 @@ async def callback_handler(client, callback):
     buttons = InlineKeyboardMarkup([
         [InlineKeyboardButton(f"{size_2_icon} 2GB", callback_data="set_size_2")],
         [InlineKeyboardButton(f"{size_4_icon} 4GB", callback_data="set_size_4")],
+        [InlineKeyboardButton(f"✂️ Split Large Files {split_icon}", callback_data="toggle_split")],
         [InlineKeyboardButton(f"{mode_doc_icon} Document", callback_data="set_mode_doc")],
         [InlineKeyboardButton(f"{mode_vid_icon} Video", callback_data="set_mode_vid")],
         *thumb_buttons,
@@ -1459,12 +1704,104 @@ async def callback_handler(client, callback):
     await callback.message.edit(text, reply_markup=buttons, parse_mode=enums.ParseMode.HTML)
     await callback.answer("Settings Updated!")
 
+FILES_CHECK_INTERVAL = 10  # Seconds between per-file progress checks while downloading
+
+def new_upload_job(t_hash, name, content_path, save_path, message, status_msg, plan):
+    """Upload stage work item for one torrent (files are fed in as they finish)"""
+    record = tasks.get(t_hash) or {}
+    return {
+        "hash": t_hash,
+        "name": name,
+        "content_path": content_path,
+        "save_path": save_path,
+        "message": message,
+        "status_msg": status_msg,
+        "plan": plan,
+        "files": asyncio.Queue(),  # Finished plan entries, None once the torrent is done
+        "skip": set(record.get("uploaded", [])),  # Relative paths uploaded before a restart
+        "next_file": 0,  # Index into the plan's file list
+        "total_files": len(plan["files"]),
+        "uploaded": 0,
+        "uploaded_bytes": 0,
+        "download_done": False,
+        "cancelled": False,
+        "interrupted": False,
+        "parked": True,  # Not held by the upload stage (not handed over yet, or between files)
+        "upload_state": None,  # Upload progress kept across parking (see upload_task)
+    }
+
+def make_upload_plan(files, save_path, chat_id, content_path=None):
+    """Plan a torrent's upload with the current channel and split settings"""
+    channels = channel_utils.get_channels() or [chat_id]
+    storage = storage_channel.get_storage_channel()
+    part_size = None
+    if settings.get_setting("split_large_files"):
+        part_size = split_utils.part_size_for(settings.get_setting("max_file_size"))
+    if content_path is not None:
+        return upload_plan.plan_from_disk(content_path, save_path, channels, storage, part_size)
+    return upload_plan.build_plan(files, save_path, channels, storage, part_size)
+
+async def torrent_files(t_hash):
+    """qBittorrent file list with each file's index filled in"""
+    files = await qb.torrents_files(t_hash)
+    for idx, torrent_file in enumerate(files):
+        torrent_file.setdefault("index", idx)
+    return files
+
+async def get_upload_plan(t_hash, save_path, chat_id):
+    """Plan made at metadata time (memory, then task record) or a fresh one"""
+    plan = upload_plans.get(t_hash) or (tasks.get(t_hash) or {}).get("plan")
+    if plan is None:
+        plan = make_upload_plan(await torrent_files(t_hash), save_path, chat_id)
+    upload_plans[t_hash] = plan
+    return plan
+
+async def collect_finished_files(t_hash, info, job):
+    """
+    Queue newly finished files of a torrent for upload, in plan order
+
+    Only the contiguous finished prefix is queued, so episodes reach Telegram
+    in order.
+    """
+    progress_by_index = {f["index"]: f.progress for f in await torrent_files(t_hash)}
+    entries = job["plan"]["files"]
+
+    while job["next_file"] < len(entries):
+        entry = entries[job["next_file"]]
+        if progress_by_index.get(entry["index"], 1) < 1:
+            break
+        if entry["rel_path"] not in job["skip"]:
+            job["files"].put_nowait(entry)
+        job["next_file"] += 1
+
+def upload_job_from_disk(job, record):
+    """Rebuild an upload job for a torrent qBittorrent no longer knows (after a restart)"""
+    t_hash = record["_id"]
+    content_path = record["content_path"]
+    save_path = record.get("save_path") or DOWNLOAD_DIR
+    plan = record.get("plan") or make_upload_plan(None, save_path, job.chat_id, content_path=content_path)
+    upload_plans[t_hash] = plan
+    upload_job = new_upload_job(t_hash, record.get("name"), content_path, save_path, job.message, job.status_msg, plan)
+
+    for entry in plan["files"]:
+        if entry["rel_path"] not in upload_job["skip"]:
+            upload_job["files"].put_nowait(entry)
+    upload_job["download_done"] = True
+    upload_job["files"].put_nowait(None)
+    upload_job["parked"] = False  # Goes straight to the upload stage
+    return upload_job
+
+async def announce_eviction(t_hash, record):
+    """Tell the user why the health engine is removing their torrent"""
+    if record.context:
+        await safe_edit(
+            record.context,
+            f"💀 <b>Dead Torrent Removed</b>\n\n<i>{record.reason}, even after reannouncing and adding trackers.</i>",
+            parse_mode=enums.ParseMode.HTML
+        )
+
 async def process_download(t_hash, message, status_msg):
-    """Process download independently (async task)"""
-    start_time = time.time()
-    stalled_start_time = None
-    DEAD_TORRENT_TIMEOUT = 600  # 10 minutes
-    
+    """Download stage: watch the torrent and feed finished files to the upload stage"""
     # Check disk space before starting (prevent storage full errors)
     try:
         has_space, free_bytes = storage_utils.check_disk_space(DOWNLOAD_DIR, required_bytes=2*1024**3)  # Require 2GB free
@@ -1480,259 +1817,539 @@ async def process_download(t_hash, message, status_msg):
     except Exception as e:
         logger.error(f"Error checking disk space: {e}")
     
+    # Dead torrents are detected and evicted by the shared health engine;
+    # eviction shows up here as the torrent being removed
+    health.track(t_hash, swarm_health.STAGE_DOWNLOAD, context=status_msg)
+    updates = poller.subscribe(t_hash)
+    info = poller.get(t_hash)
+    job = None
+    if info:
+        save_path = info.get("save_path") or DOWNLOAD_DIR
+        plan = await get_upload_plan(t_hash, save_path, message.chat.id)
+        job = new_upload_job(t_hash, info.name, info.content_path, save_path, message, status_msg, plan)
+    handed_off = False
+    completed = False
+    interrupted = False
+    last_files_check = 0
+    chat_id = status_msg.chat.id
+    cancel_data = f"cancel_{t_hash}"
+    
+    if info:
+        await safe_edit(
+            status_msg,
+            f"⬇️ <b>{info.name}</b>\n\n<i>Live progress is shown on the status board</i>",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data=cancel_data)]])
+        )
+    
     try:
         while True:
             if IS_SHUTTING_DOWN:
-                break
+                # Leave torrent and task record alone - the reconciler resumes it on startup
+                interrupted = True
+                return
             
-            try:
-                info_list = qb.torrents_info(torrent_hashes=t_hash)
-                if not info_list:
-                    if t_hash in ACTIVE_TASKS:
-                        del ACTIVE_TASKS[t_hash]
-                    return
-                info = info_list[0]
-                
-                # --- Dead Torrent Check ---
-                # Consider dead if: stalledDL, metaDL, or downloading with 0 speed/seeds
-                is_stalled = (info.state in ["stalledDL", "metaDL"]) or \
-                             (info.state == "downloading" and info.dlspeed == 0 and info.num_seeds == 0)
-
-                if is_stalled:
-                    if stalled_start_time is None:
-                        stalled_start_time = time.time()
-                    elif (time.time() - stalled_start_time) > DEAD_TORRENT_TIMEOUT:
-                        logger.info(f"Killing dead torrent: {info.name}")
-                        await safe_edit(
-                            status_msg,
-                            f"💀 <b>Dead Torrent Removed</b>\n\n"
-                            f"<i>Stalled for >{DEAD_TORRENT_TIMEOUT//60} mins with no activity.</i>",
-                            parse_mode=enums.ParseMode.HTML
-                        )
-                        qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
-                        if t_hash in ACTIVE_TASKS:
-                            del ACTIVE_TASKS[t_hash]
-                        return
-                else:
-                    # Reset if we see activity
-                    stalled_start_time = None
-                # --------------------------
-
-            except Exception:
-                await asyncio.sleep(3)
-                continue
+            if job is not None and job["cancelled"]:
+                # Upload stage failed while downloading - stop, the job cleans up when handed back
+                return
             
-            cancel_btn = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{t_hash}")]])
+            if info is None:
+                # Torrent removed from qBittorrent (cancelled or deleted)
+                scheduler.finish(t_hash)
+                return
             
             if info.state in ["metaDL", "checkingResumeData"]:
-                await safe_edit(
-                    status_msg,
-                    f"🔄 Preparing: {info.state}...\nSeeds: {info.num_seeds} | Peers: {info.num_leechs}",
-                    reply_markup=cancel_btn
+                status_board.update(
+                    chat_id, t_hash, status="metadata", name=info.name, cancel=cancel_data,
+                    state=info.state, seeds=info.num_seeds, peers=info.num_leechs
                 )
-                await asyncio.sleep(3)
-                continue
+            
+            elif info.state in ["downloading", "queuedDL", "stalledDL"]:
+                # Start uploading finished files (e.g. early episodes) while the rest downloads
+                if info.progress > 0 and time.time() - last_files_check >= FILES_CHECK_INTERVAL:
+                    last_files_check = time.time()
+                    try:
+                        await collect_finished_files(t_hash, info, job)
+                    except Exception as e:
+                        logger.debug(f"Per-file progress check failed for {t_hash}: {e}")
+                    # Never wait here - the upload queue being full must not stall monitoring
+                    if resume_upload(job):
+                        handed_off = True
                 
-            if info.state in ["downloading", "queuedDL", "stalledDL"]:
-                await progress.progress_for_pyrogram(
-                    info.downloaded, 
-                    info.total_size, 
-                    status_msg, 
-                    start_time, 
-                    f"⬇️ <b>Downloading: {info.name}</b>",
-                    reply_markup=cancel_btn
+                tracker = progress.trackers.track(t_hash).update(info.downloaded, info.total_size)
+                status_board.update(
+                    chat_id, t_hash, status="downloading", name=info.name, cancel=cancel_data,
+                    progress=info.downloaded / info.total_size if info.total_size else 0,
+                    downloaded=info.downloaded, size=info.total_size,
+                    speed=tracker.speed, eta=tracker.eta(),
+                    uploaded_count=job["uploaded"], total_files=job["total_files"]
                 )
-                await asyncio.sleep(5)
-                
+            
             elif info.state in ["uploading", "stalledUP", "queuedUP", "pausedUP"]:
                 break
-                
+            
             elif info.state in ["error", "missingFiles"]:
                 await safe_edit(status_msg, "❌ Download Error in qBittorrent.")
-                if t_hash in ACTIVE_TASKS:
-                    del ACTIVE_TASKS[t_hash]
+                scheduler.finish(t_hash)
                 return
+            
+            # Sleep until the poller reports a change
+            info = await poller.next_update(t_hash, updates)
+        
+        task_info = scheduler.active.get(t_hash)
+        if task_info:
+            task_info["stage"] = "uploading"
+        tasks.save(t_hash, task_store.STAGE_UPLOADING, content_path=info.content_path, save_path=job["save_path"])
+        status_board.update(chat_id, t_hash, status="uploading", name=info.name)
+        
+        # Queue whatever is left, then tell the upload stage no more files are coming
+        job["name"] = info.name
+        job["content_path"] = info.content_path
+        await collect_finished_files(t_hash, info, job)
+        job["download_done"] = True
+        job["files"].put_nowait(None)
+        completed = True
+        
+        if job["parked"]:
+            # Waits here while the upload queue is full, which keeps this download
+            # slot busy instead of piling finished torrents on disk
+            if not handed_off:
+                await safe_edit(status_msg, "✅ Download Complete. Waiting for an upload slot...")
+            job["parked"] = False
+            await upload_stage.put(job)
+            handed_off = True
+    
+    finally:
+        poller.unsubscribe(t_hash, updates)
+        health.untrack(t_hash)
+        
+        if handed_off:
+            if not completed:
+                # Download failed after early uploads began - stop the upload job,
+                # it cleans up the torrent itself
+                job["cancelled"] = True
+                job["interrupted"] = interrupted
+                job["files"].put_nowait(None)
+                if job["parked"]:
+                    # Parked between files - it needs a worker to finish and clean up
+                    job["parked"] = False
+                    asyncio.create_task(upload_stage.put(job))
+        elif not interrupted:
+            last_info = poller.get(t_hash) or info
+            await cleanup_torrent(t_hash, last_info.content_path if last_info else None)
+        
+        scheduler.finish(t_hash)
+        
+        # Slot is free as soon as the download is done - start the next pending job
+        await dispatch_pending()
+
+async def deliver_piece(job, ctx, source, rel_path, file_name, size, caption, label, content_hash, ready):
+    """
+    Put one upload (a whole file or one part of it) into every target chat
+
+    Returns:
+        bool: True if at least one chat received it
+    """
+    t_hash = job["hash"]
+    board_chat = job["status_msg"].chat.id
+    targets = ctx["targets"]
+    
+    # Same content uploaded before? Post it by file_id without sending bytes
+    cached = file_ids.lookup(t_hash, rel_path, size, content_hash)
+    if cached:
+        await ready.wait()
+        # The file_id only works for the bot that uploaded it - otherwise copy the message
+        owner = upload_pool.member(cached.get("uploader") or upload_pool.main.bot_id)
+        rejected = []
+        failed = await upload_utils.fan_out(
+            owner.client if owner else app,
+            cached["file_id"] if owner else None,
+            targets, caption,
+            source=(cached["chat_id"], cached["message_id"]),
+            rejected=rejected
+        )
+        if len(failed) < len(targets) or not rejected:
+            # Only FloodWaits / chat errors - the file_id is fine, /replay retries with it
+            if failed:
+                dead_letters.add(
+                    t_hash, rel_path, failed, file_name, caption, size, mode=ctx["mode"],
+                    file_id=cached["file_id"], uploader=cached.get("uploader") or upload_pool.main.bot_id,
+                    source=(cached["chat_id"], cached["message_id"]), error="fan-out failed"
+                )
+            if failed and len(failed) == len(targets):
+                return False
+            logger.info(f"⚡ Posted {file_name} from the file_id cache")
+            return True
+        # file_id no longer accepted (e.g. bot token changed) - upload again
+        file_ids.invalidate(cached)
+    
+    up_start = time.time()
+    
+    transfer = f"upload:{rel_path}"
+    
+    async def progress_callback(current, total):
+        tracker = progress.trackers.track(t_hash, transfer).update(current, total)
+        status_board.update(
+            board_chat, t_hash, name=job["name"], uploaded_count=job["uploaded"], total_files=job["total_files"],
+            upload_name=f"{file_name} ({label})", upload_current=current, upload_total=total,
+            upload_speed=tracker.speed
+        )
+    
+    uploaded_msg = None
+    uploader = None
+    error = None
+    
+    # Upload the bytes once - try the next chat only if this one fails.
+    # Accepted parts are checkpointed, so retries resume instead of starting over;
+    # a short FloodWait is waited out on the same bot (its parts are only valid
+    # there), a long one hands the file to the next pool member.
+    prefer = upload_pool.member(uploads.owner(t_hash, rel_path, size))
+    for origin in ctx["origins"]:
+        if origin != ctx["storage"]:
+            await ready.wait()
+        tried = []
+        failures = 0
+        while uploaded_msg is None:
+            async with upload_pool.lease(size, exclude=tried, prefer=prefer) as member:
+                try:
+                    uploaded_msg = await upload_utils.send_file(
+                        member.client, origin, source, file_name, caption,
+                        thumb=ctx["thumb"], mode=ctx["mode"], progress=progress_callback,
+                        connections=UPLOAD_CONNECTIONS,
+                        checkpoint=uploads.checkpoint(t_hash, rel_path, size, member.bot_id)
+                    )
+                    uploader = member
+                    member.uploaded_bytes += size
+                    upload_plan.upload_speed.observe(size, time.time() - up_start)
+                except FloodWait as e:
+                    error = e
+                    upload_pool.on_flood_wait(member, origin, e.value)
+                    if e.value <= UPLOAD_RESUME_WAIT:
+                        logger.warning(f"Upload FloodWait: resuming {file_name} in {e.value}s")
+                        prefer = member
+                        await asyncio.sleep(e.value)
+                        continue
+                    tried.append(member)
+                    prefer = None
+                    if upload_pool.pick(exclude=tried) is None:
+                        break
+                except Exception as e:
+                    error = e
+                    failures += 1
+                    logger.error(
+                        f"Failed to upload {file_name} to channel {origin} via bot {member.bot_id} "
+                        f"(attempt {failures}/{UPLOAD_RETRIES}): {e}"
+                    )
+                    if failures >= UPLOAD_RETRIES:
+                        break
+                    prefer = member
+                    await asyncio.sleep(5 * failures)
+        if uploaded_msg is not None:
+            break
+    progress.trackers.release(t_hash, transfer)
+    
+    if uploaded_msg is None:
+        # Keep the bytes for /replay before the torrent is cleaned up
+        path, offset, _, _ = upload_engine.source_range(source)
+        dead_letters.add(
+            t_hash, rel_path, targets, file_name, caption, size, mode=ctx["mode"],
+            path=path, disk_rel_path=os.path.relpath(path, job["save_path"]), offset=offset, error=error
+        )
+        return False
+    media = upload_utils.get_media(uploaded_msg)
+    file_ids.store(t_hash, rel_path, size, uploaded_msg, media, content_hash, uploader=uploader.bot_id)
+    
+    # Fan out by file_id: one cheap API call per remaining channel
+    remaining = [chat_id for chat_id in targets if chat_id != uploaded_msg.chat.id]
+    if remaining:
+        await ready.wait()
+        status_board.update(board_chat, t_hash, upload_name=f"📨 {file_name} ({label}) → {len(remaining)} channels")
+        failed = await upload_utils.fan_out(
+            uploader.client, media.file_id, remaining, caption,
+            source=(uploaded_msg.chat.id, uploaded_msg.id)
+        )
+        if failed:
+            logger.error(f"{file_name} missing in {len(failed)} channels: {failed}")
+            dead_letters.add(
+                t_hash, rel_path, failed, file_name, caption, size, mode=ctx["mode"],
+                file_id=media.file_id, uploader=uploader.bot_id,
+                source=(uploaded_msg.chat.id, uploaded_msg.id), error="fan-out failed"
+            )
+    return True
+
+async def replay_dead_letters(entries):
+    """
+    Deliver dead-letter entries through the rate-governed uploader
+
+    Each spooled file is uploaded at most once per replay; later entries of the
+    same file only post its new file_id.
+
+    Returns:
+        tuple: (delivered, failed, given up)
+    """
+    delivered = failed = dropped = 0
+    uploaded = {}  # {(t_hash, rel_path): (file_id, uploader, source)}
+    
+    for entry in entries:
+        chat_id = entry["chat_id"]
+        known = uploaded.get((entry["t_hash"], entry["rel_path"]))
+        if known:
+            entry.update(file_id=known[0], uploader=known[1], source=known[2])
+        try:
+            if entry.get("file_id"):
+                owner = upload_pool.member(entry.get("uploader"))
+                if await upload_utils.fan_out(
+                    owner.client if owner else app,
+                    entry["file_id"] if owner else None,
+                    [chat_id], entry["caption"],
+                    source=tuple(entry["source"]) if entry.get("source") else None
+                ):
+                    raise IOError("fan-out failed")
+            else:
+                source = entry["path"]
+                if entry.get("offset") or entry["length"] != os.path.getsize(entry["path"]):
+                    source = split_utils.FileSlice(entry["path"], entry["offset"], entry["length"], name=entry["file_name"])
+                try:
+                    async with upload_pool.lease(entry["length"]) as member:
+                        sent = await upload_utils.send_file(
+                            member.client, chat_id, source, entry["file_name"], entry["caption"],
+                            mode=entry.get("mode", "document"), connections=UPLOAD_CONNECTIONS
+                        )
+                finally:
+                    if not isinstance(source, str):
+                        source.close()
+                media = upload_utils.get_media(sent)
+                known = (media.file_id, member.bot_id, [sent.chat.id, sent.id])
+                uploaded[(entry["t_hash"], entry["rel_path"])] = known
+                dead_letters.remember_upload(entry, *known)
+            dead_letters.resolve(entry)
+            delivered += 1
+        except Exception as e:
+            if isinstance(e, FloodWait):
+                rate_limiter.limiter.on_flood_wait(chat_id, e.value, kind=rate_limiter.KIND_UPLOAD)
+            logger.error(f"Replay of {entry['file_name']} to {chat_id} failed: {e}")
+            if dead_letters.fail(entry, e):
+                dropped += 1
+            else:
+                failed += 1
+    
+    return delivered, failed, dropped
 
-        # Upload to Telegram
-        await safe_edit(status_msg, "✅ Download Complete. Preparing upload...")
-        
-        from rename_utils import rename_for_upload
-        from natsort import natsorted
-        
-        content_path = info.content_path
-        files_to_upload = []
+async def deliver_file(job, ctx, entry, idx, ready, done):
+    """
+    Deliver one planned file to every target chat
+    
+    Bytes sent to the storage channel may overlap with other files; anything that
+    posts into a user-visible chat waits for `ready` (the previous file) so files
+    still appear in natsorted order.
+    """
+    t_hash = job["hash"]
+    file_to_upload = entry["path"]
+    
+    try:
+        # Name, caption, size and parts were fixed when the plan was built; the
+        # upload name is the cleaned one - the file on disk keeps its original
+        # name while qBittorrent still owns the torrent
+        rel_path = entry["rel_path"]
+        file_name = entry["file_name"]
+        file_size = entry["size"]
+        file_caption = entry["caption"]
+        parts = entry["parts"]
+        
+        file_label = f"{idx}/{job['total_files']}" if job["total_files"] else f"{idx}"
+        
+        if job["download_done"]:
+            status_board.update(
+                job["status_msg"].chat.id, t_hash, status="uploading", name=job["name"],
+                cancel=f"cancel_{t_hash}", upload_name=f"{file_name} ({file_label})"
+            )
         
-        if os.path.isfile(content_path):
-            files_to_upload.append(content_path)
+        if len(parts) == 1:
+            content_hash = None
+            if file_ids.use_content_hash and file_ids.available():
+                content_hash = await asyncio.to_thread(file_cache.fast_hash, file_to_upload, file_size)
+            sent = await deliver_piece(
+                job, ctx, file_to_upload, rel_path, file_name, file_size,
+                file_caption, file_label, content_hash, ready
+            )
         else:
-            for root, dirs, files in sorted(os.walk(content_path)):
-                for file in natsorted(files):
-                    file_path = os.path.join(root, file)
-                    files_to_upload.append(file_path)
-        
-        if not files_to_upload:
-            await safe_edit(status_msg, "❌ No files found to upload.")
-            if t_hash in ACTIVE_TASKS:
-                del ACTIVE_TASKS[t_hash]
+            # Oversized: stream byte ranges of the original file as numbered parts
+            logger.info(f"✂️ Splitting {file_name} into {len(parts)} parts")
+            sent = True
+            for number, (offset, length) in enumerate(parts, 1):
+                name = split_utils.part_name(file_name, number)
+                with split_utils.FileSlice(file_to_upload, offset, length, name=name) as part:
+                    # A failed part lands in the dead-letter queue - keep going so /replay can complete the set
+                    sent = await deliver_piece(
+                        job, ctx, part, f"{rel_path}.{number:03d}", name, length,
+                        split_utils.part_caption(file_caption, number, len(parts)),
+                        f"{file_label} · part {number}/{len(parts)}", None, ready
+                    ) and sent
+        
+        if not sent:
             return
         
-        if len(files_to_upload) > 50:
-            await safe_edit(status_msg, f"⚠️ Found {len(files_to_upload)} files. This may take a while. Auto-continuing in 10s...")
-            await asyncio.sleep(10)
+        tasks.mark_uploaded(t_hash, rel_path)
+        job["uploaded"] += 1
+        job["uploaded_bytes"] += file_size
+    
+    except Exception as e:
+        logger.error(f"Failed to upload {file_to_upload}: {e}")
+    finally:
+        # Let the next file post even if this one failed
+        await ready.wait()
+        done.set()
+
+async def upload_task(job):
+    """
+    Upload stage: send a torrent's files to Telegram as they finish, then clean up
+    
+    While the torrent is still downloading and no finished file is waiting, the
+    job is parked and the worker freed for other torrents; the download stage
+    hands it back when more files finish (see resume_upload).
+    """
+    t_hash = job["hash"]
+    message = job["message"]
+    status_msg = job["status_msg"]
+    parked = False
+    
+    try:
+        state = job["upload_state"]
+        if state is None:
+            if job["cancelled"]:
+                # Failed before anything was sent (see below) - only the cleanup is left
+                return
+            user_id = message.from_user.id
+            
+            # Bytes go to one chat (storage channel if set), every other chat gets the file_id
+            plan = job["plan"]
+            storage = plan["storage"]
+            ready = asyncio.Event()
+            ready.set()
+            state = job["upload_state"] = {
+                "ctx": {
+                    "mode": settings.get_setting("upload_mode"),
+                    "thumb": await thumb_utils.get_user_thumbnail(user_id),
+                    "origins": plan["origins"],
+                    "targets": plan["targets"],
+                    "storage": storage,
+                },
+                # Several files may upload at once when they land in the storage channel first;
+                # the rate limiter inside upload_utils is the only pacing
+                "slots": asyncio.Semaphore(UPLOAD_PARALLEL_FILES if storage else 1),
+                "ready": ready,  # Set once the last queued file has posted
+                "deliveries": [],
+                "idx": 0,
+            }
+        ctx = state["ctx"]
+        slots = state["slots"]
         
-        mode = settings.get_setting("upload_mode")
-        uploaded_count = 0
-        user_id = message.from_user.id
-        user_thumb = await thumb_utils.get_user_thumbnail(user_id)
+        while True:
+            if job["files"].empty() and not job["download_done"] and not job["cancelled"]:
+                # Finish what is in flight, then give the worker back instead of
+                # waiting here for the rest of the torrent to download
+                await asyncio.gather(*state["deliveries"])
+                state["deliveries"] = []
+                if job["files"].empty() and not job["download_done"] and not job["cancelled"]:
+                    job["parked"] = parked = True
+                    return
+                continue
+            entry = await job["files"].get()
+            if entry is None or job["cancelled"]:
+                break
+            if IS_SHUTTING_DOWN:
+                # Uploaded files are recorded - the rest is resumed on startup
+                job["interrupted"] = True
+                break
+            state["idx"] += 1
+            
+            await slots.acquire()
+            done = asyncio.Event()
+            delivery = asyncio.create_task(deliver_file(job, ctx, entry, state["idx"], state["ready"], done))
+            delivery.add_done_callback(lambda _: slots.release())
+            state["deliveries"].append(delivery)
+            state["ready"] = done
         
-        upload_channels = channel_utils.get_channels()
-        if not upload_channels:
-            upload_channels = [message.chat.id]
+        await asyncio.gather(*state["deliveries"])
         
-        total_uploads = len(files_to_upload) * len(upload_channels)
-        if total_uploads > 100:
-            await safe_edit(
-                status_msg,
-                f"⚠️ <b>Large upload!</b>\n\n{len(files_to_upload)} files × {len(upload_channels)} channels = {total_uploads} uploads\n\nAuto-continuing in 10s...",
-                parse_mode=enums.ParseMode.HTML
-            )
-            await asyncio.sleep(10)
+        if job["cancelled"] or job["interrupted"]:
+            return
         
-        for idx, file_to_upload in enumerate(files_to_upload, 1):
-            try:
-                if t_hash not in ACTIVE_TASKS:
-                    return
-                
-                new_path = rename_for_upload(file_to_upload)
-                if new_path != file_to_upload and not os.path.exists(new_path):
-                    os.rename(file_to_upload, new_path)
-                    file_to_upload = new_path
-                
-                file_name = os.path.basename(file_to_upload)
-                file_size = os.path.getsize(file_to_upload)
-                
-                if file_size == 0:
-                    logger.warning(f"Skipping zero-byte file: {file_name}")
-                    continue
-                
-                if idx % 3 == 1 or len(files_to_upload) == 1:
-                    await safe_edit(status_msg, f"📤 Uploading {idx}/{len(files_to_upload)}: {file_name[:30]}...")
-                
-                up_start = time.time()
-                
-                async def progress_callback(current, total):
-                    try:
-                        await progress.progress_for_pyrogram(
-                            current, total, status_msg, up_start, 
-                            f"⬆️ <b>{file_name} ({idx}/{len(files_to_upload)})</b>"
-                        ) 
-                    except Exception:
-                        pass
-
-                for channel_idx, channel_id in enumerate(upload_channels, 1):
-                    try:
-                        channel_id = int(channel_id) if isinstance(channel_id, str) else channel_id
-                        
-                        if len(upload_channels) > 1:
-                            await safe_edit(
-                                status_msg,
-                                f"📤 File {idx}/{len(files_to_upload)} → Channel {channel_idx}/{len(upload_channels)}\n{file_name[:40]}...",
-                                parse_mode=enums.ParseMode.HTML
-                            )
-                        
-                        
-                        # Generate professional caption
-                        file_caption = caption_utils.generate_caption(file_name)
-                        
-                        if mode == "document":
-                            await app.send_document(
-                                chat_id=channel_id,
-                                document=file_to_upload,
-                                thumb=user_thumb,
-                                caption=file_caption,
-                                parse_mode=enums.ParseMode.HTML,
-                                progress=progress_callback if channel_idx == 1 else None
-                            )
-                        else:
-                            await app.send_video(
-                                chat_id=channel_id,
-                                video=file_to_upload,
-                                thumb=user_thumb,
-                                caption=file_caption,
-                                parse_mode=enums.ParseMode.HTML,
-                                progress=progress_callback if channel_idx == 1 else None
-                            )
-                        
-                        if channel_idx < len(upload_channels):
-                            await asyncio.sleep(2)
-                    
-                    except FloodWait as e:
-                        logger.warning(f"Upload FloodWait: Sleeping {e.value}s")
-                        await asyncio.sleep(e.value + 10)
-                        # Retry uploading to this channel could be added here, but complex in loop
-                    except Exception as e:
-                        logger.error(f"Failed to upload {file_name} to channel {channel_id}: {e}")
-                        continue
-                
-                uploaded_count += 1
-                await asyncio.sleep(3)  # Increased from 1s
-                if uploaded_count % 5 == 0:  # Every 5 files (was 10)
-                    logger.info(f"Rate limit pause after {uploaded_count} files")
-                    await asyncio.sleep(10)  # Sleep 10s (was 2s)
-                    
-            except Exception as e:
-                logger.error(f"Failed to upload {file_to_upload}: {e}")
-                continue
+        if not job["uploaded"]:
+            await safe_edit(status_msg, "❌ No files found to upload.")
+            return
         
         from progress import get_readable_file_size
-        total_size = sum(os.path.getsize(f) for f in files_to_upload if os.path.exists(f))
-        size_str = get_readable_file_size(total_size)
+        size_str = get_readable_file_size(job["uploaded_bytes"])
         
         completion_text = (
             f"✅ <b>Upload Complete!</b>\n\n"
             f"📊 <b>Summary:</b>\n"
-            f"• Files uploaded: {uploaded_count}\n"
+            f"• Files uploaded: {job['uploaded']}\n"
             f"• Total size: {size_str}\n\n"
             f"<i>All files have been cleaned up</i>"
         )
         await safe_edit(status_msg, completion_text, parse_mode=enums.ParseMode.HTML)
     
+    except Exception:
+        if not job["download_done"] and not job["cancelled"]:
+            # The download stage still feeds this job - stop it first; it hands the
+            # job back once torn down and that run deletes the torrent
+            job["cancelled"] = True
+            job["parked"] = parked = True
+            if state is not None:
+                state["deliveries"] = []
+        raise
+    
     finally:
-        try:
-            info_list = qb.torrents_info(torrent_hashes=t_hash)
-            if info_list:
-                content_path = info_list[0].content_path
-                if os.path.exists(content_path):
-                    logger.info(f"Deleting downloaded files: {content_path}")
-                    if os.path.isdir(content_path):
-                        import shutil
-                        shutil.rmtree(content_path)
-                    else:
-                        os.remove(content_path)
-        except Exception as e:
-            logger.error(f"File cleanup error: {e}")
-        
-        try:
-            from fs_utils import clean_unwanted
-            await clean_unwanted(DOWNLOAD_DIR)
-        except Exception as e:
-            logger.error(f"Cleanup error: {e}")
-        
-        try:
-            qb.torrents_delete(torrent_hashes=t_hash, delete_files=False)
-        except Exception:
-            pass
-            
-        if t_hash in ACTIVE_TASKS:
-            del ACTIVE_TASKS[t_hash]
-        
-        # Auto-start pending downloads
-        if PENDING_TASKS and len(ACTIVE_TASKS) < MAX_CONCURRENT_DOWNLOADS:
-            magnet_link, msg, status_msg = PENDING_TASKS.pop(0)
-            logger.info(f"Auto-starting pending download. Remaining pending: {len(PENDING_TASKS)}")
-            await safe_edit(status_msg, "🔄 <b>Starting download...</b>\n\n<i>Slot became available!</i>", parse_mode=enums.ParseMode.HTML)
-            # Re-trigger magnet handler logic
-            await magnet_handler(app, msg, existing_status_msg=status_msg)
+        if not parked and not job["interrupted"] and (job["download_done"] or job["cancelled"]):
+            await cleanup_torrent(t_hash, job["content_path"])
+
+def resume_upload(job):
+    """
+    Hand a parked upload job (back) to the upload stage once files are waiting
+    
+    Never waits - with a full upload queue the job stays parked and is retried
+    on the next check.
+    
+    Returns:
+        bool: True if the upload stage holds the job now
+    """
+    if not job["parked"]:
+        return True
+    if job["files"].empty() or not upload_stage.try_put(job):
+        return False
+    job["parked"] = False
+    return True
+
+async def cleanup_torrent(t_hash, content_path):
+    """Delete downloaded files and drop the torrent from qBittorrent"""
+    status_board.finish(t_hash)
+    progress.trackers.release(t_hash)
+    
+    try:
+        if content_path and os.path.exists(content_path):
+            logger.info(f"Deleting downloaded files: {content_path}")
+            if os.path.isdir(content_path):
+                shutil.rmtree(content_path)
+            else:
+                os.remove(content_path)
+    except Exception as e:
+        logger.error(f"File cleanup error: {e}")
+    
+    try:
+        from fs_utils import clean_unwanted
+        await clean_unwanted(DOWNLOAD_DIR)
+    except Exception as e:
+        logger.error(f"Cleanup error: {e}")
+    
+    try:
+        await qb.torrents_delete(torrent_hashes=t_hash, delete_files=False)
+    except Exception:
+        pass
+    
+    tasks.remove(t_hash)
+    uploads.remove_task(t_hash)
+    upload_plans.pop(t_hash, None)
 
 @app.on_message(filters.text & filters.private)
 async def text_handler(client, message):
@@ -1746,7 +2363,8 @@ async def text_handler(client, message):
         if detected:
             channel_name = message.forward_from_chat.title or "Unknown"
             channel_id = message.forward_from_chat.id
-            msg = await message.reply(
+            msg = await safe_reply(
+                message,
                 f"✅ <b>Storage Channel Set!</b>\n\n"
                 f"📢 <b>Name:</b> {channel_name}\n"
                 f"🆔 <b>ID:</b> <code>{channel_id}</code>\n\n"
@@ -1756,7 +2374,7 @@ async def text_handler(client, message):
             
             delay = settings.get_setting("auto_delete_delay")
             if delay > 0:
-                asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+                auto_delete.schedule_delete(msg, delay)
             return
     
     text = message.text.strip()
@@ -1772,135 +2390,331 @@ async def text_handler(client, message):
         await magnet_handler(client, message)
         return
 
-@app.on_message(filters.regex(r"^magnet:\?xt=urn:btih:[a-zA-Z0-9]*"))
-async def magnet_handler(client, message, existing_status_msg=None):
-    """Non-blocking magnet handler - spawns async tasks"""
-    if IS_SHUTTING_DOWN:
-        if existing_status_msg:
-             await safe_edit(existing_status_msg, "⚠️ Bot is restarting. Please wait.")
-        else:
-             await message.reply("⚠️ Bot is restarting. Please wait.")
-        return
+class QueuedJobMessage:
+    """Minimal message stand-in for jobs restored from MongoDB"""
+    def __init__(self, client, job):
+        self.client = client
+        self.text = job.magnet
+        self.chat = type('obj', (object,), {'id': job.chat_id})
+        self.from_user = type('obj', (object,), {'id': job.user_id})
+    
+    async def reply(self, text, parse_mode=None, reply_markup=None):
+        return await self.client.send_message(
+            self.chat.id,
+            text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
 
-    if not await check_permissions(message):
+async def attach_job_runtime(job):
+    """Give a job restored from MongoDB a message to reply to and its old status message"""
+    if job.message is None:
+        job.message = QueuedJobMessage(app, job)
+    if job.status_msg is None and job.status_msg_id:
+        # Keep editing the original status message
+        try:
+            job.status_msg = await app.get_messages(job.chat_id, job.status_msg_id)
+        except Exception as e:
+            logger.debug(f"Could not fetch status message for job {job.job_id}: {e}")
+
+def record_job(t_hash, job, stage):
+    """Persist a job's lifecycle step so a restart can pick it up again"""
+    tasks.save(
+        t_hash,
+        stage,
+        magnet=job.magnet,
+        user_id=job.user_id,
+        chat_id=job.chat_id,
+        priority=job.priority,
+        name=job.name,
+        status_msg_id=job.status_msg_id
+    )
+
+async def dispatch_pending():
+    """Start pending jobs (highest priority first) while download slots are free"""
+    while scheduler.has_free_slot() and not IS_SHUTTING_DOWN:
+        job = scheduler.pop()
+        if job is None:
+            return
+        
+        logger.info(f"Auto-starting pending download. Remaining pending: {scheduler.pending_count()}")
+        
+        await attach_job_runtime(job)
+        if job.status_msg:
+            await safe_edit(job.status_msg, "🔄 <b>Starting download...</b>\n\n<i>Slot became available!</i>", parse_mode=enums.ParseMode.HTML)
+        
+        await start_download(job)
+
+async def reconcile_tasks():
+    """
+    Match task records left by a previous run against qBittorrent and the disk:
+    unfinished downloads resume, pending uploads continue from the last uploaded
+    file, and bot torrents nobody owns any more are removed
+    """
+    try:
+        await qb.wait_until_ready()
+        torrents = {
+            t.hash: t for t in await qb.torrents_info(tag=magnet_utils.BOT_TAG)
+            if magnet_utils.DIRLINK_TAG not in (t.get("tags") or "")
+        }
+    except Exception as e:
+        logger.error(f"Task reconcile skipped, qBittorrent unavailable: {e}")
         return
     
-    if len(ACTIVE_TASKS) >= MAX_CONCURRENT_DOWNLOADS:
-        # Add to pending queue
-        magnet_link = message.text.strip()
-        if existing_status_msg:
-             status_msg = existing_status_msg
-             await safe_edit(status_msg, 
-                f"⏸️ <b>Queue is full!</b>\n\n"
-                f"Currently: {len(ACTIVE_TASKS)}/{MAX_CONCURRENT_DOWNLOADS} active\n"
-                f"Pending: {len(PENDING_TASKS) + 1}\n\n"
-                f"<i>Your download will start automatically when a slot frees up</i>",
-                parse_mode=enums.ParseMode.HTML
-             )
-        else:
-            status_msg = await message.reply(
-                f"⏸️ <b>Queue is full!</b>\n\n"
-                f"Currently: {len(ACTIVE_TASKS)}/{MAX_CONCURRENT_DOWNLOADS} active\n"
-                f"Pending: {len(PENDING_TASKS) + 1}\n\n"
-                f"<i>Your download will start automatically when a slot frees up</i>",
-                parse_mode=enums.ParseMode.HTML
+    # Read the records after listing qBittorrent, so a torrent added in between
+    # already has its record and is not mistaken for an orphan
+    records = tasks.load()
+    if records is None:
+        logger.warning("Task records unavailable - keeping all bot torrents, nothing is removed as orphaned")
+    
+    for action, record, torrent in task_store.plan_reconcile(records, torrents):
+        try:
+            if action == task_store.ACTION_DELETE_ORPHAN:
+                logger.info(f"Removing orphaned torrent: {torrent.get('name')} ({torrent.hash})")
+                await qb.torrents_delete(torrent_hashes=torrent.hash, delete_files=True)
+                continue
+            if action == task_store.ACTION_WAIT_QUEUE:
+                continue
+            
+            job = task_scheduler.Job(
+                magnet=record["magnet"],
+                user_id=record["user_id"],
+                chat_id=record["chat_id"],
+                priority=record.get("priority", task_scheduler.PRIORITY_MANUAL),
+                name=record.get("name"),
+                status_msg_id=record.get("status_msg_id")
             )
-        # Avoid adding to pending if it's already popped from pending (recursive case?)
-        # Actually, if we are calling from 'finally', we popped it.
-        # But here we append it back?
-        # WAIT. If we call magnet_handler from finally, and queue is FULL (race condition?), it puts it back in pending.
-        # But we checked len < MAX before calling.
-        # So this block shouldn't be hit if called from finally with correct check.
-        
-        # However, we should be careful.
-        # If we pass existing_status_msg, we assume it's being re-processed or handled.
-        
-        # If it IS pending logic (queue full), we append (magnet, message, status_msg).
-        # If we already have status_msg, we use it.
-        PENDING_TASKS.append((magnet_link, message, status_msg))
-        logger.info(f"Added to pending queue. Total pending: {len(PENDING_TASKS)}")
-        return
-
-    magnet_link = message.text.strip()
-    if existing_status_msg:
-        status_msg = existing_status_msg
-        await safe_edit(status_msg, "🔄 Adding magnet...")
+            await attach_job_runtime(job)
+            logger.info(f"Reconcile {record['_id']}: {action} (was {record.get('stage')})")
+            if job.status_msg:
+                await safe_edit(job.status_msg, "♻️ <b>Resuming after restart...</b>", parse_mode=enums.ParseMode.HTML)
+            
+            if action == task_store.ACTION_RESUME:
+                await start_download(job)
+            elif action == task_store.ACTION_UPLOAD_FROM_DISK:
+                await upload_stage.put(upload_job_from_disk(job, record))
+            else:
+                record_job(record["_id"], job, task_store.STAGE_METADATA)
+                await metadata_stage.put(job)
+        except Exception as e:
+            logger.error(f"Failed to reconcile task {record['_id'] if record else torrent.hash}: {e}")
+
+async def restore_pending_worker():
+    """Reload the persisted pending queue and resume interrupted tasks once the bot is up"""
+    await asyncio.sleep(5)
+    scheduler.load()
+    await reconcile_tasks()
+    await dispatch_pending()
+
+async def queue_job(job):
+    """Park an admitted torrent in the pending queue until a download slot frees up"""
+    queue_text = (
+        f"⏸️ <b>Queue is full!</b>\n\n"
+        f"📦 {job.name or 'Download'}\n"
+        f"Currently: {scheduler.active_count()}/{scheduler.max_active} active\n"
+        f"Pending: {scheduler.pending_count() + 1}\n"
+        f"Priority: {task_scheduler.PRIORITY_NAMES.get(job.priority, 'Manual')}\n\n"
+        f"<i>Your download will start automatically when a slot frees up</i>"
+    )
+    if job.status_msg:
+        await safe_edit(job.status_msg, queue_text, parse_mode=enums.ParseMode.HTML)
     else:
-        try:
-            status_msg = await message.reply("🔄 Adding magnet...")
-        except FloodWait as e:
-            logger.warning(f"FloodWait replying: Sleeping {e.value}s")
-            await asyncio.sleep(e.value + 5)
-            status_msg = await message.reply("🔄 Adding magnet...")
+        job.status_msg = await safe_reply(job.message, queue_text, parse_mode=enums.ParseMode.HTML)
+    
+    job.status_msg_id = job.status_msg.id if job.status_msg else None
+    record_job(magnet_utils.get_infohash(job.magnet), job, task_store.STAGE_QUEUED)
+    scheduler.push(job)
+    logger.info(f"Added to pending queue. Total pending: {scheduler.pending_count()}")
 
+async def start_download(job):
+    """Take a download slot for an admitted (metadata-trimmed) torrent and resume it"""
+    t_hash = magnet_utils.get_infohash(job.magnet)
+    
+    if not scheduler.has_free_slot():
+        await queue_job(job)
+        return
+    
+    if job.status_msg is None:
+        job.status_msg = await safe_reply(job.message, "🔄 Starting download...")
+    status_msg = job.status_msg
+    
+    # Reserve the slot before any await so concurrent starts can't overbook
+    task_info = {
+        "user_id": job.user_id,
+        "chat_id": job.chat_id,
+        "status_msg": status_msg,
+        "name": job.name or "Download",
+        "priority": job.priority
+    }
+    scheduler.start(t_hash, task_info)
+    
     try:
-        # Get list of torrents BEFORE adding
-        before_hashes = {t.hash for t in qb.torrents_info()}
-        
-        # Add torrent
-        qb.torrents_add(urls=magnet_link, save_path=DOWNLOAD_DIR)
-        ADD_TIME = time.time()
-        
-        await asyncio.sleep(2)
-        
-        # Find the NEW torrent by comparing hashes
-        new_torrent = None
-        max_retries = 40  # 40 * 3s = 120s timeout
+        torrent = await poller.lookup(t_hash)
+        if torrent is None:
+            scheduler.finish(t_hash)
+            if job.readmit:
+                # Restored after a restart and qBittorrent lost the torrent - admit it again
+                job.readmit = False
+                record_job(t_hash, job, task_store.STAGE_METADATA)
+                await metadata_stage.put(job)
+                return
+            # Removed while the job was queued - a cancel, which must stick
+            logger.info(f"Dropping job for removed torrent: {job.name or t_hash}")
+            tasks.remove(t_hash)
+            if status_msg:
+                await safe_edit(status_msg, "❌ <b>Download Cancelled</b>\n\n<i>The torrent was removed before it started</i>", parse_mode=enums.ParseMode.HTML)
+            await dispatch_pending()
+            return
         
-        for attempt in range(max_retries):
-            current_torrents = qb.torrents_info()
-            for torrent in current_torrents:
-                if torrent.hash not in before_hashes:
-                    new_torrent = torrent
-                    break
-            
-            if new_torrent:
-                break
-            
-            await asyncio.sleep(3)
+        await qb.torrents_resume(t_hash)
+        record_job(t_hash, job, task_store.STAGE_DOWNLOADING)
+    except Exception as e:
+        scheduler.finish(t_hash)
+        await safe_edit(status_msg, f"❌ Error starting torrent: {e}")
+        await dispatch_pending()
+        return
+    
+    # Spawn async task (NON-BLOCKING!)
+    asyncio.create_task(process_download(t_hash, job.message, status_msg))
+    logger.info(f"Spawned download task for: {task_info['name']} ({t_hash})")
+
+async def admit_task(job):
+    """
+    Metadata stage: fetch the file list without holding a download slot,
+    skip junk files, enforce the size limit, then hand over to the scheduler
+    """
+    t_hash = magnet_utils.get_infohash(job.magnet)
+    status_msg = job.status_msg
+    health.track(t_hash, swarm_health.STAGE_METADATA, context=status_msg)
+    
+    try:
+        if await poller.lookup(t_hash) is None:
+            # Stops on its own once metadata arrives - no payload is downloaded yet
+            await qb.torrents_add(
+                urls=job.magnet,
+                save_path=DOWNLOAD_DIR,
+                tags=magnet_utils.BOT_TAG,
+                stopCondition="MetadataReceived"
+            )
         
-        if not new_torrent:
-            await safe_edit(status_msg, "❌ Failed to add torrent or metadata timeout (120s).")
+        info = await poller.wait_for_metadata(t_hash, timeout=METADATA_TIMEOUT)
+        if info is None:
+            tasks.remove(t_hash)
+            if await poller.lookup(t_hash) is None:
+                return  # Cancelled or evicted by the health engine while fetching metadata
+            await qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
+            await safe_edit(
+                status_msg,
+                f"💀 <b>No metadata</b>\n\n<i>Nobody shared the torrent info within {METADATA_TIMEOUT//60} mins.</i>",
+                parse_mode=enums.ParseMode.HTML
+            )
             return
         
-        t_hash = new_torrent.hash
+        # qBittorrent < 4.5 ignores stopCondition - make sure nothing downloads before admission
+        await qb.torrents_pause(t_hash)
         
-        # Check for duplicate
-        if t_hash in ACTIVE_TASKS:
-            await safe_edit(status_msg, "⚠️ <b>Duplicate detected!</b>\n\n<i>This torrent is already downloading</i>", parse_mode=enums.ParseMode.HTML)
-            return
+        files = await torrent_files(t_hash)
+        wanted, junk = filter_utils.select_files(files)
+        if junk:
+            await qb.torrents_file_priority(t_hash, [f.index for f in junk], 0)
         
+        from progress import get_readable_file_size
         max_file_size = settings.get_setting("max_file_size")
-        torrent_size = new_torrent.total_size
+        wanted_size = sum(f.size for f in wanted)
         
-        if torrent_size > max_file_size:
-            qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
-            from progress import get_readable_file_size
+        # Split mode uploads oversized files as parts, so any size is fine
+        if wanted_size > max_file_size and not settings.get_setting("split_large_files"):
+            # Rejected before ever taking a download slot
+            tasks.remove(t_hash)
+            await qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
             await safe_edit(
                 status_msg,
-                f"❌ <b>File too big!</b>\n\nSize: {get_readable_file_size(torrent_size)}\n"
-                f"Limit: {get_readable_file_size(max_file_size)}\n\n<i>Change limit in /settings</i>",
+                f"❌ <b>File too big!</b>\n\nSize: {get_readable_file_size(wanted_size)}\n"
+                f"Limit: {get_readable_file_size(max_file_size)}\n\n<i>Change limit or enable splitting in /settings</i>",
                 parse_mode=enums.ParseMode.HTML
             )
             return
-
+        
+        # Order, names, captions and targets are fixed now - the upload stage only executes the plan
+        plan = make_upload_plan(wanted, DOWNLOAD_DIR, job.chat_id)
+        upload_plans[t_hash] = plan
+        tasks.save(t_hash, task_store.STAGE_METADATA, plan=plan)
+    
     except Exception as e:
+        tasks.remove(t_hash)
         await safe_edit(status_msg, f"❌ Error adding torrent: {e}")
+        try:
+            await qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
+        except Exception:
+            pass
         return
+    finally:
+        health.untrack(t_hash)
     
-    # Track download
-    ACTIVE_TASKS[t_hash] = {
-        "user_id": message.from_user.id,
-        "chat_id": message.chat.id,
-        "status_msg": status_msg,
-        "name": new_torrent.name
-    }
+    job.name = info.name
+    if junk:
+        logger.info(f"Skipping {len(junk)} junk files in {info.name}")
+        await safe_edit(
+            status_msg,
+            f"✅ <b>Metadata received:</b> {info.name}\n\n"
+            f"📦 {len(wanted)} files, {get_readable_file_size(wanted_size)}\n"
+            f"🧹 Skipped {len(junk)} junk files",
+            parse_mode=enums.ParseMode.HTML
+        )
     
-    # Spawn async task (NON-BLOCKING!)
-    asyncio.create_task(process_download(t_hash, message, status_msg))
+    await start_download(job)
+
+@app.on_message(filters.regex(r"^magnet:\?xt=urn:btih:[a-zA-Z0-9]*"))
+async def magnet_handler(client, message, existing_status_msg=None, priority=task_scheduler.PRIORITY_MANUAL):
+    """Non-blocking magnet handler - queues the magnet for the metadata stage"""
+    if IS_SHUTTING_DOWN:
+        if existing_status_msg:
+             await safe_edit(existing_status_msg, "⚠️ Bot is restarting. Please wait.")
+        else:
+             await safe_reply(message, "⚠️ Bot is restarting. Please wait.")
+        return
     
-    # Return immediately - can handle next magnet!
-    logger.info(f"Spawned download task for: {new_torrent.name} ({t_hash})")
+    if not await check_permissions(message):
+        return
+    
+    magnet_link = message.text.strip()
+    
+    if existing_status_msg:
+        status_msg = existing_status_msg
+        await safe_edit(status_msg, "🔄 Adding magnet...")
+    else:
+        status_msg = await safe_reply(message, "🔄 Adding magnet...")
+    
+    # Resolve infohash from the magnet itself (no torrent list diffing)
+    t_hash = magnet_utils.get_infohash(magnet_link)
+    if not t_hash:
+        await safe_edit(status_msg, "❌ <b>Invalid magnet link</b>\n\n<i>Could not read the infohash</i>", parse_mode=enums.ParseMode.HTML)
+        return
+    
+    # Check for duplicate (fetching metadata, waiting for a slot, downloading or uploading)
+    if (scheduler.is_active(t_hash) or scheduler.is_pending(t_hash)
+            or upload_stage.is_tracked(t_hash) or metadata_stage.is_tracked(t_hash)):
+        await safe_edit(status_msg, "⚠️ <b>Duplicate detected!</b>\n\n<i>This torrent is already downloading</i>", parse_mode=enums.ParseMode.HTML)
+        return
+    
+    job = task_scheduler.Job(
+        magnet=magnet_link,
+        user_id=message.from_user.id,
+        chat_id=message.chat.id,
+        priority=priority,
+        name=magnet_utils.parse_magnet(magnet_link)["name"],
+        status_msg_id=status_msg.id if status_msg else None,
+        message=message,
+        status_msg=status_msg
+    )
+    
+    cancel_btn = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{t_hash}")]])
+    await safe_edit(status_msg, "🔎 Fetching metadata...", reply_markup=cancel_btn)
+    
+    # Metadata stage runs with more workers than there are download slots
+    record_job(t_hash, job, task_store.STAGE_METADATA)
+    await metadata_stage.put(job)
+    logger.info(f"Queued for metadata: {job.name or t_hash}")
 
 # --- Shutdown & Signal Handling ---
 def cleanup_pid():
@@ -1976,7 +2790,10 @@ async def rss_worker(client):
                         
                         # Process with intelligent tracking
                         from tamilmv_handler import process_tamilmv_link
-                        result = await process_tamilmv_link(client, mock_msg, topic_url, magnet_handler, topic_id)
+                        result = await process_tamilmv_link(
+                            client, mock_msg, topic_url, magnet_handler, topic_id,
+                            priority=task_scheduler.PRIORITY_RSS
+                        )
                         
                         # Handle result intelligently
                         if result['is_complete']:
@@ -2055,14 +2872,23 @@ if __name__ == "__main__":
     # Register management commands (/rebuild, /retry, /stats) BEFORE starting the app
     # This must be done before app.run() to ensure handlers are registered
     management_commands.register_management_commands(
-        app, check_permissions, qb, ACTIVE_TASKS, PENDING_TASKS,
-        MAX_CONCURRENT_DOWNLOADS, DOWNLOAD_DIR
+        app, check_permissions, safe_reply, qb, poller, scheduler, controller, DOWNLOAD_DIR
     )
     logger.info("✅ Registered management commands")
         
     try:
         # Start background tasks
         loop = asyncio.get_event_loop()
+        loop.create_task(poller.run())
+        loop.create_task(restore_pending_worker())
+        loop.create_task(controller.run())
+        loop.create_task(health.run())
+        metadata_stage.start()
+        upload_stage.start()
+        loop.create_task(upload_pool.start())
+        loop.create_task(status_board.run())
+        loop.create_task(snapshot_service.snapshots.run())
+        loop.create_task(auto_delete.scheduler.run(app))
         loop.create_task(rss_worker(app))
         loop.create_task(direct_link_generator.cleanup_worker())
         loop.create_task(direct_link_generator.start_http_server())
@@ -2070,5 +2896,13 @@ if __name__ == "__main__":
         
         app.run()
     finally:
+        try:
+            loop.run_until_complete(qb.close())
+        except Exception:
+            pass
+        try:
+            loop.run_until_complete(upload_pool.stop())
+        except Exception:
+            pass
         cleanup_pid()
 
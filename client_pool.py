@@ -0,0 +1,144 @@
+"""
+Upload Client Pool
+Optional helper bots (each its own Pyrogram client / MTProto session) carry the
+bulk upload traffic while the main bot keeps handling commands. Each upload
+goes to the member with the fewest bytes in flight that is not FloodWait-ed.
+File ids are only valid for the bot that uploaded the file, so every upload
+is tagged with its uploader's bot id.
+"""
+
+import time
+import logging
+from contextlib import asynccontextmanager
+import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def bot_id_from_token(token):
+    """Numeric bot id is the part of the token before the colon"""
+    return token.split(":", 1)[0].strip()
+
+
+class PoolMember:
+    def __init__(self, client, bot_id, is_main=False):
+        self.client = client
+        self.bot_id = bot_id
+        self.is_main = is_main
+        self.started = is_main  # The main client is started by app.run()
+        self.bytes_in_flight = 0
+        self.uploads_in_flight = 0
+        self.blocked_until = 0  # FloodWait
+        self.uploaded_bytes = 0
+        self.flood_waits = 0
+
+    def blocked_for(self, now=None):
+        return max(0, self.blocked_until - (now or time.time()))
+
+
+class ClientPool:
+    """Balances uploads across the main client and helper clients"""
+
+    def __init__(self, main_client, main_bot_id, helpers=()):
+        """
+        Args:
+            main_client: the bot's own Client
+            main_bot_id: its bot id (see bot_id_from_token)
+            helpers: [(Client, bot_id)] for each helper token
+        """
+        self.main = PoolMember(main_client, main_bot_id, is_main=True)
+        self.helpers = [PoolMember(client, bot_id) for client, bot_id in helpers]
+
+    def members(self):
+        return [self.main] + self.helpers
+
+    def member(self, bot_id):
+        """Member that owns file ids uploaded by bot_id (None if not in the pool)"""
+        for member in self.members():
+            if member.started and member.bot_id == bot_id:
+                return member
+        return None
+
+    async def start(self):
+        """Log in the helper clients (a helper that fails to start is left out)"""
+        for member in self.helpers:
+            try:
+                await member.client.start()
+                member.started = True
+                logger.info(f"✅ Upload helper {member.bot_id} started")
+            except Exception as e:
+                logger.error(f"Upload helper {member.bot_id} failed to start: {e}")
+
+    async def stop(self):
+        for member in self.helpers:
+            if member.started:
+                member.started = False
+                try:
+                    await member.client.stop()
+                except Exception:
+                    pass
+
+    def pick(self, exclude=()):
+        """
+        Choose the member for the next upload
+
+        Helpers are preferred; the main bot only uploads when no helper is up.
+        Among candidates, one that is not FloodWait-ed with the fewest bytes
+        in flight wins; if all are blocked, the one that unblocks first.
+        """
+        now = time.time()
+        candidates = [m for m in self.helpers if m.started and m not in exclude]
+        if not candidates:
+            candidates = [self.main] if self.main not in exclude else []
+        if not candidates:
+            return None
+        return min(candidates, key=lambda m: (m.blocked_for(now), m.bytes_in_flight, m.uploads_in_flight))
+
+    @asynccontextmanager
+    async def lease(self, size, exclude=(), prefer=None):
+        """
+        Reserve a member for an upload of `size` bytes
+
+        Args:
+            prefer: member to use if it is still up (e.g. it holds resumable parts)
+        """
+        member = prefer if prefer is not None and prefer.started and prefer not in exclude else self.pick(exclude)
+        if member is None:
+            member = self.main
+        member.bytes_in_flight += size
+        member.uploads_in_flight += 1
+        try:
+            yield member
+        finally:
+            member.bytes_in_flight -= size
+            member.uploads_in_flight -= 1
+
+    def on_flood_wait(self, member, chat_id, seconds):
+        """
+        Take a FloodWait-ed member out of rotation for `seconds`
+
+        Only the main bot's FloodWaits feed the shared rate limiter - a helper
+        being limited must not slow the bot's own messages.
+        """
+        member.blocked_until = max(member.blocked_until, time.time() + seconds)
+        member.flood_waits += 1
+        if member.is_main:
+            rate_limiter.limiter.on_flood_wait(chat_id, seconds, kind=rate_limiter.KIND_UPLOAD)
+        else:
+            logger.warning(f"Upload helper {member.bot_id} FloodWait-ed for {seconds}s")
+
+    def get_stats(self):
+        now = time.time()
+        return [
+            {
+                "bot_id": member.bot_id,
+                "main": member.is_main,
+                "started": member.started,
+                "bytes_in_flight": member.bytes_in_flight,
+                "uploads_in_flight": member.uploads_in_flight,
+                "blocked_for": member.blocked_for(now),
+                "uploaded_bytes": member.uploaded_bytes,
+                "flood_waits": member.flood_waits,
+            }
+            for member in self.members()
+        ]
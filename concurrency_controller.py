@@ -0,0 +1,168 @@
+"""
+Adaptive Concurrency Controller
+Resizes the number of download slots at runtime from measured signals:
+aggregate qBittorrent download speed, free disk space, upload backlog and CPU.
+Changes need several agreeing samples plus a cooldown (hysteresis), so the
+slot count doesn't flap on noisy measurements.
+"""
+
+import time
+import asyncio
+import logging
+import psutil
+import storage_utils
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 30  # Seconds between evaluations
+HYSTERESIS_SAMPLES = 3  # Consecutive samples that must agree before resizing
+COOLDOWN = 120  # Minimum seconds between two resizes
+DISK_SAFETY_BYTES = 2 * 1024**3  # Always keep this much disk free
+CPU_HIGH_PERCENT = 85
+BANDWIDTH_HEADROOM = 0.8  # Grow only while below 80% of the known link capacity
+
+
+class BotMetricsSource:
+    """
+    Reads live signals for the controller
+
+    Any object with a read() method returning the same keys can be used
+    instead (e.g. a fake source with scripted values).
+    """
+
+    def __init__(self, poller, scheduler, download_dir, upload_backlog):
+        self.poller = poller
+        self.scheduler = scheduler
+        self.download_dir = download_dir
+        self.upload_backlog = upload_backlog  # callable -> int
+        psutil.cpu_percent(interval=None)  # Prime the non-blocking CPU counter
+
+    def read(self):
+        return {
+            "dl_speed": self.poller.server_state.get("dl_info_speed", 0),
+            "free_bytes": storage_utils.get_disk_space_free(self.download_dir),
+            "upload_backlog": self.upload_backlog(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "active": self.scheduler.active_count(),
+            "pending": self.scheduler.pending_count(),
+        }
+
+
+class ConcurrencyController:
+    """Adjusts scheduler.max_active between min_slots and max_slots"""
+
+    def __init__(self, scheduler, source, min_slots=1, max_slots=8, slot_bytes=2 * 1024**3,
+                 bandwidth_limit=0, interval=CHECK_INTERVAL, hysteresis=HYSTERESIS_SAMPLES,
+                 cooldown=COOLDOWN, on_resize=None):
+        self.scheduler = scheduler
+        self.source = source
+        self.min_slots = min_slots
+        self.max_slots = max_slots
+        self.slot_bytes = slot_bytes  # Disk space one download may need (callable or int)
+        self.bandwidth_limit = bandwidth_limit  # Link capacity in bytes/s (0 = unknown)
+        self.interval = interval
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        self.on_resize = on_resize  # async callback after growing (start pending jobs)
+
+        self.last_metrics = {}
+        self.last_reason = "Starting up"
+        self.last_change = 0
+        self._streak_direction = 0
+        self._streak = 0
+
+    def _slot_bytes(self):
+        return self.slot_bytes() if callable(self.slot_bytes) else self.slot_bytes
+
+    def evaluate(self, metrics):
+        """
+        Decide the desired slot count for one sample (no hysteresis)
+
+        Returns:
+            tuple: (target_slots, reason, urgent)
+        """
+        current = self.scheduler.max_active
+        active = metrics.get("active", 0)
+
+        # Disk: every new slot may need up to one max-size torrent of free space
+        spare = metrics["free_bytes"] - DISK_SAFETY_BYTES
+        if spare <= 0:
+            return max(self.min_slots, min(current, active) - 1), "Disk almost full", True
+        disk_cap = active + int(spare // max(self._slot_bytes(), 1))
+
+        if disk_cap < current:
+            return max(self.min_slots, disk_cap), "Limited by free disk space", False
+
+        if metrics["cpu_percent"] >= CPU_HIGH_PERCENT:
+            return max(self.min_slots, current - 1), f"CPU busy ({metrics['cpu_percent']:.0f}%)", False
+
+        if metrics["upload_backlog"] > current:
+            return max(self.min_slots, current - 1), f"Upload backlog ({metrics['upload_backlog']})", False
+
+        slots_full = active >= current
+        has_bandwidth = not self.bandwidth_limit or metrics["dl_speed"] < self.bandwidth_limit * BANDWIDTH_HEADROOM
+        if metrics.get("pending", 0) and slots_full and has_bandwidth:
+            return min(self.max_slots, disk_cap, current + 1), "Idle bandwidth with pending jobs", False
+
+        return current, "Steady", False
+
+    async def step(self, now=None):
+        """Take one sample and resize if the decision is stable"""
+        now = now or time.time()
+        metrics = self.source.read()
+        self.last_metrics = metrics
+
+        current = self.scheduler.max_active
+        target, reason, urgent = self.evaluate(metrics)
+        target = max(self.min_slots, min(self.max_slots, target))
+        direction = (target > current) - (target < current)
+
+        if direction != self._streak_direction:
+            self._streak_direction = direction
+            self._streak = 0
+        self._streak += 1
+
+        if direction == 0:
+            self.last_reason = reason
+            return current
+
+        stable = self._streak >= self.hysteresis and (now - self.last_change) >= self.cooldown
+        if not (urgent or stable):
+            self.last_reason = f"{reason} (waiting {self._streak}/{self.hysteresis})"
+            return current
+
+        self.scheduler.max_active = target
+        self.last_change = now
+        self.last_reason = reason
+        self._streak = 0
+        logger.info(f"⚙️ Concurrency {current} -> {target}: {reason}")
+
+        if target > current and self.on_resize:
+            await self.on_resize()
+        return target
+
+    async def run(self):
+        """Background evaluation loop"""
+        logger.info("Starting adaptive concurrency controller...")
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Concurrency controller error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def describe(self):
+        """Current decision for /stats"""
+        m = self.last_metrics
+        text = (
+            f"Slots: {self.scheduler.max_active} (range {self.min_slots}-{self.max_slots})\n"
+            f"Decision: {self.last_reason}"
+        )
+        if m:
+            text += (
+                f"\nDL: {storage_utils.get_readable_size(m['dl_speed'])}/s | "
+                f"CPU: {m['cpu_percent']:.0f}% | Upload backlog: {m['upload_backlog']}"
+            )
+        return text
@@ -0,0 +1,194 @@
+"""
+Dead-Letter Queue for failed uploads
+Every (file, channel) pair that could not be delivered is kept in MongoDB
+instead of only being logged. When some chat already has the file, the entry
+only needs its file_id. When no chat got it, the file is kept on disk in a
+spool directory (hard link when possible, so no copy is made) under a size
+quota. /replay re-drives entries in batches.
+"""
+
+import os
+import time
+import shutil
+import logging
+import settings
+from file_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "dead_letters"
+MAX_ATTEMPTS = 5  # Replays before an entry is given up
+
+
+class DeadLetterStore:
+    """MongoDB-backed failed deliveries (no-op without MongoDB)"""
+
+    def __init__(self, spool_dir, quota_bytes):
+        self.spool_dir = spool_dir
+        self.quota_bytes = quota_bytes
+        self._collection = None
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+        return self._collection
+
+    def spool_usage(self):
+        """Bytes kept in the spool directory"""
+        total = 0
+        for root, _, files in os.walk(self.spool_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _spool(self, t_hash, rel_path, path):
+        """Keep a file that is about to be cleaned up (None if over quota)"""
+        spool_path = os.path.join(self.spool_dir, t_hash, rel_path)
+        if os.path.exists(spool_path):
+            return spool_path
+        size = os.path.getsize(path)
+        if self.spool_usage() + size > self.quota_bytes:
+            logger.error(f"Dead-letter quota full - {rel_path} cannot be kept for replay")
+            return None
+        os.makedirs(os.path.dirname(spool_path), exist_ok=True)
+        try:
+            os.link(path, spool_path)
+        except OSError:
+            shutil.copy2(path, spool_path)
+        return spool_path
+
+    def add(self, t_hash, rel_path, chat_ids, file_name, caption, length, mode="document",
+            path=None, disk_rel_path=None, offset=0, file_id=None, uploader=None, source=None, error=None):
+        """
+        Record deliveries that failed
+
+        Args:
+            rel_path: key of the piece (file or split part)
+            path / disk_rel_path / offset / length: the file on disk and the
+                piece's byte range (spooled when no file_id is known)
+            file_id / uploader / source: an upload that reached another chat -
+                replay only has to post it
+        """
+        collection = self._get_collection()
+        if collection is None or not chat_ids:
+            return
+        doc = {
+            "t_hash": t_hash,
+            "rel_path": rel_path,
+            "file_name": file_name,
+            "caption": caption,
+            "mode": mode,
+            "file_id": file_id,
+            "uploader": uploader,
+            "source": list(source) if source else None,
+            "path": None,
+            "offset": offset,
+            "length": length,
+            "error": str(error) if error else None,
+            "attempts": 0,
+            "created_at": time.time(),
+        }
+        if file_id is None:
+            try:
+                doc["path"] = self._spool(t_hash, disk_rel_path or rel_path, path)
+            except Exception as e:
+                logger.error(f"Failed to spool {rel_path}: {e}")
+            if doc["path"] is None:
+                return
+        try:
+            for chat_id in chat_ids:
+                collection.replace_one(
+                    {"_id": f"{cache_key(t_hash, rel_path, length)}:{chat_id}"},
+                    {**doc, "chat_id": chat_id},
+                    upsert=True
+                )
+            logger.warning(f"📮 {file_name}: {len(chat_ids)} failed deliveries kept for /replay")
+        except Exception as e:
+            logger.error(f"Failed to record dead letters for {rel_path}: {e}")
+
+    def pending(self, limit=None):
+        """Oldest entries first"""
+        collection = self._get_collection()
+        if collection is None:
+            return []
+        try:
+            cursor = collection.find().sort("created_at", 1)
+            return list(cursor.limit(limit) if limit else cursor)
+        except Exception as e:
+            logger.error(f"Failed to load dead letters: {e}")
+            return []
+
+    def count(self):
+        collection = self._get_collection()
+        if collection is None:
+            return 0
+        try:
+            return collection.count_documents({})
+        except Exception:
+            return 0
+
+    def resolve(self, entry):
+        """Entry delivered - drop it and its spooled file once nothing needs it"""
+        self._drop(entry)
+
+    def fail(self, entry, error):
+        """
+        Replay failed again
+
+        Returns:
+            bool: True if the entry was given up after MAX_ATTEMPTS
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return False
+        if entry["attempts"] + 1 >= MAX_ATTEMPTS:
+            self._drop(entry)
+            return True
+        try:
+            collection.update_one(
+                {"_id": entry["_id"]},
+                {"$inc": {"attempts": 1}, "$set": {"error": str(error), "updated_at": time.time()}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to update dead letter: {e}")
+        return False
+
+    def remember_upload(self, entry, file_id, uploader, source):
+        """A replay uploaded the bytes - sibling entries only need the file_id now"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.update_many(
+                {"t_hash": entry["t_hash"], "rel_path": entry["rel_path"], "file_id": None},
+                {"$set": {"file_id": file_id, "uploader": uploader, "source": list(source)}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to update dead letters: {e}")
+
+    def _drop(self, entry):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_one({"_id": entry["_id"]})
+            path = entry.get("path")
+            if path and not collection.count_documents({"path": path}):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to drop dead letter: {e}")
+
+    def clear(self):
+        """Give up every entry and empty the spool"""
+        collection = self._get_collection()
+        if collection is not None:
+            try:
+                collection.delete_many({})
+            except Exception as e:
+                logger.error(f"Failed to clear dead letters: {e}")
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
@@ -0,0 +1,120 @@
+"""
+Telegram file_id Cache
+Maps content identity (infohash, relative path, size) to the file_id returned by
+the first upload, so re-leeched files (RSS topic updates, re-sent magnets) are
+posted instantly by file_id instead of being uploaded again.
+An optional fast content hash also catches the same file inside a different torrent.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import settings
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "file_cache"
+HASH_SAMPLE_SIZE = 1024 * 1024  # Bytes read from the start, middle and end of a file
+
+
+def fast_hash(path, size=None):
+    """
+    Cheap content fingerprint: size + three 1 MB samples (not a full-file hash)
+
+    Returns:
+        str: hex digest
+    """
+    size = os.path.getsize(path) if size is None else size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=20)
+    with open(path, "rb") as f:
+        for offset in (0, max(0, size // 2 - HASH_SAMPLE_SIZE // 2), max(0, size - HASH_SAMPLE_SIZE)):
+            f.seek(offset)
+            digest.update(f.read(HASH_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def cache_key(t_hash, rel_path, size):
+    return f"{t_hash}:{rel_path.replace(os.sep, '/')}:{size}"
+
+
+class FileIdCache:
+    """MongoDB-backed file_id cache (no-op without MongoDB)"""
+
+    def __init__(self, use_content_hash=True):
+        self.use_content_hash = use_content_hash
+        self.hits = 0
+        self.misses = 0
+        self._collection = None
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+            try:
+                self._collection.create_index([("fast_hash", 1), ("size", 1)])
+            except Exception as e:
+                logger.debug(f"Could not create file cache index: {e}")
+        return self._collection
+
+    def available(self):
+        return self._get_collection() is not None
+
+    def lookup(self, t_hash, rel_path, size, content_hash=None):
+        """
+        Find a previous upload of the same content
+
+        Returns:
+            dict or None: cached entry with file_id, file_unique_id, chat_id, message_id
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        try:
+            entry = collection.find_one({"_id": cache_key(t_hash, rel_path, size)})
+            if entry is None and content_hash:
+                entry = collection.find_one({"fast_hash": content_hash, "size": size})
+        except Exception as e:
+            logger.error(f"File cache lookup failed: {e}")
+            return None
+
+        if entry:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def store(self, t_hash, rel_path, size, message, media, content_hash=None, uploader=None):
+        """
+        Remember the upload of a file
+
+        Args:
+            uploader: bot id of the client that uploaded it (file ids are per bot)
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return
+        doc = {
+            "file_id": media.file_id,
+            "file_unique_id": media.file_unique_id,
+            "file_name": getattr(media, "file_name", None),
+            "chat_id": message.chat.id,
+            "message_id": message.id,
+            "uploader": uploader,
+            "size": size,
+            "fast_hash": content_hash,
+            "created_at": time.time(),
+        }
+        try:
+            collection.replace_one({"_id": cache_key(t_hash, rel_path, size)}, doc, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to cache file_id for {rel_path}: {e}")
+
+    def invalidate(self, entry):
+        """Drop an entry whose file_id Telegram no longer accepts"""
+        collection = self._get_collection()
+        if collection is None or not entry:
+            return
+        try:
+            collection.delete_one({"_id": entry["_id"]})
+        except Exception as e:
+            logger.error(f"Failed to drop file cache entry: {e}")
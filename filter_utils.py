@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Torrent file selection rules
+Decides which files of a torrent are junk (samples, info files, screenshots)
+so they can be set to priority 0 before the download starts
+"""
+import re
+from os import path as ospath
+
+# Extensions that are never worth uploading
+JUNK_EXTENSIONS = {
+    '.txt', '.nfo', '.url', '.lnk', '.sfv', '.md5', '.exe', '.html', '.htm', '.website', '.!qb'
+}
+
+# Images are junk (screenshots, posters) - covers inside music/ebook torrents are small anyway
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+
+# Samples are short clips: only treat as junk below this size
+SAMPLE_MAX_SIZE = 150 * 1024 * 1024
+
+_SAMPLE_RE = re.compile(r'(^|[\W_])sample([\W_]|$)', re.IGNORECASE)
+_JUNK_DIR_RE = re.compile(r'(^|/)(samples?|screens?|screenshots?|proof)(/|$)', re.IGNORECASE)
+
+
+def is_junk_file(name, size):
+    """
+    Check if a torrent file should be skipped
+
+    Args:
+        name: path inside the torrent (as reported by qBittorrent)
+        size: file size in bytes
+
+    Returns:
+        bool: True if the file is a sample, info file or screenshot
+    """
+    normalized = name.replace('\\', '/')
+    base = ospath.basename(normalized)
+    ext = ospath.splitext(base)[1].lower()
+
+    if ext in JUNK_EXTENSIONS or ext in IMAGE_EXTENSIONS:
+        return True
+
+    if _JUNK_DIR_RE.search(ospath.dirname(normalized)):
+        return True
+
+    if _SAMPLE_RE.search(ospath.splitext(base)[0]) and size < SAMPLE_MAX_SIZE:
+        return True
+
+    return False
+
+
+def select_files(files):
+    """
+    Split qBittorrent's file list into wanted and junk files
+
+    Never skips everything: if every file matches a junk rule, all files are kept.
+
+    Returns:
+        tuple: (wanted, junk) lists of file entries
+    """
+    wanted, junk = [], []
+    for f in files:
+        (junk if is_junk_file(f.name, f.size) else wanted).append(f)
+    if not wanted:
+        return list(files), []
+    return wanted, junk
@@ -0,0 +1,70 @@
+"""
+Magnet Link Utilities
+Resolve the torrent infohash straight from a magnet link so the bot knows
+which torrent it added without diffing the qBittorrent torrent list
+"""
+
+import re
+import base64
+from urllib.parse import urlparse, parse_qs
+
+# Tag attached to every torrent added by the bot
+BOT_TAG = "leechbot"
+
+# Extra tag for direct link downloads (not tracked by the leech task records)
+DIRLINK_TAG = "dirlink"
+
+_HEX_RE = re.compile(r'^[0-9a-fA-F]{40}$')
+_BASE32_RE = re.compile(r'^[A-Za-z2-7]{32}$')
+
+
+def _normalize_btih(value):
+    """
+    Convert a btih value (40-char hex or 32-char base32) to lowercase hex
+
+    Returns:
+        str or None if the value is not a valid v1 infohash
+    """
+    value = value.strip()
+    if _HEX_RE.match(value):
+        return value.lower()
+    if _BASE32_RE.match(value):
+        return base64.b32decode(value.upper()).hex()
+    return None
+
+
+def parse_magnet(magnet_link):
+    """
+    Parse a magnet link
+
+    Args:
+        magnet_link: magnet:?xt=urn:btih:... URI
+
+    Returns:
+        dict: {"hash": hex infohash or None, "name": display name or None, "trackers": [str]}
+    """
+    result = {"hash": None, "name": None, "trackers": []}
+
+    if not magnet_link or not magnet_link.strip().lower().startswith("magnet:"):
+        return result
+
+    params = parse_qs(urlparse(magnet_link.strip()).query)
+
+    for xt in params.get("xt", []):
+        if xt.lower().startswith("urn:btih:"):
+            t_hash = _normalize_btih(xt[len("urn:btih:"):])
+            if t_hash:
+                result["hash"] = t_hash
+                break
+
+    if params.get("dn"):
+        result["name"] = params["dn"][0]
+    result["trackers"] = params.get("tr", [])
+
+    return result
+
+
+def get_infohash(magnet_link):
+    """Get lowercase hex infohash from a magnet link (None if invalid)"""
+    return parse_magnet(magnet_link)["hash"]
+
@@ -10,12 +10,14 @@ from pyrogram import filters, enums
 import settings
 import storage_utils
 import auto_delete
+import task_scheduler
+import snapshot_service
 from plugins import rss_monitor
 
 logger = logging.getLogger(__name__)
 
 
-def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDING_TASKS, MAX_CONCURRENT_DOWNLOADS, DOWNLOAD_DIR):
+def register_management_commands(app, check_permissions, safe_reply, qb, poller, scheduler, controller, DOWNLOAD_DIR):
     """Register all management command handlers"""
     
     @app.on_message(filters.command("rebuild"))
@@ -26,7 +28,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
         
         # Check if rebuild.sh exists
         if not os.path.exists("./rebuild.sh"):
-            await message.reply(
+            await safe_reply(
+                message,
                 "❌ <b>rebuild.sh not found</b>\n\n"
                 "<i>Cannot execute rebuild script</i>",
                 parse_mode=enums.ParseMode.HTML
@@ -38,7 +41,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
         storage_utils.log_disk_status()
         
         # Send restart message
-        await message.reply(
+        await safe_reply(
+            message,
             "🔄 <b>Rebuilding Docker containers...</b>\n\n"
             "✅ Pulling latest code\n"
             "🧹 Cleaning old images\n"
@@ -63,7 +67,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
         text = message.text.replace("/retry", "").strip()
         
         if not text:
-            msg = await message.reply(
+            msg = await safe_reply(
+                message,
                 "❌ <b>No link provided</b>\n\n"
                 "<b>Usage:</b>\n"
                 "/retry <magnet_link>\n"
@@ -74,12 +79,13 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
             
             delay = settings.get_setting("auto_delete_delay")
             if delay > 0:
-                asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+                auto_delete.schedule_delete(msg, delay)
             return
         
         # Check if it's a magnet link
         if text.startswith("magnet:"):
-            await message.reply(
+            await safe_reply(
+                message,
                 "✅ <b>Magnet link ready for retry</b>\n\n"
                 "<i>Simply send the magnet link again to process it</i>",
                 parse_mode=enums.ParseMode.HTML
@@ -92,7 +98,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
             topic_id = rss_monitor.monitor.get_topic_id(text)
             
             if not topic_id:
-                await message.reply(
+                await safe_reply(
+                    message,
                     "❌ <b>Invalid TamilMV URL</b>\n\n"
                     "<i>Could not extract topic ID from URL</i>",
                     parse_mode=enums.ParseMode.HTML
@@ -112,7 +119,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
             if topic_id in rss_monitor.monitor.seen_topics:
                 rss_monitor.monitor.seen_topics.remove(topic_id)
             
-            await message.reply(
+            await safe_reply(
+                message,
                 f"🔄 <b>Topic {topic_id} cleared for retry</b>\n\n"
                 f"<i>Removed from processed history</i>\n"
                 f"<i>Send the topic URL again to process it</i>",
@@ -121,7 +129,8 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
             return
         
         # Unknown link type
-        await message.reply(
+        await safe_reply(
+            message,
             "❌ <b>Invalid link format</b>\n\n"
             "<b>Supported:</b>\n"
             "• Magnet links (magnet:?xt=...)\n"
@@ -131,80 +140,109 @@ def register_management_commands(app, check_permissions, qb, ACTIVE_TASKS, PENDI
         )
     
     
-    @app.on_message(filters.command("stats"))
-    async def stats_handler(client, message):
-        """Show system statistics - disk, qBittorrent, bot queue"""
-        if not await check_permissions(message):
-            return
+    def count_incomplete_topics():
+        """RSS topics waiting for a retry (blocking MongoDB calls - run in a thread)"""
+        collection = rss_monitor.monitor.incomplete_topics_collection
+        if collection is None:
+            return 0, 0
+        return (
+            collection.count_documents({"status": "pending"}),
+            collection.count_documents({"failure_reason": "storage_full", "status": "pending"}),
+        )
+    
+    async def build_stats_snapshot():
+        """/stats sections - rebuilt by the snapshot service, not per command"""
+        # Get disk stats
+        disk_stat = await asyncio.to_thread(shutil.disk_usage, DOWNLOAD_DIR if os.path.exists(DOWNLOAD_DIR) else ".")
+        disk_percent = (disk_stat.used / disk_stat.total) * 100
         
+        # Get qBittorrent stats from the shared poller cache
         try:
-            # Get disk stats
-            disk_stat = shutil.disk_usage(DOWNLOAD_DIR if os.path.exists(DOWNLOAD_DIR) else ".")
-            disk_percent = (disk_stat.used / disk_stat.total) * 100
-            
-            # Get qBittorrent stats
-            try:
-                qb_info = qb.sync_maindata()
-                qb_torrents = qb.torrents_info()
-                qb_active = len([t for t in qb_torrents if t.state in ["downloading", "uploading"]])
-                qb_dl_speed = qb_info.server_state.dl_info_speed if hasattr(qb_info.server_state, 'dl_info_speed') else 0
-                qb_ul_speed = qb_info.server_state.up_info_speed if hasattr(qb_info.server_state, 'up_info_speed') else 0
-            except Exception as e:
-                logger.error(f"qBittorrent stats error: {e}")
-                qb_active = 0
-                qb_dl_speed = 0
-                qb_ul_speed = 0
-            
-            # Get bot queue stats
-            active_count = len(ACTIVE_TASKS)
-            pending_count = len(PENDING_TASKS)
-            
-            # Get incomplete topics count
-            incomplete_count = 0
-            storage_errors = 0
-            try:
-                if rss_monitor.monitor.incomplete_topics_collection:
-                    incomplete_count = rss_monitor.monitor.incomplete_topics_collection.count_documents(
-                        {"status": "pending"}
-                    )
-                    storage_errors = rss_monitor.monitor.incomplete_topics_collection.count_documents(
-                        {"failure_reason": "storage_full", "status": "pending"}
-                    )
-            except Exception as e:
-                logger.error(f"MongoDB stats error: {e}")
-            
-            # Build stats message
-            disk_emoji = "🟢" if disk_percent < 80 else "🟡" if disk_percent < 90 else "🔴"
-            
-            text = (
-                f"📊 <b>System Statistics</b>\n\n"
+            qb_active = len([t for t in poller.all() if t.get("state") in ["downloading", "uploading"]])
+            qb_dl_speed = poller.server_state.get("dl_info_speed", 0)
+            qb_ul_speed = poller.server_state.get("up_info_speed", 0)
+        except Exception as e:
+            logger.error(f"qBittorrent stats error: {e}")
+            qb_active = 0
+            qb_dl_speed = 0
+            qb_ul_speed = 0
+        
+        # Get bot queue stats
+        active_count = scheduler.active_count()
+        pending_count = scheduler.pending_count()
+        pending_by_class = scheduler.count_by_priority()
+        pending_breakdown = " | ".join(
+            f"{task_scheduler.PRIORITY_NAMES[p]}: {count}" for p, count in sorted(pending_by_class.items())
+        )
+        
+        # Get incomplete topics count
+        incomplete_count = 0
+        storage_errors = 0
+        try:
+            incomplete_count, storage_errors = await asyncio.to_thread(count_incomplete_topics)
+        except Exception as e:
+            logger.error(f"MongoDB stats error: {e}")
+        
+        disk_emoji = "🟢" if disk_percent < 80 else "🟡" if disk_percent < 90 else "🔴"
+        
+        fragments = {
+            "header": "📊 <b>System Statistics</b>\n\n",
+            "disk": (
                 f"💾 <b>Disk Usage</b> {disk_emoji}\n"
                 f"Total: {storage_utils.get_readable_size(disk_stat.total)}\n"
                 f"Used: {storage_utils.get_readable_size(disk_stat.used)} ({disk_percent:.1f}%)\n"
                 f"Free: {storage_utils.get_readable_size(disk_stat.free)}\n\n"
+            ),
+            "qbittorrent": (
                 f"🔽 <b>qBittorrent</b>\n"
                 f"Active: {qb_active} torrents\n"
                 f"DL: {storage_utils.get_readable_size(qb_dl_speed)}/s\n"
                 f"UL: {storage_utils.get_readable_size(qb_ul_speed)}/s\n\n"
+            ),
+            "queue": (
                 f"🤖 <b>Bot Queue</b>\n"
-                f"Active: {active_count}/{MAX_CONCURRENT_DOWNLOADS}\n"
-               f"Pending: {pending_count}\n\n"
+                f"Active: {active_count}/{scheduler.max_active}\n"
+                f"Pending: {pending_count}\n"
+                f"<i>{pending_breakdown}</i>\n\n"
+            ),
+            "concurrency": f"⚙️ <b>Concurrency</b>\n{controller.describe()}\n\n",
+            "rss": (
                 f"📝 <b>RSS Incomplete Topics</b>\n"
                 f"Total: {incomplete_count}\n"
                 f"Storage errors: {storage_errors}\n\n"
-                f"<i>Use /rebuild if disk is full</i>"
-            )
-            
-            msg = await message.reply(text, parse_mode=enums.ParseMode.HTML)
+            ),
+            "hint": "<i>Use /rebuild if disk is full</i>",
+        }
+        values = {
+            "disk_percent": disk_percent,
+            "qb_active": qb_active,
+            "active": active_count,
+            "pending": pending_count,
+            "incomplete_topics": incomplete_count,
+        }
+        return fragments, values
+    
+    snapshot_service.snapshots.register("stats", build_stats_snapshot)
+    
+    @app.on_message(filters.command("stats"))
+    async def stats_handler(client, message):
+        """Show system statistics - disk, qBittorrent, bot queue"""
+        if not await check_permissions(message):
+            return
+        
+        try:
+            snapshot = await snapshot_service.snapshots.get("stats")
+            msg = await safe_reply(message, snapshot.text + "\n" + snapshot.footer(), parse_mode=enums.ParseMode.HTML)
             
             # Auto-delete after delay
             delay = settings.get_setting("auto_delete_delay")
             if delay > 0:
-                asyncio.create_task(auto_delete.auto_delete_message(msg, delay))
+                auto_delete.schedule_delete(msg, delay)
                 
         except Exception as e:
             logger.error(f"Stats command error: {e}")
-            await message.reply(
+            await safe_reply(
+                message,
                 f"❌ <b>Error getting stats</b>\n\n"
                 f"<code>{str(e)[:100]}</code>",
                 parse_mode=enums.ParseMode.HTML
@@ -0,0 +1,74 @@
+"""
+Pipeline Stage - bounded hand-off queue with its own worker pool
+Lets qBittorrent keep downloading the next torrent while finished ones are
+still being uploaded to Telegram
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    Worker pool fed through a bounded queue
+
+    put() blocks while the queue is full, which pushes back on the stage
+    in front of it instead of letting finished work pile up on disk.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=4, key=None):
+        self.name = name
+        self.handler = handler  # async def handler(item)
+        self.workers = workers
+        self.key = key  # item -> tracking key (optional)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.tracked = {}  # {key: item} for queued + running items
+        self.running = 0
+        self._tasks = []
+
+    async def put(self, item):
+        """Hand an item to this stage (waits while the queue is full)"""
+        if self.key:
+            self.tracked[self.key(item)] = item
+        await self.queue.put(item)
+
+    def try_put(self, item):
+        """Hand an item over only if the queue has room (never waits)"""
+        if self.queue.full():
+            return False
+        if self.key:
+            self.tracked[self.key(item)] = item
+        self.queue.put_nowait(item)
+        return True
+
+    def backlog(self):
+        """Items queued or being processed"""
+        return self.queue.qsize() + self.running
+
+    def is_tracked(self, key):
+        return key in self.tracked
+
+    async def _worker(self, idx):
+        while True:
+            item = await self.queue.get()
+            self.running += 1
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} worker {idx} failed: {e}", exc_info=True)
+            finally:
+                self.running -= 1
+                if self.key:
+                    self.tracked.pop(self.key(item), None)
+                self.queue.task_done()
+
+    def start(self):
+        """Spawn the worker pool (call from inside the event loop)"""
+        loop = asyncio.get_event_loop()
+        for idx in range(self.workers - len(self._tasks)):
+            self._tasks.append(loop.create_task(self._worker(len(self._tasks) + 1)))
+        logger.info(f"Started {self.name} stage with {self.workers} workers")
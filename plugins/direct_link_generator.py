@@ -11,9 +11,9 @@ import hashlib
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from qbittorrentapi import Client as qbClient
 from aiohttp import web
 import socket
+import magnet_utils
 
 logger = logging.getLogger(__name__)
 
@@ -151,12 +151,13 @@ def cleanup_expired_links():
     
     return len(expired_links)
 
-async def download_from_magnet(qb, magnet_link, status_callback=None):
+async def download_from_magnet(qb, poller, magnet_link, status_callback=None):
     """
     Download torrent using qBittorrent to directdownloads directory
     
     Args:
-        qb: qBittorrent client instance
+        qb: Async qBittorrent client (qb_client.QBClient)
+        poller: Shared QBPoller providing torrent state
         magnet_link: Magnet link to download
         status_callback: Optional async function to report progress
     
@@ -166,36 +167,20 @@ async def download_from_magnet(qb, magnet_link, status_callback=None):
     init_directory()
     download_path = os.path.abspath(DIRECT_DOWNLOAD_DIR)
     
+    torrent_hash = magnet_utils.get_infohash(magnet_link)
+    if not torrent_hash:
+        return {"success": False, "error": "Invalid magnet link"}
+    
     try:
-        # Get current torrents before adding
-        before_hashes = {t.hash for t in qb.torrents_info()}
-        
         # Add torrent to qBittorrent
-        qb.torrents_add(urls=magnet_link, save_path=download_path)
-        
-        # Wait for torrent to appear
-        await asyncio.sleep(2)
+        await qb.torrents_add(urls=magnet_link, save_path=download_path, tags=[magnet_utils.BOT_TAG, magnet_utils.DIRLINK_TAG])
         
-        # Find the new torrent
-        new_torrent = None
-        max_retries = 20
-        
-        for attempt in range(max_retries):
-            current_torrents = qb.torrents_info()
-            for torrent in current_torrents:
-                if torrent.hash not in before_hashes:
-                    new_torrent = torrent
-                    break
-            
-            if new_torrent:
-                break
-            
-            await asyncio.sleep(2)
+        # Targeted lookup by the hash we already know
+        new_torrent = await poller.wait_for(torrent_hash, timeout=40)
         
         if not new_torrent:
             return {"success": False, "error": "Failed to add torrent"}
         
-        torrent_hash = new_torrent.hash
         torrent_name = new_torrent.name
         
         logger.info(f"Direct Link Download started: {torrent_name}")
@@ -203,43 +188,48 @@ async def download_from_magnet(qb, magnet_link, status_callback=None):
         # Throttling for status callback (prevent Telegram ban)
         last_update = [0]
         
-        # Monitor download progress
-        while True:
-            torrent = qb.torrents_info(torrent_hashes=torrent_hash)[0]
-            
-            progress = torrent.progress * 100
-            state = torrent.state
-            
-            # Report progress if callback provided (throttled)
-            if status_callback:
-                current_time = time.time()
-                if current_time - last_update[0] >= 4:  # Update max every 4 seconds
-                    await status_callback(progress, state, torrent)
-                    last_update[0] = current_time
-            
-            # Check if complete
-            if state in ["uploading", "stalledUP", "pausedUP"] or progress >= 100:
-                logger.info(f"Download complete: {torrent_name}")
-                break
-            
-            # Check for errors
-            if state == "error":
-                error_msg = f"Torrent error: {torrent.name}"
-                logger.error(error_msg)
-                qb.torrents_delete(torrent_hashes=torrent_hash, delete_files=True)
-                return {"success": False, "error": error_msg}
-            
-            await asyncio.sleep(3)
+        # Monitor download progress through poller updates
+        updates = poller.subscribe(torrent_hash)
+        torrent = new_torrent
+        try:
+            while True:
+                if torrent is None:
+                    return {"success": False, "error": "Torrent was removed"}
+                
+                progress = torrent.progress * 100
+                state = torrent.state
+                
+                # Report progress if callback provided (throttled)
+                if status_callback:
+                    current_time = time.time()
+                    if current_time - last_update[0] >= 4:  # Update max every 4 seconds
+                        await status_callback(progress, state, torrent)
+                        last_update[0] = current_time
+                
+                # Check if complete
+                if state in ["uploading", "stalledUP", "pausedUP"] or progress >= 100:
+                    logger.info(f"Download complete: {torrent_name}")
+                    break
+                
+                # Check for errors
+                if state == "error":
+                    error_msg = f"Torrent error: {torrent.name}"
+                    logger.error(error_msg)
+                    await qb.torrents_delete(torrent_hashes=torrent_hash, delete_files=True)
+                    return {"success": False, "error": error_msg}
+                
+                torrent = await poller.next_update(torrent_hash, updates)
+        finally:
+            poller.unsubscribe(torrent_hash, updates)
         
         # Get file information
-        torrent = qb.torrents_info(torrent_hashes=torrent_hash)[0]
         file_path = os.path.join(download_path, torrent.name)
         file_size = torrent.total_size
         
         # Stop torrent but keep files
-        qb.torrents_pause(torrent_hashes=torrent_hash)
+        await qb.torrents_pause(torrent_hashes=torrent_hash)
         await asyncio.sleep(1)
-        qb.torrents_delete(torrent_hashes=torrent_hash, delete_files=False)
+        await qb.torrents_delete(torrent_hashes=torrent_hash, delete_files=False)
         
         logger.info(f"File ready: {file_path}")
         
@@ -1,10 +1,97 @@
 import math
 import time
-from pyrogram.errors import FloodWait
+from collections import OrderedDict, deque
 
-# Simple lock to preventing spamming edits
-LAST_UPDATE_TIME = {}
 UPDATE_INTERVAL = 8 # Seconds between edits (User Rule: "Respect Speed Limits")
+SPEED_EMA_WINDOW = 10  # Seconds - time constant of the smoothed speed
+ETA_WINDOW = 30  # Seconds of samples the ETA is computed from
+MAX_TRACKERS = 256  # Registry size - least recently updated trackers are dropped
+
+
+class ProgressTracker:
+    """Speed and ETA of one transfer (a download or one file upload)"""
+
+    def __init__(self, total=0, now=None):
+        now = now or time.time()
+        self.total = total
+        self.current = 0
+        self.started = now
+        self.last_time = now
+        self.speed = 0.0  # Bytes/s, time-weighted EMA - recovers quickly after a stall
+        self.samples = deque()  # (time, bytes) of the last ETA_WINDOW seconds
+
+    def update(self, current, total=None, now=None):
+        now = now or time.time()
+        if total:
+            self.total = total
+        if not self.samples:
+            # First observation is the baseline (a resumed transfer may start
+            # far above 0) - speed is only measured from the next one
+            self.current = current
+            self.last_time = now
+            self.samples.append((now, current))
+            return self
+        dt = now - self.last_time
+        if dt > 0:
+            instant = max(0, current - self.current) / dt
+            if len(self.samples) == 1:
+                self.speed = instant
+            else:
+                self.speed += (1 - math.exp(-dt / SPEED_EMA_WINDOW)) * (instant - self.speed)
+            self.last_time = now
+        self.current = current
+        self.samples.append((now, current))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= ETA_WINDOW:
+            self.samples.popleft()
+        return self
+
+    def window_speed(self):
+        """Average speed over the last ETA_WINDOW seconds"""
+        if len(self.samples) < 2:
+            return self.speed
+        (t0, c0), (t1, c1) = self.samples[0], self.samples[-1]
+        return (c1 - c0) / (t1 - t0) if t1 > t0 else self.speed
+
+    def eta(self):
+        """Seconds left (0 if unknown)"""
+        speed = self.window_speed() or self.speed
+        if speed <= 0 or not self.total:
+            return 0
+        return round(max(0, self.total - self.current) / speed)
+
+
+class TrackerRegistry:
+    """Bounded LRU of ProgressTrackers keyed by (task_id, transfer)"""
+
+    def __init__(self, max_trackers=MAX_TRACKERS):
+        self.max_trackers = max_trackers
+        self._trackers = OrderedDict()
+
+    def track(self, task_id, transfer="download", total=0):
+        """Tracker of a transfer (created on first use)"""
+        key = (task_id, transfer)
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = ProgressTracker(total)
+            while len(self._trackers) > self.max_trackers:
+                self._trackers.popitem(last=False)
+        else:
+            self._trackers.move_to_end(key)
+        return tracker
+
+    def release(self, task_id, transfer=None):
+        """Drop one transfer's tracker, or every tracker of the task"""
+        if transfer is not None:
+            self._trackers.pop((task_id, transfer), None)
+            return
+        for key in [key for key in self._trackers if key[0] == task_id]:
+            del self._trackers[key]
+
+    def __len__(self):
+        return len(self._trackers)
+
+
+trackers = TrackerRegistry()
 
 def get_readable_file_size(size_bytes):
     """Convert bytes to human readable format"""
@@ -36,71 +123,9 @@ def get_readable_time(seconds):
     
     return ' '.join(result[:2])  # Show only 2 parts
 
-
-def human_readable_size(size, decimal_places=2):
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size < 1024.0:
-            return f"{size:.{decimal_places}f} {unit}"
-        size /= 1024.0
-
-def time_formatter(seconds):
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    days, hours = divmod(hours, 24)
-    tmp = ((str(days) + "d, ") if days else "") + \
-          ((str(hours) + "h, ") if hours else "") + \
-          ((str(minutes) + "m, ") if minutes else "") + \
-          ((str(seconds) + "s") if seconds else "")
-    return tmp[:-2] if tmp.endswith(", ") else tmp
-
-def get_progress_bar_string(percentage):
-    # Visual bar: [■■■■■□□□□□]
-    p = min(max(percentage, 0), 100)
-    c_full = int(p // 10)
-    c_empty = 10 - c_full
-    return f"[{'■' * c_full}{'□' * c_empty}]"
-
 def get_progress_bar(percentage, length=10):
     """Create visual progress bar [████████░░]"""
     p = min(max(percentage, 0), 100)
     filled = int((p / 100) * length)
     empty = length - filled
     return f"[{'█' * filled}{'░' * empty}]"
-
-def get_progress_string(current, total, speed, eta, status_text):
-    percentage = current * 100 / total
-    p_str = get_progress_bar_string(percentage)
-    
-    # KPS Style (approximated)
-    tmp = f"<b>{status_text}</b>\n"
-    tmp += f"<b>{percentage:.2f}%</b> {p_str}\n"
-    tmp += f"<b>Processed:</b> {human_readable_size(current)} of {human_readable_size(total)}\n"
-    tmp += f"<b>Speed:</b> {human_readable_size(speed)}/s | <b>ETA:</b> {eta}"
-    return tmp
-
-async def progress_for_pyrogram(current, total, message, start_time, status_text, reply_markup=None):
-    now = time.time()
-    msg_id = f"{message.chat.id}_{message.id}"
-    
-    last_time = LAST_UPDATE_TIME.get(msg_id, 0)
-    if (now - last_time) < UPDATE_INTERVAL and current != total:
-        return
-
-    LAST_UPDATE_TIME[msg_id] = now
-    
-    speed = current / (now - start_time) if (now - start_time) > 0 else 0
-    time_to_completion = round((total - current) / speed) if speed > 0 else 0
-    eta = time_formatter(time_to_completion)
-
-    text = get_progress_string(current, total, speed, eta, status_text)
-
-    try:
-        from pyrogram.errors import MessageNotModified
-        await message.edit(text=text, reply_markup=reply_markup)
-    except MessageNotModified:
-        pass
-    except FloodWait as e:
-        print(f"FloodWait in progress bar: {e.value}s - Skipping update")
-        LAST_UPDATE_TIME[msg_id] = now + e.value 
-    except Exception:
-        pass
@@ -0,0 +1,235 @@
+"""
+Async qBittorrent Client
+Non-blocking Web API v2 client with a pooled keep-alive session,
+per-call timeouts and transparent re-login when qBittorrent restarts
+"""
+
+import asyncio
+import logging
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 15  # Seconds per API call
+POOL_SIZE = 10  # Max keep-alive connections to the WebUI
+
+
+class QBError(Exception):
+    """Raised when qBittorrent rejects a request or cannot be reached"""
+
+
+class TorrentState(dict):
+    """Torrent info dict with attribute access (info.state, info.dlspeed, ...)"""
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+
+def _join_hashes(torrent_hashes):
+    """Accept a single hash or a list of hashes"""
+    if torrent_hashes is None:
+        return None
+    if isinstance(torrent_hashes, str):
+        return torrent_hashes
+    return "|".join(torrent_hashes)
+
+
+class QBClient:
+    """
+    Async facade over the qBittorrent Web API
+
+    Method names and keyword arguments mirror qbittorrentapi so call sites
+    only need an await in front of them.
+    """
+
+    def __init__(self, host, port, username, password, timeout=DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        host = host if host.startswith("http") else f"http://{host}"
+        self.base_url = f"{host.rstrip('/')}:{port}/api/v2"
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._login_lock = asyncio.Lock()
+        self._logged_in = False
+        self._legacy_pause = None  # None = unknown, True = pause/resume, False = stop/start
+
+    # --- Session & Auth ---
+
+    def _get_session(self):
+        """Create the pooled session lazily (must run inside the event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            # unsafe=True keeps the SID cookie when QB_HOST is an IP address
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(unsafe=True)
+            )
+            self._logged_in = False
+        return self._session
+
+    async def login(self):
+        """Log in and store the SID cookie in the session"""
+        async with self._login_lock:
+            session = self._get_session()
+            try:
+                async with session.post(
+                    f"{self.base_url}/auth/login",
+                    data={"username": self.username, "password": self.password},
+                    timeout=aiohttp.ClientTimeout(total=self.timeout)
+                ) as resp:
+                    text = await resp.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise QBError(f"qBittorrent unreachable: {e!r}")
+
+            if resp.status != 200 or text.strip() != "Ok.":
+                raise QBError(f"qBittorrent login failed ({resp.status}): {text.strip()}")
+
+            self._logged_in = True
+            logger.info("Connected to qBittorrent!")
+
+    async def wait_until_ready(self):
+        """Retry login with backoff until qBittorrent is up (never blocks the loop)"""
+        retry_count = 0
+        while True:
+            try:
+                await self.login()
+                return
+            except QBError as e:
+                retry_count += 1
+                wait_time = min(retry_count * 2, 30)
+                logger.error(f"Failed to connect to qBittorrent: {e}. Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+
+    async def close(self):
+        """Close the pooled session"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method, endpoint, params=None, data=None, timeout=None):
+        """
+        Make an API call, re-authenticating once on 403
+
+        Returns:
+            Parsed JSON, or response text for plain-text endpoints
+        """
+        if not self._logged_in:
+            await self.login()
+
+        for attempt in range(2):
+            session = self._get_session()
+            try:
+                async with session.request(
+                    method,
+                    f"{self.base_url}/{endpoint}",
+                    params=params,
+                    data=data,
+                    timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+                ) as resp:
+                    if resp.status == 403 and attempt == 0:
+                        # SID expired or qBittorrent restarted - log in again
+                        logger.warning("qBittorrent session expired. Re-authenticating...")
+                        self._logged_in = False
+                        await self.login()
+                        continue
+                    if resp.status != 200:
+                        text = await resp.text()
+                        raise QBError(f"{endpoint} failed ({resp.status}): {text.strip()}")
+                    if resp.content_type == "application/json":
+                        return await resp.json()
+                    return await resp.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # Connection refused/reset usually means qBittorrent restarted
+                self._logged_in = False
+                raise QBError(f"{endpoint} failed: {e!r}")
+
+        raise QBError(f"{endpoint} failed: not authorized")
+
+    # --- Application ---
+
+    async def app_version(self):
+        return await self._request("GET", "app/version")
+
+    async def sync_maindata(self, rid=0):
+        """Incremental state diff since rid (full update when rid=0)"""
+        return await self._request("GET", "sync/maindata", params={"rid": rid})
+
+    # --- Torrents ---
+
+    async def torrents_info(self, torrent_hashes=None, tag=None, status_filter=None):
+        params = {}
+        if torrent_hashes is not None:
+            params["hashes"] = _join_hashes(torrent_hashes)
+        if tag is not None:
+            params["tag"] = tag
+        if status_filter is not None:
+            params["filter"] = status_filter
+        torrents = await self._request("GET", "torrents/info", params=params)
+        return [TorrentState(t) for t in torrents]
+
+    async def torrents_files(self, torrent_hash):
+        files = await self._request("GET", "torrents/files", params={"hash": torrent_hash})
+        return [TorrentState(f) for f in files]
+
+    async def torrents_file_priority(self, torrent_hash, file_ids, priority):
+        """Set download priority of files by index (0 = do not download)"""
+        return await self._request("POST", "torrents/filePrio", data={
+            "hash": torrent_hash,
+            "id": "|".join(str(i) for i in file_ids),
+            "priority": priority
+        })
+
+    async def torrents_add(self, urls, save_path=None, tags=None, is_paused=None, **extra):
+        data = {"urls": urls if isinstance(urls, str) else "\n".join(urls)}
+        if save_path:
+            data["savepath"] = save_path
+        if tags:
+            data["tags"] = tags if isinstance(tags, str) else ",".join(tags)
+        if is_paused is not None:
+            # "paused" for qBittorrent 4.x, "stopped" for 5.x
+            data["paused"] = data["stopped"] = "true" if is_paused else "false"
+        data.update({k: str(v).lower() if isinstance(v, bool) else v for k, v in extra.items()})
+        result = await self._request("POST", "torrents/add", data=data)
+        if isinstance(result, str) and result.strip() == "Fails.":
+            raise QBError("qBittorrent refused to add the torrent")
+        return result
+
+    async def torrents_delete(self, torrent_hashes, delete_files=False):
+        return await self._request("POST", "torrents/delete", data={
+            "hashes": _join_hashes(torrent_hashes),
+            "deleteFiles": "true" if delete_files else "false"
+        })
+
+    async def torrents_reannounce(self, torrent_hashes):
+        return await self._request("POST", "torrents/reannounce", data={
+            "hashes": _join_hashes(torrent_hashes)
+        })
+
+    async def torrents_add_trackers(self, torrent_hash, urls):
+        return await self._request("POST", "torrents/addTrackers", data={
+            "hash": torrent_hash,
+            "urls": urls if isinstance(urls, str) else "\n".join(urls)
+        })
+
+    async def _pause_resume(self, legacy_endpoint, endpoint, torrent_hashes):
+        """qBittorrent 5.x renamed pause/resume to stop/start"""
+        data = {"hashes": _join_hashes(torrent_hashes)}
+        if self._legacy_pause is not True:
+            try:
+                result = await self._request("POST", f"torrents/{endpoint}", data=data)
+                self._legacy_pause = False
+                return result
+            except QBError as e:
+                if self._legacy_pause is False or "(404)" not in str(e):
+                    raise
+        self._legacy_pause = True
+        return await self._request("POST", f"torrents/{legacy_endpoint}", data=data)
+
+    async def torrents_pause(self, torrent_hashes):
+        return await self._pause_resume("pause", "stop", torrent_hashes)
+
+    async def torrents_resume(self, torrent_hashes):
+        return await self._pause_resume("resume", "start", torrent_hashes)
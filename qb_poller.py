@@ -0,0 +1,221 @@
+"""
+qBittorrent State Poller
+One background loop tracks every torrent through incremental sync/maindata
+and pushes per-torrent state changes to subscribed tasks
+"""
+
+import asyncio
+import logging
+import time
+from qb_client import TorrentState
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 3  # Seconds between sync/maindata requests
+
+
+def _has_metadata(state):
+    """True once the file list is known (total_size stays <= 0 while in metaDL)"""
+    return state.get("state") != "metaDL" and state.get("total_size", 0) > 0 and state.get("has_metadata", True)
+
+
+class QBPoller:
+    """
+    Shared qBittorrent state cache
+
+    A single request per cycle keeps the state of all torrents up to date,
+    so the API cost stays flat no matter how many tasks are running.
+    """
+
+    def __init__(self, qb, interval=POLL_INTERVAL):
+        self.qb = qb
+        self.interval = interval
+        self.rid = 0
+        self.torrents = {}  # {hash: TorrentState}
+        self.server_state = {}
+        self.last_update = 0
+        self._subscribers = {}  # {hash: [asyncio.Queue, ...]}
+        self._updated = asyncio.Event()
+        self._task = None
+
+    # --- Read API ---
+
+    def get(self, t_hash):
+        """Get latest known state of a torrent (None if unknown)"""
+        return self.torrents.get(t_hash)
+
+    def all(self):
+        """Get latest known state of all torrents"""
+        return list(self.torrents.values())
+
+    # --- Subscriptions ---
+
+    def subscribe(self, t_hash):
+        """
+        Subscribe to state changes of a torrent
+
+        Returns:
+            asyncio.Queue: receives TorrentState on change, None on removal
+        """
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(t_hash, []).append(queue)
+        return queue
+
+    def unsubscribe(self, t_hash, queue):
+        """Stop receiving updates for a torrent"""
+        queues = self._subscribers.get(t_hash, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(t_hash, None)
+
+    async def next_update(self, t_hash, queue, timeout=30):
+        """
+        Wait for the next state change of a torrent
+
+        Falls back to the cached state after timeout so callers can still
+        run their periodic checks while a torrent is idle.
+        """
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return self.torrents.get(t_hash)
+
+    async def wait_cycle(self, timeout=None):
+        """Wait until the next poll cycle has been applied"""
+        event = self._updated
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def lookup(self, t_hash):
+        """
+        Get a torrent by hash, asking qBittorrent directly if the cache
+        has not seen it yet (single targeted request, no list diffing)
+        """
+        state = self.torrents.get(t_hash)
+        if state is not None:
+            return state
+        info_list = await self.qb.torrents_info(torrent_hashes=t_hash)
+        if not info_list:
+            return None
+        state = TorrentState(info_list[0])
+        self.torrents.setdefault(t_hash, state)
+        return state
+
+    async def wait_for(self, t_hash, timeout=120):
+        """
+        Wait until a known hash shows up in qBittorrent
+
+        Returns:
+            TorrentState or None on timeout
+        """
+        state = await self.lookup(t_hash)
+        deadline = time.time() + timeout
+        while state is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            await self.wait_cycle(remaining)
+            state = self.torrents.get(t_hash)
+        return state
+
+    async def wait_for_metadata(self, t_hash, timeout=600):
+        """
+        Wait until qBittorrent has received the metadata (file list) of a torrent
+
+        Returns:
+            TorrentState or None on timeout / removal
+        """
+        deadline = time.time() + timeout
+        state = await self.wait_for(t_hash, timeout=min(timeout, 120))
+        if state is None:
+            return None
+
+        queue = self.subscribe(t_hash)
+        try:
+            while not _has_metadata(state):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                state = await self.next_update(t_hash, queue, timeout=min(remaining, 30))
+                if state is None:
+                    return None  # Removed (e.g. cancelled)
+        finally:
+            self.unsubscribe(t_hash, queue)
+        return state
+
+    def _publish(self, t_hash, state):
+        """Push latest state to subscribers, replacing unread stale state"""
+        for queue in self._subscribers.get(t_hash, []):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(state)
+
+    # --- Polling ---
+
+    def _apply(self, data):
+        """Merge a sync/maindata response into the cache"""
+        changed = set()
+
+        if data.get("full_update"):
+            removed = set(self.torrents) - set((data.get("torrents") or {}).keys())
+            self.torrents = {}
+            self.server_state = {}
+        else:
+            removed = set(data.get("torrents_removed") or [])
+
+        for t_hash, fields in (data.get("torrents") or {}).items():
+            state = self.torrents.get(t_hash)
+            if state is None:
+                state = TorrentState(hash=t_hash)
+                self.torrents[t_hash] = state
+            state.update(fields)
+            changed.add(t_hash)
+
+        for t_hash in removed:
+            self.torrents.pop(t_hash, None)
+
+        self.server_state.update(data.get("server_state") or {})
+        self.rid = data.get("rid", self.rid)
+        self.last_update = time.time()
+
+        for t_hash in changed:
+            # Publish a copy so consumers never see a half-merged dict
+            self._publish(t_hash, TorrentState(self.torrents[t_hash]))
+        for t_hash in removed:
+            self._publish(t_hash, None)
+
+    async def poll_once(self):
+        """Run one sync/maindata cycle"""
+        data = await self.qb.sync_maindata(rid=self.rid)
+        self._apply(data)
+
+        # Wake everything waiting for this cycle
+        event, self._updated = self._updated, asyncio.Event()
+        event.set()
+
+    async def run(self):
+        """Background polling loop"""
+        logger.info("Starting qBittorrent state poller...")
+        await self.qb.wait_until_ready()
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"qBittorrent poll error: {e}")
+                self.rid = 0  # Request a full update next time
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start polling in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self.run())
+        return self._task
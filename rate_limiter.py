@@ -1,116 +1,188 @@
 """
 Rate Limiter - Prevent Telegram API abuse and bans
-Tracks uploads, messages, and API calls to stay within safe limits
+Async token buckets: one global budget per kind (messages, uploads) plus one
+bucket per chat. A FloodWait halves the rate of the buckets involved
+(multiplicative decrease); calls that go through without one win the rate
+back step by step (additive increase).
 """
 
 import time
 import asyncio
 import logging
-from collections import deque
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
-# Conservative limits (well below Telegram's actual limits for safety)
-MAX_UPLOADS_PER_MINUTE = 8  # Telegram allows ~20, we use 8
-MAX_MESSAGES_PER_MINUTE = 12  # Telegram allows ~20, we use 12
-MAX_FILES_PER_HOUR = 100  # Conservative hourly limit
-
-# Tracking queues (timestamp deques)
-upload_timestamps = deque(maxlen=200)
-message_timestamps = deque(maxlen=200)
-
-class RateLimiter:
-    """Global rate limiter singleton"""
-    
-    @staticmethod
-    def _clean_old_timestamps(timestamps, window_seconds=60):
-        """Remove timestamps older than window"""
-        now = time.time()
-        cutoff = now - window_seconds
-        
-        # Remove old entries
-        while timestamps and timestamps[0] < cutoff:
-            timestamps.popleft()
-    
-    @staticmethod
-    def get_upload_count(window_seconds=60):
-        """Get upload count in last N seconds"""
-        RateLimiter._clean_old_timestamps(upload_timestamps, window_seconds)
-        return len(upload_timestamps)
-    
-    @staticmethod
-    def get_message_count(window_seconds=60):
-        """Get message count in last N seconds"""
-        RateLimiter._clean_old_timestamps(message_timestamps, window_seconds)
-        return len(message_timestamps)
-    
-    @staticmethod
-    async def wait_if_needed_upload():
-        """
-        Wait if upload rate is too high
-        Returns: seconds waited
-        """
-        RateLimiter._clean_old_timestamps(upload_timestamps)
-        
-        if len(upload_timestamps) >= MAX_UPLOADS_PER_MINUTE:
-            # Calculate wait time
-            oldest = upload_timestamps[0]
-            wait_time = 60 - (time.time() - oldest) + 1  # +1 buffer
-            
-            if wait_time > 0:
-                logger.warning(f"⚠️ Rate limit: {len(upload_timestamps)} uploads/min. Waiting {wait_time:.1f}s")
-                await asyncio.sleep(wait_time)
-                return wait_time
-        
-        # Record this upload
-        upload_timestamps.append(time.time())
-        return 0
-    
-    @staticmethod
-    async def wait_if_needed_message():
+# Starting budgets (Telegram allows ~30 msg/s overall, ~20 msg/min per group/channel)
+GLOBAL_MESSAGES_PER_SEC = 20
+GLOBAL_MESSAGE_BURST = 30
+CHAT_MESSAGES_PER_MIN = 20
+CHAT_MESSAGE_BURST = 5
+UPLOADS_PER_MIN = 20
+UPLOAD_BURST = 5
+
+# AIMD feedback
+DECREASE_FACTOR = 0.5  # Rate multiplier on FloodWait (chat bucket)
+GLOBAL_DECREASE_FACTOR = 0.8  # Milder cut for the shared buckets
+MIN_RATE_FRACTION = 0.05  # Never drop below 5% of the starting rate
+RECOVERY_STEP = 0.1  # Fraction of the starting rate won back per quiet interval
+RECOVERY_INTERVAL = 30  # Seconds without FloodWait per recovery step
+
+MAX_CHAT_BUCKETS = 500  # Least recently used chat buckets are dropped beyond this
+
+KIND_MESSAGE = "message"
+KIND_UPLOAD = "upload"
+
+
+class TokenBucket:
+    """
+    Token bucket with reservations
+
+    reserve() takes the tokens right away (the balance may go negative) and
+    returns how long the caller must wait. Nothing awaits between check and
+    take, so concurrent coroutines can never pass on the same token.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.base_rate = rate  # Tokens per second when healthy
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0  # FloodWait: nothing passes before this
+        self.last_refill = time.monotonic()
+        self.last_change = self.last_refill
+        self.flood_waits = 0
+        self.granted = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _recover(self, now):
+        """Additive increase after each quiet interval"""
+        if self.rate >= self.base_rate:
+            return
+        steps = int((now - self.last_change) // RECOVERY_INTERVAL)
+        if steps > 0:
+            self.rate = min(self.base_rate, self.rate + steps * RECOVERY_STEP * self.base_rate)
+            self.last_change = now
+
+    def reserve(self, cost=1, now=None):
+        """Take tokens and return the seconds to wait before using them"""
+        now = now or time.monotonic()
+        self._refill(now)
+        self._recover(now)
+        self.tokens -= cost
+        self.granted += 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        return max(wait, self.blocked_until - now)
+
+    def try_take(self, cost=1, now=None):
+        """Take tokens only if available right now (for droppable calls)"""
+        now = now or time.monotonic()
+        self._refill(now)
+        self._recover(now)
+        if now < self.blocked_until or self.tokens < cost:
+            return False
+        self.tokens -= cost
+        self.granted += 1
+        return True
+
+    def penalize(self, wait_seconds, factor, now=None):
+        """Multiplicative decrease after a FloodWait"""
+        now = now or time.monotonic()
+        self._refill(now)
+        self.rate = max(self.base_rate * MIN_RATE_FRACTION, self.rate * factor)
+        self.tokens = min(self.tokens, 0)
+        self.blocked_until = max(self.blocked_until, now + wait_seconds)
+        self.last_change = now
+        self.flood_waits += 1
+
+    def snapshot(self, now=None):
+        now = now or time.monotonic()
+        self._refill(now)
+        return {
+            "name": self.name,
+            "tokens": max(self.tokens, 0),
+            "capacity": self.capacity,
+            "rate_per_min": self.rate * 60,
+            "base_per_min": self.base_rate * 60,
+            "blocked_for": max(0, self.blocked_until - now),
+            "flood_waits": self.flood_waits,
+            "granted": self.granted,
+        }
+
+
+class AsyncRateLimiter:
+    """Global + per-chat budgets for every outgoing Telegram call"""
+
+    def __init__(self):
+        self.global_buckets = {
+            KIND_MESSAGE: TokenBucket("global messages", GLOBAL_MESSAGES_PER_SEC, GLOBAL_MESSAGE_BURST),
+            KIND_UPLOAD: TokenBucket("global uploads", UPLOADS_PER_MIN / 60, UPLOAD_BURST),
+        }
+        self.chat_buckets = OrderedDict()  # {chat_id: TokenBucket}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(f"chat {chat_id}", CHAT_MESSAGES_PER_MIN / 60, CHAT_MESSAGE_BURST)
+            self.chat_buckets[chat_id] = bucket
+            while len(self.chat_buckets) > MAX_CHAT_BUCKETS:
+                self.chat_buckets.popitem(last=False)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _buckets(self, chat_id, kind):
+        buckets = [self.global_buckets[KIND_MESSAGE]]
+        if kind == KIND_UPLOAD:
+            buckets.append(self.global_buckets[KIND_UPLOAD])
+        if chat_id is not None:
+            buckets.append(self._chat_bucket(chat_id))
+        return buckets
+
+    async def acquire(self, chat_id=None, kind=KIND_MESSAGE):
         """
-        Wait if message rate is too high
-        Returns: seconds waited
+        Wait until a call to chat_id is within budget
+
+        Returns:
+            float: seconds waited
         """
-        RateLimiter._clean_old_timestamps(message_timestamps)
-        
-        if len(message_timestamps) >= MAX_MESSAGES_PER_MINUTE:
-            # Calculate wait time
-            oldest = message_timestamps[0]
-            wait_time = 60 - (time.time() - oldest) + 1
-            
-            if wait_time > 0:
-                logger.warning(f"⚠️ Rate limit: {len(message_timestamps)} messages/min. Waiting {wait_time:.1f}s")
-                await asyncio.sleep(wait_time)
-                return wait_time
-        
-        # Record this message
-        message_timestamps.append(time.time())
-        return 0
-    
-    @staticmethod
-    def get_stats():
-        """Get current rate statistics"""
+        wait = max(bucket.reserve() for bucket in self._buckets(chat_id, kind))
+        if wait > 0:
+            if wait > 5:
+                logger.warning(f"⚠️ Rate limit: waiting {wait:.1f}s for {kind} to {chat_id}")
+            await asyncio.sleep(wait)
+        return wait
+
+    def try_acquire(self, chat_id=None, kind=KIND_MESSAGE):
+        """Non-blocking acquire for calls that can simply be skipped (progress edits)"""
+        buckets = self._buckets(chat_id, kind)
+        now = time.monotonic()
+        for bucket in buckets:
+            bucket._refill(now)
+        if any(now < b.blocked_until or b.tokens < 1 for b in buckets):
+            return False
+        return all(bucket.try_take(now=now) for bucket in buckets)
+
+    def on_flood_wait(self, chat_id, seconds, kind=KIND_MESSAGE):
+        """Feed a FloodWait back into the buckets that let the call through"""
+        for bucket in self._buckets(chat_id, kind):
+            is_chat = chat_id is not None and bucket is self.chat_buckets.get(chat_id)
+            bucket.penalize(seconds, DECREASE_FACTOR if is_chat else GLOBAL_DECREASE_FACTOR)
+        logger.warning(f"FloodWait {seconds}s on {kind} to {chat_id} - budget reduced")
+
+    def get_stats(self, max_chats=5):
+        """Live bucket state for /limits (busiest chats first)"""
+        chats = sorted(self.chat_buckets.values(), key=lambda b: (b.flood_waits, b.granted), reverse=True)
         return {
-            "uploads_per_min": RateLimiter.get_upload_count(60),
-            "messages_per_min": RateLimiter.get_message_count(60),
-            "uploads_per_hour": RateLimiter.get_upload_count(3600),
-            "max_uploads_per_min": MAX_UPLOADS_PER_MINUTE,
-            "max_messages_per_min": MAX_MESSAGES_PER_MINUTE,
-            "is_safe": RateLimiter.is_safe()
+            "global": [bucket.snapshot() for bucket in self.global_buckets.values()],
+            "chats": [bucket.snapshot() for bucket in chats[:max_chats]],
+            "chat_count": len(self.chat_buckets),
         }
-    
-    @staticmethod
-    def is_safe():
-        """Check if current rates are safe"""
-        uploads = RateLimiter.get_upload_count(60)
-        messages = RateLimiter.get_message_count(60)
-        
-        return uploads < (MAX_UPLOADS_PER_MINUTE * 0.8) and messages < (MAX_MESSAGES_PER_MINUTE * 0.8)
-    
-    @staticmethod
-    def reset():
-        """Reset all counters (for testing)"""
-        upload_timestamps.clear()
-        message_timestamps.clear()
-        logger.info("Rate limiter reset")
+
+
+# Shared instance used by every caller
+limiter = AsyncRateLimiter()
@@ -0,0 +1,95 @@
+"""
+Render Cache
+Remembers what each bot message last showed (hash of text and markup), so an
+edit that would not change anything never leaves the process - instead of
+costing a round trip and a MessageNotModified. Progress edits may also pass
+their numbers: changes below a significance threshold are held back until the
+message is old enough to deserve a refresh anyway.
+"""
+
+import time
+import hashlib
+from collections import OrderedDict
+
+MIN_PERCENT = 1.0  # Progress change (percentage points) worth an edit
+MAX_AGE = 60  # Seconds after which any visible change is shown
+MAX_ENTRIES = 1000  # Messages remembered - least recently edited are dropped
+
+REASON_UNCHANGED = "unchanged"
+REASON_INSIGNIFICANT = "insignificant"
+
+
+def digest(text, reply_markup=None):
+    """Short hash of what a message shows"""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(text).encode())
+    if reply_markup is not None:
+        h.update(str(reply_markup).encode())
+    return h.hexdigest()
+
+
+class RenderCache:
+    """Last rendered state per message (chat_id, message_id)"""
+
+    def __init__(self, min_percent=MIN_PERCENT, max_age=MAX_AGE, max_entries=MAX_ENTRIES):
+        self.min_percent = min_percent
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {(chat_id, message_id): (digest, signature, progress, time)}
+        self.suppressed = {REASON_UNCHANGED: 0, REASON_INSIGNIFICANT: 0}
+        self.sent = 0
+
+    def _significant(self, last, signature, progress, now):
+        """Is a progress change worth an edit (same signature = same non-numeric content)"""
+        _, last_signature, last_progress, last_time = last
+        if progress is None or last_progress is None or signature != last_signature:
+            return True
+        if now - last_time >= self.max_age:
+            return True
+        if isinstance(progress, (int, float)):
+            progress, last_progress = (progress,), (last_progress,)
+        if len(progress) != len(last_progress):
+            return True
+        return any(abs(new - old) >= self.min_percent for new, old in zip(progress, last_progress))
+
+    def should_edit(self, chat_id, message_id, text, reply_markup=None, signature=None, progress=None, now=None):
+        """
+        Check an edit before it is sent (counts it as suppressed if not)
+
+        Args:
+            signature: what must be shown right away when it changes (e.g. status line)
+            progress: percentage, or a tuple of them, that may lag by min_percent
+        """
+        now = now or time.time()
+        last = self._entries.get((chat_id, message_id))
+        if last is None:
+            return True
+        if last[0] == digest(text, reply_markup):
+            self.suppressed[REASON_UNCHANGED] += 1
+            return False
+        if not self._significant(last, signature, progress, now):
+            self.suppressed[REASON_INSIGNIFICANT] += 1
+            return False
+        return True
+
+    def record(self, chat_id, message_id, text, reply_markup=None, signature=None, progress=None, now=None):
+        """The message now shows this (after a successful send or edit)"""
+        key = (chat_id, message_id)
+        self._entries[key] = (digest(text, reply_markup), signature, progress, now or time.time())
+        self._entries.move_to_end(key)
+        self.sent += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, chat_id, message_id):
+        self._entries.pop((chat_id, message_id), None)
+
+    def get_stats(self):
+        return {
+            "sent": self.sent,
+            "suppressed": dict(self.suppressed),
+            "tracked": len(self._entries),
+        }
+
+
+cache = RenderCache()
@@ -18,6 +18,7 @@ COLLECTION_NAME = "settings"
 DEFAULT_SETTINGS = {
     "max_file_size": 2 * 1024 * 1024 * 1024,  # 2GB in bytes
     "upload_mode": "document",
+    "split_large_files": False,  # Upload files above the Telegram limit as numbered parts
     "sudo_users": [],
     "user_thumbnails": {},  # {user_id: "Thumbnails/{user_id}.jpg"}
     "upload_channels": [],  # ["-1001234567", "-1009876543"] - Multiple channel IDs
@@ -0,0 +1,123 @@
+"""
+Snapshot Service
+/queue, its Refresh button and /stats read pre-rendered snapshots instead of
+collecting torrent state and MongoDB counts and rebuilding their HTML on every
+request. Sections are rebuilt in the background at a fixed cadence; a reader
+only triggers a build when a snapshot is older than its TTL (e.g. nobody read
+the section for a while), and readers arriving together share that one build.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 5  # Seconds between background rebuilds
+SNAPSHOT_TTL = 15  # Older snapshots are rebuilt on read
+IDLE_AFTER = 300  # Sections nobody read for this long are not rebuilt in the background
+
+
+class Snapshot:
+    """One rendered section: HTML fragments in display order plus raw values"""
+
+    def __init__(self, name, fragments, values, built_at, build_time, ttl):
+        self.name = name
+        self.fragments = OrderedDict(fragments)
+        self.values = values
+        self.built_at = built_at
+        self.build_time = build_time  # Seconds the builder took
+        self.ttl = ttl
+
+    @property
+    def text(self):
+        return "".join(fragment for fragment in self.fragments.values() if fragment)
+
+    def age(self, now=None):
+        return (now or time.time()) - self.built_at
+
+    @property
+    def expires_at(self):
+        return self.built_at + self.ttl
+
+    def is_fresh(self, now=None):
+        return self.age(now) < self.ttl
+
+    def footer(self):
+        return f"\n<i>🕒 Updated {int(self.age())}s ago</i>"
+
+
+class SnapshotService:
+    """Background-refreshed snapshots of named sections"""
+
+    def __init__(self, interval=REFRESH_INTERVAL, ttl=SNAPSHOT_TTL):
+        self.interval = interval
+        self.ttl = ttl
+        self._builders = {}  # {name: async () -> (fragments, values)}
+        self._snapshots = {}
+        self._locks = {}
+        self._last_read = {}
+        self.builds = 0
+        self.reads = 0
+
+    def register(self, name, builder):
+        """
+        Add a section
+
+        Args:
+            builder: async function returning (fragments, values) - an ordered
+                dict of HTML fragments and a dict of raw numbers
+        """
+        self._builders[name] = builder
+        self._locks[name] = asyncio.Lock()
+
+    async def refresh(self, name):
+        """Rebuild one section now"""
+        async with self._locks[name]:
+            await self._build(name)
+        return self._snapshots[name]
+
+    async def _build(self, name):
+        started = time.time()
+        fragments, values = await self._builders[name]()
+        self._snapshots[name] = Snapshot(name, fragments, values, time.time(), time.time() - started, self.ttl)
+        self.builds += 1
+
+    async def get(self, name):
+        """
+        Latest snapshot of a section (built on the spot only if missing or expired)
+
+        Returns:
+            Snapshot
+        """
+        self.reads += 1
+        self._last_read[name] = time.time()
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None and snapshot.is_fresh():
+            return snapshot
+        async with self._locks[name]:
+            # Another reader may have rebuilt it while this one waited
+            snapshot = self._snapshots.get(name)
+            if snapshot is None or not snapshot.is_fresh():
+                await self._build(name)
+        return self._snapshots[name]
+
+    async def run(self):
+        """Background loop (rebuilds every recently read section per interval)"""
+        logger.info("Starting snapshot service...")
+        while True:
+            now = time.time()
+            for name in list(self._builders):
+                if now - self._last_read.get(name, 0) > IDLE_AFTER:
+                    continue
+                try:
+                    await self.refresh(name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Snapshot {name} failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+snapshots = SnapshotService()
@@ -0,0 +1,91 @@
+"""
+Split Upload Utilities
+Files above Telegram's size limit are uploaded as numbered parts. Each part is an
+offset-bounded reader over the original file, streamed straight into pyrogram -
+no split copies are written, so a 6 GB file costs no extra disk space or write I/O.
+Parts are named "<file>.001", "<file>.002", ... and can be joined with
+`cat file.* > file` or 7-Zip / HJSplit.
+"""
+
+import io
+import os
+
+# Telegram's real limits are 2000 / 4000 MiB, a little under the 2 / 4 GiB setting
+TELEGRAM_LIMIT = 2000 * 1024 * 1024
+TELEGRAM_PREMIUM_LIMIT = 4000 * 1024 * 1024
+
+
+def part_size_for(max_file_size):
+    """Largest part Telegram accepts for the configured max file size"""
+    if max_file_size >= 4 * 1024 ** 3:
+        return TELEGRAM_PREMIUM_LIMIT
+    return TELEGRAM_LIMIT
+
+
+def plan_parts(file_size, part_size):
+    """
+    Byte ranges of the parts of a file
+
+    Returns:
+        list: [(offset, length)] - a single range when the file fits
+    """
+    if file_size <= part_size:
+        return [(0, file_size)]
+    return [(offset, min(part_size, file_size - offset)) for offset in range(0, file_size, part_size)]
+
+
+def part_name(file_name, number):
+    return f"{file_name}.{number:03d}"
+
+
+def part_caption(caption, number, count):
+    return f"{caption}\n\n📦 <b>Part {number}/{count}</b>"
+
+
+class FileSlice(io.RawIOBase):
+    """
+    Read-only view of bytes [offset, offset + length) of a file
+
+    Behaves like a whole file to pyrogram's save_file (seek to the end gives the
+    part size, reads stop at the part boundary).
+    """
+
+    def __init__(self, path, offset, length, name=None):
+        super().__init__()
+        self._fp = open(path, "rb")
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self._pos = 0
+        self.name = name or os.path.basename(path)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.length
+        self._pos = max(0, min(pos, self.length))
+        return self._pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.length - self._pos)
+        if size <= 0:
+            return 0
+        self._fp.seek(self.offset + self._pos)
+        read = self._fp.readinto(memoryview(buffer)[:size])
+        self._pos += read
+        return read
+
+    def close(self):
+        if not self.closed:
+            self._fp.close()
+        super().close()
@@ -0,0 +1,170 @@
+"""
+Status Board
+One dashboard message per chat instead of one progress message per task.
+Tasks report progress with update() - no API call - and a single timer renders
+every chat that changed with status_utils.build_status_message and edits that
+chat's dashboard, so progress edits grow with the number of chats, not tasks.
+Task messages are still used for one-off notices (errors, completion).
+"""
+
+import time
+import asyncio
+import logging
+from pyrogram import enums
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+import rate_limiter
+import render_cache
+import status_utils
+
+logger = logging.getLogger(__name__)
+
+UPDATE_INTERVAL = 8  # Seconds between dashboard edits (same pace as progress.UPDATE_INTERVAL)
+MAX_TASKS_SHOWN = 8  # Keeps the dashboard under Telegram's message length limit
+
+
+class ChatBoard:
+    """Tasks and dashboard message of one chat"""
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.tasks = {}  # {task_id: fields} in start order
+        self.message = None  # Dashboard - posted on the first render
+        self.dirty = False
+
+
+class StatusBoard:
+    """Collects progress from every task and renders one dashboard per chat"""
+
+    def __init__(self, client, interval=UPDATE_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self.chats = {}  # {chat_id: ChatBoard}
+        self._task_chat = {}  # {task_id: chat_id}
+
+    def update(self, chat_id, task_id, **fields):
+        """
+        Record progress of a task (rendered on the next tick)
+
+        Fields are the ones build_status_message reads (status, name, progress,
+        speed, downloaded, size, eta, uploaded_count, total_files, upload_*);
+        `cancel` is the callback data of the task's cancel button.
+        """
+        board = self.chats.get(chat_id)
+        if board is None:
+            board = self.chats[chat_id] = ChatBoard(chat_id)
+        task = board.tasks.setdefault(task_id, {"status": "downloading", "name": str(task_id)})
+        task.update(fields)
+        self._task_chat[task_id] = chat_id
+        board.dirty = True
+
+    def finish(self, task_id):
+        """Task is done or cancelled - drop it from its chat's dashboard"""
+        chat_id = self._task_chat.pop(task_id, None)
+        board = self.chats.get(chat_id)
+        if board is not None and board.tasks.pop(task_id, None) is not None:
+            board.dirty = True
+
+    def is_dashboard(self, message):
+        board = self.chats.get(message.chat.id)
+        return board is not None and board.message is not None and board.message.id == message.id
+
+    def render(self, board):
+        """
+        Dashboard of one chat
+
+        Returns:
+            tuple: (text, reply_markup, signature, progress) - signature and
+                progress let the render cache skip edits that only move the bars a little
+        """
+        shown = list(board.tasks.items())[:MAX_TASKS_SHOWN]
+        hidden = len(board.tasks) - len(shown)
+        text = status_utils.build_status_message(
+            {str(task_id)[:8]: task for task_id, task in shown},
+            hidden=hidden
+        )
+        buttons = [
+            [InlineKeyboardButton(f"❌ {task['name'][:24]}", callback_data=task["cancel"])]
+            for _, task in shown if task.get("cancel")
+        ]
+        signature = tuple(
+            (task_id, task["status"], task["name"], task.get("state"), task.get("uploaded_count"), task.get("upload_name"))
+            for task_id, task in shown
+        ) + (hidden,)
+        progress = tuple(
+            value
+            for _, task in shown
+            for value in (
+                task.get("progress", 0) * 100,
+                task.get("upload_current", 0) * 100 / task["upload_total"] if task.get("upload_total") else 0,
+            )
+        )
+        return text, InlineKeyboardMarkup(buttons) if buttons else None, signature, progress
+
+    async def _publish(self, board):
+        """
+        Post or edit the dashboard of one chat
+
+        Returns:
+            bool: False if it has to be retried on the next tick
+        """
+        text, markup, signature, progress = self.render(board)
+        if board.message is not None and not render_cache.cache.should_edit(
+            board.chat_id, board.message.id, text, markup, signature, progress
+        ):
+            return True
+        # Never wait for one chat's budget - that would hold up every other chat
+        if not rate_limiter.limiter.try_acquire(board.chat_id):
+            return False
+        try:
+            if board.message is None:
+                board.message = await self.client.send_message(
+                    board.chat_id, text, parse_mode=enums.ParseMode.HTML, reply_markup=markup
+                )
+            else:
+                await board.message.edit(text, parse_mode=enums.ParseMode.HTML, reply_markup=markup)
+        except MessageNotModified:
+            pass
+        except FloodWait as e:
+            rate_limiter.limiter.on_flood_wait(board.chat_id, e.value)
+            return False
+        except Exception as e:
+            # Dashboard deleted or no longer editable - post a new one next time
+            logger.warning(f"Status board of chat {board.chat_id} failed: {e}")
+            if board.message is not None:
+                render_cache.cache.forget(board.chat_id, board.message.id)
+                board.message = None
+            return False
+        render_cache.cache.record(board.chat_id, board.message.id, text, markup, signature, progress)
+        return True
+
+    async def flush(self):
+        """Render every chat that changed since the last tick"""
+        for chat_id, board in list(self.chats.items()):
+            if not board.dirty:
+                continue
+            board.dirty = False
+            if board.tasks or board.message is not None:
+                if not await self._publish(board):
+                    board.dirty = True
+                    continue
+            if not board.tasks:
+                # Last task gone - the final "no active downloads" board stays and
+                # the next task gets a fresh dashboard below its own messages
+                if board.message is not None:
+                    render_cache.cache.forget(chat_id, board.message.id)
+                del self.chats[chat_id]
+
+    async def run(self):
+        """Background loop (one flush per interval for all chats)"""
+        logger.info("Starting status board...")
+        while True:
+            try:
+                started = time.time()
+                await self.flush()
+                await asyncio.sleep(max(1, self.interval - (time.time() - started)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status board error: {e}")
+                await asyncio.sleep(5)
@@ -49,8 +49,14 @@ def get_system_stats():
     except Exception:
         return "💻 System stats unavailable"
 
-def build_status_message(downloads_dict):
-    """Build comprehensive status message for all active downloads"""
+def build_status_message(downloads_dict, hidden=0):
+    """
+    Build comprehensive status message for all active downloads
+    
+    Args:
+        downloads_dict: {task_id: task fields} (see status_service.StatusBoard.update)
+        hidden: further tasks left out to keep the message short
+    """
     if not downloads_dict:
         stats = get_system_stats()
         uptime = get_readable_time(int(time.time() - START_TIME))
@@ -60,15 +66,18 @@ def build_status_message(downloads_dict):
             f"⏱️ Uptime: {uptime}"
         )
     
-    msg_parts = [f"📊 <b>Active Downloads ({len(downloads_dict)})</b>\n"]
+    msg_parts = [f"📊 <b>Active Downloads ({len(downloads_dict) + hidden})</b>\n"]
     
     for task_id, task in downloads_dict.items():
-        status_icon = "⏳" if task["status"] == "downloading" else "📤" if task["status"] == "uploading" else "✅"
+        status_icon = {"metadata": "🔎", "downloading": "⏳", "uploading": "📤"}.get(task["status"], "✅")
+        name = task["name"]
         
         msg_parts.append(f"\n{status_icon} <b>Task #{task_id}</b>")
-        msg_parts.append(f"📝 {task['name'][:50]}...")
+        msg_parts.append(f"📝 {name[:50] + '...' if len(name) > 50 else name}")
         
-        if task["status"] == "downloading":
+        if task["status"] == "metadata":
+            msg_parts.append(f"🔄 {task.get('state', 'metaDL')} | Seeds: {task.get('seeds', 0)} | Peers: {task.get('peers', 0)}")
+        elif task["status"] == "downloading":
             progress = task.get("progress", 0) * 100
             speed_str = get_readable_file_size(task.get("speed", 0)) + "/s"
             size_downloaded = get_readable_file_size(task.get("downloaded", 0))
@@ -78,13 +87,22 @@ def build_status_message(downloads_dict):
             msg_parts.append(f"💾 {size_downloaded} / {size_total}")
             msg_parts.append(f"⚡ {speed_str} | ETA: {eta_str}")
             msg_parts.append(get_progress_bar(progress))
-        elif task["status"] == "uploading":
+        
+        # Files upload while the rest of the torrent still downloads
+        if task["status"] == "uploading" or task.get("uploaded_count"):
             uploaded = task.get("uploaded_count", 0)
             total = task.get("total_files", 1)
             msg_parts.append(f"📤 Uploading {uploaded}/{total} files")
+        if task.get("upload_total"):
+            upload_progress = task.get("upload_current", 0) * 100 / task["upload_total"]
+            msg_parts.append(f"⬆️ {task.get('upload_name', '')[:40]}")
+            msg_parts.append(f"{get_progress_bar(upload_progress)} | {get_readable_file_size(task.get('upload_speed', 0))}/s")
         
         msg_parts.append("")  # Blank line between tasks
     
+    if hidden:
+        msg_parts.append(f"<i>…and {hidden} more</i>\n")
+    
     # Add system stats at bottom
     msg_parts.append(get_system_stats())
     
@@ -0,0 +1,223 @@
+"""
+Swarm Health Engine
+Tracks every torrent the bot is working on from the shared poller state:
+time-weighted EMA download speed, seed/peer trends and metadata age.
+Stalled torrents first get cheap recovery (reannounce, extra trackers);
+torrents that stay dead are evicted early so their slots free up sooner.
+"""
+
+import math
+import time
+import asyncio
+import logging
+import storage_utils
+
+logger = logging.getLogger(__name__)
+
+EMA_WINDOW = 60  # Seconds - time constant of the speed / swarm averages
+MIN_SPEED = 1024  # Bytes/s below which a torrent counts as stalled
+REANNOUNCE_AFTER = 90  # Seconds stalled before asking trackers for peers again
+ADD_TRACKERS_AFTER = 180  # Seconds stalled before adding public trackers
+EVICT_EMPTY_AFTER = 300  # Seconds stalled with nobody in the swarm
+EVICT_AFTER = 900  # Seconds stalled while peers are connected but send nothing
+SCORE_GOOD_SPEED = 1024**2  # EMA speed that earns the full speed score
+
+STAGE_METADATA = "metadata"
+STAGE_DOWNLOAD = "download"
+
+# Only these states can stall - paused, checking and seeding torrents are left alone
+_ACTIVE_STATES = {"metaDL", "forcedMetaDL", "downloading", "forcedDL", "stalledDL"}
+
+PUBLIC_TRACKERS = [
+    "udp://tracker.opentrackr.org:1337/announce",
+    "udp://open.stealth.si:80/announce",
+    "udp://tracker.torrent.eu.org:451/announce",
+    "udp://exodus.desync.com:6969/announce",
+    "udp://open.demonii.com:1337/announce",
+    "udp://tracker.openbittorrent.com:6969/announce",
+]
+
+
+class TorrentHealth:
+    """Health record of one tracked torrent"""
+
+    def __init__(self, t_hash, stage, context=None, now=None):
+        now = now or time.time()
+        self.t_hash = t_hash
+        self.stage = stage
+        self.context = context  # Caller data for the eviction callback (e.g. status message)
+        self.first_seen = now
+        self.last_update = None
+        self.last_progress = now
+        self.downloaded = 0
+        self.ema_speed = 0.0
+        self.seeds_ema = 0.0
+        self.peers_ema = 0.0
+        self.seeds_trend = 0.0  # Change of seeds_ema in the last sample
+        self.peers_trend = 0.0
+        self.recovery_level = 0  # 0 = none, 1 = reannounced, 2 = trackers added
+        self.score = 50
+        self.reason = ""
+        self.evicted = False
+
+    def stalled_for(self, now):
+        return now - self.last_progress
+
+    def update(self, state, now):
+        """Fold one poller state into the averages"""
+        dt = now - self.last_update if self.last_update else EMA_WINDOW
+        alpha = 1 - math.exp(-max(dt, 0) / EMA_WINDOW)  # Time-aware: uneven poll gaps weigh correctly
+        self.last_update = now
+
+        self.ema_speed += alpha * (state.get("dlspeed", 0) - self.ema_speed)
+
+        seeds_ema = self.seeds_ema + alpha * (state.get("num_seeds", 0) - self.seeds_ema)
+        peers_ema = self.peers_ema + alpha * (state.get("num_leechs", 0) - self.peers_ema)
+        self.seeds_trend, self.seeds_ema = seeds_ema - self.seeds_ema, seeds_ema
+        self.peers_trend, self.peers_ema = peers_ema - self.peers_ema, peers_ema
+
+        downloaded = state.get("downloaded", 0)
+        if downloaded > self.downloaded or state.get("state") not in _ACTIVE_STATES:
+            self.last_progress = now
+        self.downloaded = max(self.downloaded, downloaded)
+
+        self.score = self._score()
+
+    def _score(self):
+        """0-100: connected seeds (40) + speed (40) + swarm trend (20)"""
+        seeds = min(self.seeds_ema / 5, 1) * 40
+        speed = min(self.ema_speed / SCORE_GOOD_SPEED, 1) * 40
+        trend = self.seeds_trend + self.peers_trend
+        trend_score = 20 if trend > 0.05 else 0 if trend < -0.05 else 10
+        return int(seeds + speed + trend_score)
+
+    def is_empty_swarm(self):
+        return self.seeds_ema < 0.5 and self.peers_ema < 0.5
+
+
+class SwarmHealth:
+    """
+    Shared health engine for all tracked torrents
+
+    Runs once per poller cycle, so the cost does not grow with per-task timers.
+    """
+
+    def __init__(self, qb, poller, on_evict=None, trackers=None):
+        self.qb = qb
+        self.poller = poller
+        self.on_evict = on_evict  # async callback(t_hash, record) before the torrent is deleted
+        self.trackers = trackers or PUBLIC_TRACKERS
+        self.records = {}  # {hash: TorrentHealth}
+
+    # --- Tracking ---
+
+    def track(self, t_hash, stage=STAGE_DOWNLOAD, context=None):
+        """Start (or move to a new stage) watching a torrent"""
+        record = self.records.get(t_hash)
+        if record is None or record.stage != stage:
+            record = TorrentHealth(t_hash, stage, context)
+            self.records[t_hash] = record
+        elif context is not None:
+            record.context = context
+        return record
+
+    def untrack(self, t_hash):
+        return self.records.pop(t_hash, None)
+
+    def get(self, t_hash):
+        return self.records.get(t_hash)
+
+    # --- Evaluation ---
+
+    def decide(self, record, now):
+        """
+        Decide the next action for a torrent
+
+        Returns:
+            str: "ok", "reannounce", "add_trackers" or "evict"
+        """
+        stalled = now - record.first_seen if record.stage == STAGE_METADATA else record.stalled_for(now)
+
+        if record.stage == STAGE_DOWNLOAD and record.ema_speed >= MIN_SPEED:
+            record.recovery_level = 0
+            return "ok"
+
+        if record.recovery_level == 0 and stalled >= REANNOUNCE_AFTER:
+            return "reannounce"
+        if record.recovery_level == 1 and stalled >= ADD_TRACKERS_AFTER:
+            return "add_trackers"
+
+        if record.recovery_level >= 2:
+            limit = EVICT_EMPTY_AFTER if record.is_empty_swarm() else EVICT_AFTER
+            if stalled >= limit:
+                if record.stage == STAGE_METADATA:
+                    record.reason = f"No metadata after {int(stalled // 60)} mins"
+                elif record.is_empty_swarm():
+                    record.reason = f"No seeds or peers for {int(stalled // 60)} mins"
+                else:
+                    record.reason = f"No data from peers for {int(stalled // 60)} mins"
+                return "evict"
+
+        return "ok"
+
+    async def _act(self, record, action):
+        t_hash = record.t_hash
+        if action == "reannounce":
+            logger.info(f"🩺 Reannouncing stalled torrent {t_hash}")
+            await self.qb.torrents_reannounce(t_hash)
+            record.recovery_level = 1
+        elif action == "add_trackers":
+            logger.info(f"🩺 Adding public trackers to stalled torrent {t_hash}")
+            await self.qb.torrents_add_trackers(t_hash, self.trackers)
+            await self.qb.torrents_reannounce(t_hash)
+            record.recovery_level = 2
+        elif action == "evict" and not record.evicted:
+            logger.info(f"💀 Evicting dead torrent {t_hash}: {record.reason}")
+            record.evicted = True
+            if self.on_evict:
+                await self.on_evict(t_hash, record)
+            await self.qb.torrents_delete(torrent_hashes=t_hash, delete_files=True)
+            self.records.pop(t_hash, None)
+
+    async def step(self, now=None):
+        """Update every tracked torrent from the poller cache and act on it"""
+        now = now or time.time()
+        for t_hash, record in list(self.records.items()):
+            state = self.poller.get(t_hash)
+            if state is None:
+                continue
+            record.update(state, now)
+            action = self.decide(record, now)
+            if action == "ok":
+                continue
+            try:
+                await self._act(record, action)
+            except Exception as e:
+                logger.error(f"Swarm health action '{action}' failed for {t_hash}: {e}")
+
+    async def run(self):
+        """Background loop (one evaluation per poller cycle)"""
+        logger.info("Starting swarm health engine...")
+        while True:
+            try:
+                await self.poller.wait_cycle(timeout=30)
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Swarm health error: {e}")
+                await asyncio.sleep(5)
+
+    def describe(self, t_hash):
+        """One-line health summary for /queue"""
+        record = self.records.get(t_hash)
+        if record is None:
+            return ""
+        arrow = lambda trend: "↑" if trend > 0.05 else "↓" if trend < -0.05 else "→"
+        text = (
+            f"❤️ {record.score}/100 | EMA {storage_utils.get_readable_size(record.ema_speed)}/s | "
+            f"S{arrow(record.seeds_trend)} P{arrow(record.peers_trend)}"
+        )
+        if record.recovery_level:
+            text += " | 🩺 recovering"
+        return text
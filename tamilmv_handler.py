@@ -3,12 +3,14 @@ import logging
 from pyrogram import enums
 from plugins import tamilmv_scraper
 import settings
+import magnet_utils
+import task_scheduler
 
 logger = logging.getLogger(__name__)
 
 from pyrogram.errors import FloodWait
 
-async def process_tamilmv_link(client, message, url, magnet_handler, topic_id=None):
+async def process_tamilmv_link(client, message, url, magnet_handler, topic_id=None, priority=task_scheduler.PRIORITY_MANUAL):
     """
     Process TamilMV post link - scrape and queue magnets
     
@@ -18,6 +20,7 @@ async def process_tamilmv_link(client, message, url, magnet_handler, topic_id=No
         url: TamilMV topic URL
         magnet_handler: Handler function for magnet links
         topic_id: Optional topic ID for tracking incomplete topics
+        priority: Scheduler priority class for the queued magnets
         
     Returns:
         dict with processing results including completion status
@@ -86,10 +89,8 @@ async def process_tamilmv_link(client, message, url, magnet_handler, topic_id=No
             try:
                 # Check duplicate history
                 magnet_link = magnet_info['url']
-                # Extract hash if possible (xt=urn:btih:HASH)
-                import re
-                hash_match = re.search(r'xt=urn:btih:([a-zA-Z0-9]+)', magnet_link)
-                magnet_hash = hash_match.group(1).lower() if hash_match else magnet_link
+                # Extract hash if possible (hex or base32 xt=urn:btih:HASH)
+                magnet_hash = magnet_utils.get_infohash(magnet_link) or magnet_link
                 
                 if settings.is_magnet_seen(magnet_hash):
                     skipped_count += 1
@@ -106,7 +107,7 @@ async def process_tamilmv_link(client, message, url, magnet_handler, topic_id=No
                 fake_msg = FakeMagnetMessage(magnet_link, message)
                 
                 # Trigger magnet handler
-                await magnet_handler(client, fake_msg)
+                await magnet_handler(client, fake_msg, priority=priority)
                 
                 # Save to history
                 settings.add_seen_magnet(magnet_hash, magnet_info.get('name', 'Unknown'))
@@ -0,0 +1,242 @@
+"""
+Task Scheduler - Priority queue for download jobs
+Manual requests run before search picks, which run before RSS auto-downloads.
+Users inside the same priority class are served round-robin, and the pending
+queue is persisted to MongoDB so a restart doesn't drop queued magnets.
+"""
+
+import time
+import heapq
+import itertools
+import logging
+import settings
+import magnet_utils
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "job_queue"
+
+# Priority classes (lower runs first)
+PRIORITY_MANUAL = 0
+PRIORITY_SEARCH = 1
+PRIORITY_RSS = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_MANUAL: "Manual",
+    PRIORITY_SEARCH: "Search",
+    PRIORITY_RSS: "RSS",
+}
+
+
+class Job:
+    """A magnet waiting for a download slot"""
+
+    def __init__(self, magnet, user_id, chat_id, priority=PRIORITY_MANUAL, name=None,
+                 status_msg_id=None, job_id=None, created_at=None, message=None, status_msg=None):
+        self.job_id = job_id or f"{int(time.time() * 1000)}-{next(_job_ids)}"
+        self.magnet = magnet
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.priority = priority
+        self.name = name
+        self.status_msg_id = status_msg_id
+        self.created_at = created_at or time.time()
+        self.round = 0
+        # Torrent may have vanished for reasons other than a cancel (restored
+        # after a restart) - admit it again instead of dropping it
+        self.readmit = False
+
+        # Runtime-only objects (not persisted)
+        self.message = message
+        self.status_msg = status_msg
+
+    def to_doc(self):
+        return {
+            "_id": self.job_id,
+            "magnet": self.magnet,
+            "user_id": self.user_id,
+            "chat_id": self.chat_id,
+            "priority": self.priority,
+            "name": self.name,
+            "status_msg_id": self.status_msg_id,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(
+            magnet=doc["magnet"],
+            user_id=doc["user_id"],
+            chat_id=doc["chat_id"],
+            priority=doc.get("priority", PRIORITY_MANUAL),
+            name=doc.get("name"),
+            status_msg_id=doc.get("status_msg_id"),
+            job_id=doc["_id"],
+            created_at=doc.get("created_at"),
+        )
+
+
+_job_ids = itertools.count()
+
+
+class TaskScheduler:
+    """
+    Active download slots plus a persistent pending heap
+
+    Heap key is (priority, round, seq): round grows with each job a user has
+    queued in that class, so one user's burst interleaves with other users
+    instead of blocking them. Enqueue and dequeue are O(log n).
+    """
+
+    def __init__(self, max_active=3):
+        self.max_active = max_active
+        self.active = {}  # {hash: {"user_id", "chat_id", "status_msg", "name", ...}}
+        self._heap = []  # [(priority, round, seq, job_id)]
+        self._jobs = {}  # {job_id: Job}
+        self._user_rounds = {}  # {(priority, user_id): last round assigned}
+        self._current_round = {}  # {priority: round of last dequeued job}
+        self._seq = itertools.count()
+        self._collection = None
+
+    # --- Persistence ---
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+        return self._collection
+
+    def _save(self, job):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.replace_one({"_id": job.job_id}, job.to_doc(), upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to persist job {job.job_id}: {e}")
+
+    def _delete(self, job_id):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_one({"_id": job_id})
+        except Exception as e:
+            logger.error(f"Failed to remove job {job_id}: {e}")
+
+    def load(self):
+        """
+        Restore pending jobs saved before a restart
+
+        Returns:
+            int: number of jobs restored
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return 0
+        try:
+            docs = list(collection.find().sort("created_at", 1))
+        except Exception as e:
+            logger.error(f"Failed to load job queue: {e}")
+            return 0
+
+        restored = 0
+        for doc in docs:
+            if doc["_id"] in self._jobs:
+                continue
+            job = Job.from_doc(doc)
+            job.readmit = True
+            self._enqueue(job)
+            restored += 1
+
+        if restored:
+            logger.info(f"Restored {restored} pending jobs from MongoDB")
+        return restored
+
+    # --- Pending queue ---
+
+    def _enqueue(self, job):
+        key = (job.priority, job.user_id)
+        job.round = max(self._current_round.get(job.priority, 0), self._user_rounds.get(key, -1) + 1)
+        self._user_rounds[key] = job.round
+        self._jobs[job.job_id] = job
+        heapq.heappush(self._heap, (job.priority, job.round, next(self._seq), job.job_id))
+
+    def push(self, job):
+        """Queue a job and persist it"""
+        self._enqueue(job)
+        self._save(job)
+
+    def pop(self):
+        """
+        Take the next job to run
+
+        Returns:
+            Job or None if nothing is pending
+        """
+        while self._heap:
+            priority, job_round, _, job_id = heapq.heappop(self._heap)
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                continue  # Removed while queued
+            self._current_round[priority] = job_round
+            self._delete(job_id)
+            return job
+        return None
+
+    def remove(self, job_id):
+        """Drop a pending job (lazy delete from the heap)"""
+        job = self._jobs.pop(job_id, None)
+        if job:
+            self._delete(job_id)
+        return job
+
+    def update(self, job):
+        """Persist changed fields of a pending job (e.g. status message id)"""
+        if job.job_id in self._jobs:
+            self._save(job)
+
+    def pending_count(self):
+        return len(self._jobs)
+
+    def pending_jobs(self, limit=None):
+        """Pending jobs in the order they will run"""
+        entries = sorted(entry for entry in self._heap if entry[3] in self._jobs)
+        if limit is not None:
+            entries = entries[:limit]
+        return [self._jobs[entry[3]] for entry in entries]
+
+    def find_pending(self, t_hash):
+        """Pending job for this infohash, if one is waiting for a slot"""
+        for job in self._jobs.values():
+            if magnet_utils.get_infohash(job.magnet) == t_hash:
+                return job
+        return None
+
+    def is_pending(self, t_hash):
+        return self.find_pending(t_hash) is not None
+
+    def count_by_priority(self):
+        """Pending job count per priority class"""
+        counts = {p: 0 for p in PRIORITY_NAMES}
+        for job in self._jobs.values():
+            counts[job.priority] = counts.get(job.priority, 0) + 1
+        return counts
+
+    # --- Active slots ---
+
+    def has_free_slot(self):
+        return len(self.active) < self.max_active
+
+    def active_count(self):
+        return len(self.active)
+
+    def is_active(self, t_hash):
+        return t_hash in self.active
+
+    def start(self, t_hash, info):
+        """Mark a torrent as holding a download slot"""
+        self.active[t_hash] = info
+
+    def finish(self, t_hash):
+        """Release the slot held by a torrent"""
+        return self.active.pop(t_hash, None)
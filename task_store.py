@@ -0,0 +1,149 @@
+"""
+Task Store - crash-resumable task records
+Every torrent the bot works on gets a MongoDB record that is updated at each
+lifecycle step (metadata -> downloading -> uploading). After a restart the
+records are reconciled against qBittorrent and the disk, so unfinished work
+resumes instead of being downloaded again or left orphaned.
+"""
+
+import os
+import time
+import logging
+import settings
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "task_records"
+
+# Lifecycle stages
+STAGE_METADATA = "metadata"
+STAGE_QUEUED = "queued"
+STAGE_DOWNLOADING = "downloading"
+STAGE_UPLOADING = "uploading"
+
+# Reconciler actions
+ACTION_READMIT = "readmit"  # Run the magnet through the metadata stage again
+ACTION_RESUME = "resume"  # Torrent still in qBittorrent - take a slot and continue
+ACTION_UPLOAD_FROM_DISK = "upload_from_disk"  # Torrent gone but files are on disk
+ACTION_WAIT_QUEUE = "wait_queue"  # Restored by the pending job queue
+ACTION_DELETE_ORPHAN = "delete_orphan"  # Bot torrent without a record
+
+
+class TaskStore:
+    """MongoDB-backed task records keyed by infohash (no-op without MongoDB)"""
+
+    def __init__(self):
+        self._collection = None
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+        return self._collection
+
+    def save(self, t_hash, stage, **fields):
+        """Create or update a record and move it to a lifecycle stage"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        fields.update({"stage": stage, "updated_at": time.time()})
+        try:
+            collection.update_one(
+                {"_id": t_hash},
+                {"$set": fields, "$setOnInsert": {"created_at": time.time(), "uploaded": []}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to persist task {t_hash}: {e}")
+
+    def mark_uploaded(self, t_hash, rel_path):
+        """Remember a file that already reached Telegram"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.update_one({"_id": t_hash}, {"$addToSet": {"uploaded": rel_path}})
+        except Exception as e:
+            logger.error(f"Failed to record upload of {rel_path}: {e}")
+
+    def get(self, t_hash):
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        try:
+            return collection.find_one({"_id": t_hash})
+        except Exception as e:
+            logger.error(f"Failed to read task {t_hash}: {e}")
+            return None
+
+    def remove(self, t_hash):
+        """Drop a record once the task is finished or abandoned"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_one({"_id": t_hash})
+        except Exception as e:
+            logger.error(f"Failed to remove task {t_hash}: {e}")
+
+    def load(self):
+        """
+        All records left over from a previous run
+
+        Returns:
+            list or None: None when there is no store or it could not be read -
+                callers must not treat that as "no tasks"
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        try:
+            return list(collection.find().sort("created_at", 1))
+        except Exception as e:
+            logger.error(f"Failed to load task records: {e}")
+            return None
+
+
+def plan_reconcile(records, torrents, path_exists=os.path.exists):
+    """
+    Match task records against qBittorrent's torrent list
+
+    Args:
+        records: task record documents (None = records unknown: nothing is
+            treated as an orphan, since that would delete every download)
+        torrents: {hash: torrent info} of bot-owned torrents in qBittorrent
+        path_exists: disk check (injectable for dry runs)
+
+    Returns:
+        list: [(action, record or None, torrent or None)]
+    """
+    plan = []
+    known = set()
+
+    for record in records or []:
+        t_hash = record["_id"]
+        known.add(t_hash)
+        torrent = torrents.get(t_hash)
+        stage = record.get("stage")
+
+        if stage == STAGE_QUEUED:
+            # Pending jobs come back through the persistent job queue
+            plan.append((ACTION_WAIT_QUEUE, record, torrent))
+        elif torrent is not None:
+            if stage == STAGE_METADATA:
+                plan.append((ACTION_READMIT, record, torrent))
+            else:
+                plan.append((ACTION_RESUME, record, torrent))
+        elif stage == STAGE_UPLOADING and record.get("content_path") and path_exists(record["content_path"]):
+            plan.append((ACTION_UPLOAD_FROM_DISK, record, None))
+        else:
+            # Torrent is gone - re-adding lets qBittorrent recheck whatever is still on disk
+            plan.append((ACTION_READMIT, record, None))
+
+    if records is None:
+        return plan
+
+    for t_hash, torrent in torrents.items():
+        if t_hash not in known:
+            plan.append((ACTION_DELETE_ORPHAN, None, torrent))
+
+    return plan
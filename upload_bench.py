@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Upload Engine Benchmark
+Runs upload_engine.ParallelUploader against a local stand-in for Telegram's
+media DC: a TCP server on 127.0.0.1 that accepts length-prefixed file parts and
+acknowledges each one after a simulated round trip, with a bandwidth cap per
+connection (like one MTProto media connection). No Telegram account is needed.
+
+Usage:
+    python upload_bench.py --size 200 --connections 1 2 4 8 --rtt 80 --bandwidth 4
+"""
+
+import os
+import time
+import struct
+import asyncio
+import argparse
+import tempfile
+import upload_engine
+
+
+class StandInServer:
+    """Loopback "media DC": per-connection bandwidth cap + fixed RTT per part"""
+
+    def __init__(self, rtt, bandwidth):
+        self.rtt = rtt
+        self.bandwidth = bandwidth  # Bytes per second per connection
+        self.parts = {}  # {(file_id, part): size}
+        self.server = None
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(20)
+                file_id, part, size = struct.unpack("!qqI", header)
+                await reader.readexactly(size)
+                await asyncio.sleep(self.rtt + size / self.bandwidth)
+                self.parts[(file_id, part)] = size
+                writer.write(b"\x01")
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class StandInSession:
+    """Session-shaped client for the stand-in server (start / invoke / stop)"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def start(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+    async def invoke(self, rpc):
+        self.writer.write(struct.pack("!qqI", rpc.file_id, rpc.file_part, len(rpc.bytes)) + rpc.bytes)
+        await self.writer.drain()
+        return await self.reader.readexactly(1) == b"\x01"
+
+    async def stop(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run(path, size, connections, rtt, bandwidth):
+    server = StandInServer(rtt, bandwidth)
+    port = await server.start()
+
+    async def factory():
+        return StandInSession(port)
+
+    uploader = upload_engine.ParallelUploader(factory, connections=connections)
+    start = time.monotonic()
+    input_file = await uploader.upload(path, 0, size, os.path.basename(path))
+    elapsed = time.monotonic() - start
+    await server.stop()
+
+    assert len(server.parts) == input_file.parts
+    assert sum(server.parts.values()) == size
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100, help="Test file size in MB")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rtt", type=float, default=80, help="Round trip per part in ms")
+    parser.add_argument("--bandwidth", type=float, default=4, help="MB/s per connection")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+        f.write(os.urandom(size))
+        f.flush()
+
+        print(f"{args.size} MB file, {args.rtt:.0f} ms RTT, {args.bandwidth} MB/s per connection")
+        baseline = None
+        for connections in args.connections:
+            elapsed = asyncio.run(run(f.name, size, connections, args.rtt / 1000, args.bandwidth * 1024 * 1024))
+            baseline = baseline or elapsed
+            print(
+                f"  {connections:>2} connections: {elapsed:6.1f}s "
+                f"{args.size / elapsed:6.1f} MB/s  x{baseline / elapsed:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
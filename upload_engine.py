@@ -0,0 +1,223 @@
+"""
+Parallel Upload Engine
+Pyrogram's save_file pushes every part of a file through a single media
+connection. This engine opens several media sessions (separate connections to
+the media DC) and lets each one send file parts concurrently with
+SaveBigFilePart. The finished InputFileBig is then attached to the message with
+one SendMedia call. Failed parts are retried on their own, so a flaky
+connection never restarts the whole file, and with a checkpoint the accepted
+parts survive retries and restarts.
+"""
+
+import os
+import math
+import asyncio
+import inspect
+import logging
+from pyrogram import raw, types, utils, enums
+from pyrogram.errors import FloodWait, FilePartMissing
+from pyrogram.session import Session
+
+logger = logging.getLogger(__name__)
+
+PART_SIZE = 512 * 1024  # Telegram's maximum part size
+BIG_FILE_SIZE = 10 * 1024 * 1024  # Smaller files must use SaveFilePart + md5 (pyrogram path)
+PART_RETRIES = 5
+MISSING_PART_RETRIES = 3  # Re-sends after FilePartMissing before the upload fails
+
+
+def media_session_factory(client):
+    """Session factory opening new media connections for a started client"""
+    async def factory():
+        return Session(
+            client, await client.storage.dc_id(), await client.storage.auth_key(),
+            await client.storage.test_mode(), is_media=True
+        )
+    return factory
+
+
+def source_range(source):
+    """
+    (path, offset, length, name) of an upload source
+
+    Accepts a file path or a split_utils.FileSlice.
+    """
+    if isinstance(source, str):
+        return source, 0, os.path.getsize(source), os.path.basename(source)
+    return source.path, source.offset, source.length, source.name
+
+
+class ParallelUploader:
+    """Sends the parts of one file over several connections"""
+
+    def __init__(self, session_factory, connections=4, part_size=PART_SIZE, rnd_id=None):
+        """
+        Args:
+            session_factory: async callable returning an unstarted session
+                (anything with start(), invoke(rpc) and stop())
+            connections: concurrent connections for one file
+            rnd_id: file id generator (client.rnd_id)
+        """
+        self.session_factory = session_factory
+        self.connections = max(1, connections)
+        self.part_size = part_size
+        self.rnd_id = rnd_id or (lambda: int.from_bytes(os.urandom(8), "big", signed=True))
+
+    def total_parts(self, length):
+        return int(math.ceil(length / self.part_size))
+
+    def part_length(self, part, length):
+        return min(self.part_size, length - part * self.part_size)
+
+    async def upload(self, path, offset, length, name, progress=None, file_id=None, parts=None, checkpoint=None):
+        """
+        Upload bytes [offset, offset + length) of a file
+
+        Args:
+            progress: (current, total) callback, sync or async
+            file_id / parts: re-send only these part numbers of an earlier upload
+                (e.g. after FILE_PART_X_MISSING)
+            checkpoint: upload_progress.Checkpoint - skips parts accepted
+                before and records every newly accepted part
+
+        Returns:
+            raw.types.InputFileBig
+        """
+        total_parts = self.total_parts(length)
+        if checkpoint is not None:
+            if checkpoint.file_id is None:
+                checkpoint.start(file_id or self.rnd_id(), self.part_size, total_parts)
+            file_id = checkpoint.file_id
+            if parts is None:
+                parts = [part for part in range(total_parts) if part not in checkpoint.done]
+        file_id = file_id or self.rnd_id()
+        if parts is None:
+            parts = range(total_parts)
+
+        pending = asyncio.Queue()
+        for part in parts:
+            pending.put_nowait(part)
+
+        # Resumed uploads report progress from where they left off
+        sent_bytes = 0
+        if checkpoint is not None:
+            sent_bytes = sum(self.part_length(part, length) for part in checkpoint.done if part < total_parts)
+        fd = os.open(path, os.O_RDONLY)
+
+        async def report(part, size):
+            nonlocal sent_bytes
+            sent_bytes += size
+            if checkpoint is not None:
+                checkpoint.mark(part)
+            if progress:
+                result = progress(min(sent_bytes, length), length)
+                if inspect.isawaitable(result):
+                    await result
+
+        async def send_part(session, part):
+            start = part * self.part_size
+            size = self.part_length(part, length)
+            data = await asyncio.to_thread(os.pread, fd, size, offset + start)
+            rpc = raw.functions.upload.SaveBigFilePart(
+                file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+            )
+            for attempt in range(PART_RETRIES):
+                try:
+                    if await session.invoke(rpc):
+                        await report(part, size)
+                        return
+                except FloodWait as e:
+                    await asyncio.sleep(e.value)
+                    continue
+                except Exception as e:
+                    logger.warning(f"Part {part} of {name} failed ({e}), retry {attempt + 1}")
+                await asyncio.sleep(2 ** attempt)
+            raise IOError(f"Part {part} of {name} was not accepted after {PART_RETRIES} tries")
+
+        async def worker():
+            session = await self.session_factory()
+            await session.start()
+            try:
+                while not pending.empty():
+                    await send_part(session, pending.get_nowait())
+            finally:
+                await session.stop()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.connections, pending.qsize()) or 1)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        finally:
+            os.close(fd)
+            if checkpoint is not None:
+                checkpoint.flush()
+
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+
+
+async def send_uploaded(client, uploader, source, chat_id, file_name, caption, thumb=None, mode="document",
+                        progress=None, checkpoint=None):
+    """
+    Upload a big file with the parallel engine and post it
+
+    Args:
+        checkpoint: upload_progress.Checkpoint to resume from / record into
+
+    Returns:
+        Message: the sent message
+    """
+    path, offset, length, name = source_range(source)
+    resumed = checkpoint is not None and bool(checkpoint.done)
+    input_file = await uploader.upload(path, offset, length, file_name or name, progress=progress, checkpoint=checkpoint)
+
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if mode == "video":
+        attributes.insert(0, raw.types.DocumentAttributeVideo(supports_streaming=True, duration=0, w=0, h=0))
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=client.guess_mime_type(file_name) or ("video/mp4" if mode == "video" else "application/zip"),
+        file=input_file,
+        thumb=await client.save_file(thumb) if thumb else None,
+        attributes=attributes
+    )
+
+    missing_retries = 0
+    while True:
+        try:
+            r = await client.invoke(
+                raw.functions.messages.SendMedia(
+                    peer=await client.resolve_peer(chat_id),
+                    media=media,
+                    random_id=client.rnd_id(),
+                    **await utils.parse_text_entities(client, caption, enums.ParseMode.HTML, None)
+                )
+            )
+        except FilePartMissing as e:
+            missing_retries += 1
+            if missing_retries > MISSING_PART_RETRIES:
+                # Telegram keeps refusing the file - give the slot back, the caller retries or dead-letters it
+                if checkpoint is not None:
+                    checkpoint.clear()
+                raise
+            if resumed:
+                # Telegram dropped the parts of the earlier attempt - send them all again
+                resumed = False
+                await uploader.upload(path, offset, length, file_name, file_id=input_file.id)
+            else:
+                await uploader.upload(path, offset, length, file_name, file_id=input_file.id, parts=[int(e.value)])
+            continue
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+        for update in r.updates:
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                return await types.Message._parse(
+                    client, update.message,
+                    {u.id: u for u in r.users},
+                    {c.id: c for c in r.chats}
+                )
+        return None
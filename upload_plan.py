@@ -0,0 +1,107 @@
+"""
+Upload Plan
+Built once per torrent from qBittorrent's file list at metadata time: upload
+order, final names, sizes, captions, split parts and target chats. The upload
+stage only executes it, and /queue reads totals and ETA from it instead of
+walking the disk.
+"""
+
+import os
+import time
+from natsort import natsorted
+import caption_utils
+import split_utils
+import upload_utils
+from rename_utils import rename_for_upload
+
+DEFAULT_UPLOAD_SPEED = 5 * 1024**2  # Bytes/s assumed until real uploads were measured
+SPEED_SMOOTHING = 0.3  # EMA weight of the newest upload
+
+
+class UploadSpeed:
+    """Smoothed upload throughput across all uploads (for ETAs)"""
+
+    def __init__(self):
+        self.bytes_per_sec = DEFAULT_UPLOAD_SPEED
+
+    def observe(self, size, seconds):
+        if size <= 0 or seconds <= 0:
+            return
+        speed = size / seconds
+        self.bytes_per_sec += SPEED_SMOOTHING * (speed - self.bytes_per_sec)
+
+
+upload_speed = UploadSpeed()
+
+
+def plan_entry(index, rel_path, save_path, size, part_size=None):
+    """One file of the plan (plain dict, so it persists in the task record)"""
+    file_name = os.path.basename(rename_for_upload(rel_path))
+    parts = [(0, size)]
+    if part_size:
+        parts = split_utils.plan_parts(size, part_size)
+    return {
+        "index": index,
+        "rel_path": rel_path,
+        "path": os.path.join(save_path, rel_path),
+        "file_name": file_name,
+        "size": size,
+        "caption": caption_utils.generate_caption(file_name),
+        "parts": [list(part) for part in parts],
+    }
+
+
+def build_plan(files, save_path, channels, storage_channel=None, part_size=None):
+    """
+    Plan the upload of a torrent from its qBittorrent file list
+
+    Args:
+        files: torrents_files() entries (name, size, priority, index)
+        channels: upload chats (storage channel first if set)
+        part_size: split files above this size (None = split mode off)
+
+    Returns:
+        dict: {"files", "origins", "targets", "storage", "total_bytes", "total_uploads", "created_at"}
+    """
+    entries = [
+        plan_entry(f.get("index", idx), f.name, save_path, f.size, part_size)
+        for idx, f in enumerate(files)
+        if f.priority != 0 and f.size > 0
+    ]
+    return _finish(natsorted(entries, key=lambda e: e["rel_path"]), channels, storage_channel)
+
+
+def plan_from_disk(content_path, save_path, channels, storage_channel=None, part_size=None):
+    """Plan for files already on disk (torrent no longer in qBittorrent)"""
+    if os.path.isfile(content_path):
+        paths = [content_path]
+    else:
+        paths = []
+        for root, dirs, files in sorted(os.walk(content_path)):
+            paths.extend(os.path.join(root, file) for file in natsorted(files))
+
+    entries = []
+    for idx, path in enumerate(paths):
+        size = os.path.getsize(path)
+        if size > 0:
+            entries.append(plan_entry(idx, os.path.relpath(path, save_path), save_path, size, part_size))
+    return _finish(entries, channels, storage_channel)
+
+
+def _finish(entries, channels, storage_channel):
+    origins, targets = upload_utils.upload_targets(channels, storage_channel)
+    return {
+        "files": entries,
+        "origins": origins,
+        "targets": targets,
+        "storage": int(storage_channel) if storage_channel else None,
+        "total_bytes": sum(e["size"] for e in entries),
+        "total_uploads": sum(len(e["parts"]) for e in entries),
+        "created_at": time.time(),
+    }
+
+
+def eta(plan, uploaded_bytes):
+    """Seconds left for the plan at the measured upload speed"""
+    remaining = max(0, plan["total_bytes"] - uploaded_bytes)
+    return remaining / upload_speed.bytes_per_sec
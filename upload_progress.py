@@ -0,0 +1,169 @@
+"""
+Resumable Upload Progress
+Records which parts of a big upload Telegram already accepted (MongoDB), so an
+upload interrupted by a FloodWait, a network error or a restart continues from
+the missing parts instead of byte 0.
+Uploaded parts belong to the bot session that sent them and only live on
+Telegram's side for a while, so checkpoints are per bot and expire.
+"""
+
+import time
+import logging
+import settings
+from file_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "upload_progress"
+CHECKPOINT_TTL = 6 * 3600  # Older checkpoints start over (Telegram drops stale parts)
+FLUSH_EVERY = 32  # Accepted parts buffered before a write
+
+
+class Checkpoint:
+    """Progress of one file (or split part) uploaded by one bot"""
+
+    def __init__(self, store, key, file_key, t_hash, uploader, file_id=None, parts=()):
+        self.store = store
+        self.key = key
+        self.file_key = file_key
+        self.t_hash = t_hash
+        self.uploader = uploader
+        self.file_id = file_id  # Engine file id - set on the first attempt
+        self.done = set(parts)
+        self._unsaved = []
+
+    def start(self, file_id, part_size, total_parts):
+        """Bind a fresh upload (no-op when resuming)"""
+        if self.file_id is not None:
+            return
+        self.file_id = file_id
+        self.store._save(self, part_size, total_parts)
+
+    def mark(self, part):
+        self.done.add(part)
+        self._unsaved.append(part)
+        if len(self._unsaved) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self._unsaved:
+            self.store._add_parts(self, self._unsaved)
+            self._unsaved = []
+
+    def clear(self):
+        """The message was sent - nothing left to resume"""
+        self._unsaved = []
+        self.store._remove(self.key)
+
+
+class UploadProgressStore:
+    """MongoDB-backed upload checkpoints (in memory only without MongoDB)"""
+
+    def __init__(self):
+        self._collection = None
+        self._memory = {}  # Fallback: survives retries, not restarts
+
+    def _get_collection(self):
+        if self._collection is None and settings._db_client:
+            self._collection = settings._db_client[settings.DATABASE_NAME][COLLECTION_NAME]
+            try:
+                self._collection.create_index("file_key")
+                self._collection.create_index("t_hash")
+            except Exception as e:
+                logger.debug(f"Could not create upload progress indexes: {e}")
+        return self._collection
+
+    def checkpoint(self, t_hash, rel_path, size, uploader):
+        """
+        Load or create the checkpoint of an upload
+
+        Returns:
+            Checkpoint: with file_id None when there is nothing to resume
+        """
+        file_key = cache_key(t_hash, rel_path, size)
+        key = f"{file_key}:{uploader}"
+        doc = self._memory.get(key)
+        collection = self._get_collection()
+        if doc is None and collection is not None:
+            try:
+                doc = collection.find_one({"_id": key})
+            except Exception as e:
+                logger.error(f"Failed to load upload progress: {e}")
+
+        if doc and time.time() - doc.get("started_at", 0) < CHECKPOINT_TTL:
+            logger.info(f"♻️ Resuming upload of {rel_path}: {len(doc['parts'])}/{doc['total_parts']} parts done")
+            return Checkpoint(self, key, file_key, t_hash, uploader, doc["file_id"], doc["parts"])
+        if doc:
+            self._remove(key)
+        return Checkpoint(self, key, file_key, t_hash, uploader)
+
+    def owner(self, t_hash, rel_path, size):
+        """Bot id holding an unexpired checkpoint for this file, if any"""
+        file_key = cache_key(t_hash, rel_path, size)
+        fresh = time.time() - CHECKPOINT_TTL
+        for doc in self._memory.values():
+            if doc["file_key"] == file_key and doc["started_at"] > fresh:
+                return doc["uploader"]
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        try:
+            doc = collection.find_one({"file_key": file_key, "started_at": {"$gt": fresh}})
+        except Exception as e:
+            logger.error(f"Failed to look up upload progress: {e}")
+            return None
+        return doc["uploader"] if doc else None
+
+    def _save(self, checkpoint, part_size, total_parts):
+        doc = {
+            "file_key": checkpoint.file_key,
+            "t_hash": checkpoint.t_hash,
+            "uploader": checkpoint.uploader,
+            "file_id": checkpoint.file_id,
+            "part_size": part_size,
+            "total_parts": total_parts,
+            "parts": sorted(checkpoint.done),
+            "started_at": time.time(),
+        }
+        self._memory[checkpoint.key] = doc
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.replace_one({"_id": checkpoint.key}, doc, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to save upload progress: {e}")
+
+    def _add_parts(self, checkpoint, parts):
+        doc = self._memory.get(checkpoint.key)
+        if doc is not None:
+            doc["parts"] = sorted(checkpoint.done)
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.update_one({"_id": checkpoint.key}, {"$addToSet": {"parts": {"$each": parts}}})
+        except Exception as e:
+            logger.error(f"Failed to save upload progress: {e}")
+
+    def _remove(self, key):
+        self._memory.pop(key, None)
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_one({"_id": key})
+        except Exception as e:
+            logger.error(f"Failed to drop upload progress: {e}")
+
+    def remove_task(self, t_hash):
+        """Drop every checkpoint of a finished or abandoned torrent"""
+        for key in [k for k, doc in self._memory.items() if doc["t_hash"] == t_hash]:
+            del self._memory[key]
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.delete_many({"t_hash": t_hash})
+        except Exception as e:
+            logger.error(f"Failed to drop upload progress of {t_hash}: {e}")
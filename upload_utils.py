@@ -0,0 +1,170 @@
+"""
+Upload Utilities
+Send a file's bytes to Telegram once, then fan the resulting file_id out to
+the other channels with cheap send_cached_media / copy_message calls.
+Pacing comes only from the rate limiter - no fixed sleeps between sends, and
+a FloodWait is fed back into the limiter instead of being slept off here.
+"""
+
+import logging
+from pyrogram import enums
+from pyrogram.errors import (
+    FloodWait, FileIdInvalid, FileReferenceExpired, FileReferenceInvalid,
+    MediaEmpty, MediaInvalid, MessageIdInvalid
+)
+import rate_limiter
+import upload_engine
+
+logger = logging.getLogger(__name__)
+
+# Telegram refused the file itself (stale file_id, source message deleted) -
+# as opposed to the chat or a FloodWait, which say nothing about the file_id
+FILE_REJECTED = (
+    FileIdInvalid, FileReferenceExpired, FileReferenceInvalid,
+    MediaEmpty, MediaInvalid, MessageIdInvalid
+)
+
+
+def get_media(message):
+    """Get the uploaded media object (document, video, ...) of a sent message"""
+    if message is None:
+        return None
+    for attr in ("document", "video", "audio", "animation", "photo"):
+        media = getattr(message, attr, None)
+        if media:
+            return media
+    return None
+
+
+def upload_targets(channels, storage_channel=None):
+    """
+    Order chats for upload-once delivery
+
+    Returns:
+        tuple: (origin candidates in try order, all chats that must receive the file)
+    """
+    targets = []
+    for channel_id in channels:
+        channel_id = int(channel_id) if isinstance(channel_id, str) else channel_id
+        if channel_id not in targets:
+            targets.append(channel_id)
+
+    origins = list(targets)
+    if storage_channel:
+        storage_channel = int(storage_channel)
+        if storage_channel in origins:
+            origins.remove(storage_channel)
+        origins.insert(0, storage_channel)
+    return origins, targets
+
+
+async def send_file(client, chat_id, path, file_name, caption, thumb=None, mode="document", progress=None,
+                    connections=1, checkpoint=None):
+    """
+    Upload a local file or file-like part (the only call that pushes bytes)
+
+    Args:
+        connections: media connections for big files (1 = pyrogram's own
+            uploader unless a checkpoint asks for a resumable upload)
+        checkpoint: upload_progress.Checkpoint of this file for this client
+    """
+    await rate_limiter.limiter.acquire(chat_id, kind=rate_limiter.KIND_UPLOAD)
+    use_engine = connections > 1 or checkpoint is not None
+    if use_engine and upload_engine.source_range(path)[2] > upload_engine.BIG_FILE_SIZE:
+        uploader = upload_engine.ParallelUploader(
+            upload_engine.media_session_factory(client), connections, rnd_id=client.rnd_id
+        )
+        return await upload_engine.send_uploaded(
+            client, uploader, path, chat_id, file_name, caption, thumb=thumb, mode=mode, progress=progress,
+            checkpoint=checkpoint
+        )
+    if mode == "document":
+        return await client.send_document(
+            chat_id=chat_id,
+            document=path,
+            file_name=file_name,
+            thumb=thumb,
+            caption=caption,
+            parse_mode=enums.ParseMode.HTML,
+            progress=progress
+        )
+    return await client.send_video(
+        chat_id=chat_id,
+        video=path,
+        file_name=file_name,
+        thumb=thumb,
+        caption=caption,
+        parse_mode=enums.ParseMode.HTML,
+        progress=progress
+    )
+
+
+async def send_cached(client, chat_id, file_id, caption, source=None):
+    """
+    Post an already uploaded file by file_id
+
+    Falls back to copying the source message if Telegram refuses the file_id.
+    Without a file_id (uploaded by a bot that is not `client`) it copies directly.
+
+    Args:
+        source: (chat_id, message_id) of the uploaded message, if known
+    """
+    await rate_limiter.limiter.acquire(chat_id)
+    if file_id is not None:
+        try:
+            return await client.send_cached_media(
+                chat_id=chat_id,
+                file_id=file_id,
+                caption=caption,
+                parse_mode=enums.ParseMode.HTML
+            )
+        except FloodWait:
+            raise
+        except Exception as e:
+            if source is None:
+                raise
+            logger.debug(f"send_cached_media to {chat_id} failed ({e}), copying message instead")
+    return await client.copy_message(
+        chat_id=chat_id,
+        from_chat_id=source[0],
+        message_id=source[1],
+        caption=caption,
+        parse_mode=enums.ParseMode.HTML
+    )
+
+
+async def fan_out(client, file_id, chat_ids, caption, source=None, rejected=None):
+    """
+    Deliver an uploaded file to more chats without re-uploading
+
+    Args:
+        file_id: Telegram file_id of the uploaded media (only valid for the
+            bot that uploaded it - None copies from `source` instead)
+        chat_ids: chats that still need the file
+        source: (chat_id, message_id) of the uploaded message (copy fallback), if known
+        rejected: optional list - chat ids that refused the file itself are
+            added to it (see FILE_REJECTED)
+
+    Returns:
+        list: chat ids that could not be served
+    """
+    failed = []
+
+    for chat_id in chat_ids:
+        for attempt in range(2):
+            try:
+                await send_cached(client, chat_id, file_id, caption, source=source)
+                break
+            except FloodWait as e:
+                # send_cached waits for the penalised bucket on the retry
+                rate_limiter.limiter.on_flood_wait(chat_id, e.value)
+            except Exception as e:
+                logger.error(f"Failed to fan out to {chat_id}: {e}")
+                failed.append(chat_id)
+                if rejected is not None and isinstance(e, FILE_REJECTED):
+                    rejected.append(chat_id)
+                break
+        else:
+            failed.append(chat_id)
+
+    return failed